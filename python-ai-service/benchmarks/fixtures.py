@@ -0,0 +1,88 @@
+import io
+import os
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+# (width, height, format) of the synthetic corpus: phone photos, web images and screenshots
+CORPUS_SHAPES = [
+    (4032, 3024, 'JPEG'),
+    (3024, 4032, 'JPEG'),
+    (1920, 1080, 'JPEG'),
+    (1200, 1200, 'JPEG'),
+    (800, 600, 'JPEG'),
+    (1280, 720, 'PNG'),
+    (640, 480, 'PNG'),
+    (300, 300, 'JPEG'),
+]
+
+
+def _synthetic_image(width: int, height: int, seed: int) -> Image.Image:
+    """
+    Build a deterministic image with smooth gradients and noise, so it compresses like a photo.
+
+    The gradients are rendered small and upscaled so generating the corpus
+    does not dominate the benchmark's peak memory.
+    """
+    rng = np.random.default_rng(seed)
+    small_w, small_h = max(1, width // 16), max(1, height // 16)
+    y = np.linspace(0, 1, small_h, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, small_w, dtype=np.float32)[None, :]
+    base = rng.random(3, dtype=np.float32)
+
+    channels = [
+        (np.sin((x * (3 + c) + y * (2 + seed % 5)) * np.pi) * 0.5 + 0.5) * 0.7 + base[c] * 0.3
+        for c in range(3)
+    ]
+    pixels = (np.clip(np.stack(channels, axis=-1), 0, 1) * 255).astype(np.uint8)
+    image = Image.fromarray(pixels, 'RGB').resize((width, height), Image.BICUBIC)
+
+    noise = Image.effect_noise((width, height), 32).convert('RGB')
+    return Image.blend(image, noise, 0.08)
+
+
+def build_corpus(size: int = 16) -> List[Tuple[str, bytes, str]]:
+    """
+    Build an in-memory fixture corpus of encoded images.
+
+    Args:
+        size: Number of images to generate
+
+    Returns:
+        List of (filename, encoded bytes, content type)
+    """
+    corpus = []
+    for i in range(size):
+        width, height, fmt = CORPUS_SHAPES[i % len(CORPUS_SHAPES)]
+        image = _synthetic_image(width, height, seed=i)
+
+        buffer = io.BytesIO()
+        if fmt == 'JPEG':
+            image.save(buffer, format='JPEG', quality=90)
+            corpus.append((f"fixture_{i}.jpg", buffer.getvalue(), 'image/jpeg'))
+        else:
+            image.save(buffer, format='PNG')
+            corpus.append((f"fixture_{i}.png", buffer.getvalue(), 'image/png'))
+
+    return corpus
+
+
+def load_corpus(directory: str) -> List[Tuple[str, bytes, str]]:
+    """
+    Load a fixture corpus from a directory of image files.
+
+    Args:
+        directory: Directory containing .jpg/.jpeg/.png/.webp files
+
+    Returns:
+        List of (filename, encoded bytes, content type)
+    """
+    content_types = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.webp': 'image/webp'}
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        content_type = content_types.get(os.path.splitext(name)[1].lower())
+        if content_type:
+            with open(os.path.join(directory, name), 'rb') as f:
+                corpus.append((name, f.read(), content_type))
+    return corpus
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Benchmark the scan and index hot paths.
+
+Drives `scan_product` and an index job in-process against a fixture
+image corpus, a stubbed vector store and a stubbed WordPress API, and
+reports latency percentiles, throughput per concurrency level, peak RSS
+and per-stage timings. Results are written as JSON so runs on different
+commits can be compared.
+
+Usage (from the python-ai-service directory):
+    python -m benchmarks.run_benchmarks                    # real CLIP model
+    python -m benchmarks.run_benchmarks --stub-embedder    # harness only, no torch
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/old.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from starlette.requests import Request
+
+load_dotenv()
+
+import models.clip_embedder as clip_embedder_module
+import services.index_jobs as index_jobs_module
+import services.index_manifest as index_manifest_module
+import services.pinecone_service as pinecone_service_module
+import services.product_catalog as product_catalog_module
+import services.wordpress_service as wordpress_service_module
+from models import CLIPEmbedder
+from models.image_preprocessing import decode_image, resize_for_clip
+from routers.scan import scan_product
+from services import IndexJobManager, IndexManifest, ProductCatalog
+
+from .fixtures import build_corpus, load_corpus
+from .stubs import StubEmbedder, StubVectorStore, StubWordPressService, serve_directory, stub_product
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    """Summarize latency samples in milliseconds."""
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        'count': int(values.size),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3)
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def git_commit() -> Optional[str]:
+    """Current git commit, if available."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except Exception:
+        return None
+
+
+def time_stage(samples: Dict[str, List[float]], stage: str, func: Callable, *args):
+    """Run a function and record its duration under a stage name."""
+    started = time.perf_counter()
+    result = func(*args)
+    samples.setdefault(stage, []).append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def multipart_request(filename: str, data: bytes, content_type: str, chunk_size: int = 64 * 1024) -> Request:
+    """Build a /scan request whose multipart body arrives in chunks, as from a socket."""
+    boundary = 'benchmark-boundary'
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode('latin-1') + data + f'\r\n--{boundary}--\r\n'.encode('latin-1')
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    async def receive():
+        chunk = chunks.pop(0) if chunks else b''
+        return {'type': 'http.request', 'body': chunk, 'more_body': bool(chunks)}
+
+    return Request({
+        'type': 'http',
+        'method': 'POST',
+        'path': '/scan',
+        'headers': [
+            (b'content-type', f'multipart/form-data; boundary={boundary}'.encode('latin-1')),
+            (b'content-length', str(len(body)).encode('latin-1'))
+        ]
+    }, receive)
+
+
+def benchmark_stages(corpus, embedder, vector_store, rounds: int) -> Dict[str, Any]:
+    """
+    Time each stage of a scan separately over the corpus.
+
+    Stages: decode (bounded, reduced-scale decode), preprocess (RGB conversion
+    and resize to the model's input size), encode (model call), query (vector
+    store search) and format (JSON response encoding).
+    """
+    samples: Dict[str, List[float]] = {}
+
+    for _ in range(rounds):
+        for _, data, _ in corpus:
+            image = time_stage(samples, 'decode', decode_image, data)
+            image = time_stage(samples, 'preprocess', resize_for_clip, image)
+            embedding = time_stage(samples, 'encode', embedder.embed_images_batch, [image])[0]
+            products = time_stage(
+                samples, 'query',
+                lambda: vector_store.query_similar_products(query_embedding=embedding, top_k=5, min_score=0.6)
+            )
+            time_stage(samples, 'format', lambda: json.dumps({
+                'success': True,
+                'matches_found': len(products),
+                'products': products
+            }))
+
+    return {stage: summarize(values) for stage, values in samples.items()}
+
+
+async def benchmark_scan_level(corpus, concurrency: int, total_requests: int) -> Dict[str, Any]:
+    """
+    Run `scan_product` with a fixed number of concurrent clients.
+
+    Args:
+        corpus: Fixture images
+        concurrency: Number of requests in flight
+        total_requests: Number of requests to send
+
+    Returns:
+        Latency summary and throughput for this level
+    """
+    latencies: List[float] = []
+    counter = iter(range(total_requests))
+
+    async def client():
+        for i in counter:
+            filename, data, content_type = corpus[i % len(corpus)]
+            request = multipart_request(filename, data, content_type)
+            started = time.perf_counter()
+            await scan_product(request)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    result = {'concurrency': concurrency, 'requests': total_requests}
+    result.update(summarize(latencies))
+    result['throughput_rps'] = round(total_requests / elapsed, 2)
+    return result
+
+
+async def benchmark_index(corpus, product_count: int, workdir: str) -> Dict[str, Any]:
+    """
+    Run a full index job against the stubbed WordPress API.
+
+    Fixture images are served from a local HTTP server so downloads go
+    through the real pipeline.
+    """
+    image_dir = os.path.join(workdir, 'images')
+    os.makedirs(image_dir, exist_ok=True)
+    for filename, data, _ in corpus:
+        with open(os.path.join(image_dir, filename), 'wb') as f:
+            f.write(data)
+
+    server, base_url = serve_directory(image_dir)
+    try:
+        products = [
+            stub_product(i, f"{base_url}/{corpus[i % len(corpus)][0]}?v={i}")
+            for i in range(product_count)
+        ]
+        wordpress_service_module._wordpress_service_instance = StubWordPressService(products)
+        index_manifest_module._index_manifest_instance = IndexManifest(os.path.join(workdir, 'manifest'))
+        product_catalog_module._product_catalog_instance = ProductCatalog(os.path.join(workdir, 'catalog.sqlite3'))
+
+        manager = IndexJobManager(os.path.join(workdir, 'jobs'))
+        index_jobs_module._index_job_manager_instance = manager
+
+        started = time.perf_counter()
+        job = manager.start(max_products=None, incremental=False)
+        await manager.wait(job.job_id)
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+
+    return {
+        'products': product_count,
+        'indexed_count': job.to_dict()['progress']['indexed_count'],
+        'elapsed_seconds': round(elapsed, 3),
+        'products_per_second': round(product_count / elapsed, 2)
+    }
+
+
+def compare_results(previous: Dict[str, Any], current: Dict[str, Any]):
+    """Print the change in key metrics between two result files."""
+    rows = []
+    for stage, values in current.get('stages', {}).items():
+        old = previous.get('stages', {}).get(stage)
+        if old:
+            rows.append((f"stage {stage} p50 ms", old['p50_ms'], values['p50_ms']))
+
+    old_levels = {level['concurrency']: level for level in previous.get('scan', [])}
+    for level in current.get('scan', []):
+        old = old_levels.get(level['concurrency'])
+        if old:
+            rows.append((f"scan c={level['concurrency']} p95 ms", old['p95_ms'], level['p95_ms']))
+            rows.append((f"scan c={level['concurrency']} rps", old['throughput_rps'], level['throughput_rps']))
+
+    if previous.get('index') and current.get('index'):
+        rows.append(("index products/s", previous['index']['products_per_second'], current['index']['products_per_second']))
+    if previous.get('peak_rss_mb') and current.get('peak_rss_mb'):
+        rows.append(("peak RSS MB", previous['peak_rss_mb'], current['peak_rss_mb']))
+
+    print(f"\nComparison with {previous.get('meta', {}).get('git_commit')}:")
+    for name, old, new in rows:
+        change = ((new - old) / old * 100) if old else 0.0
+        print(f"  {name:<28} {old:>10} -> {new:<10} ({change:+.1f}%)")
+
+
+async def run(args) -> Dict[str, Any]:
+    corpus = load_corpus(args.images) if args.images else build_corpus(args.corpus_size)
+    if not corpus:
+        raise SystemExit("No fixture images found")
+
+    workdir = tempfile.mkdtemp(prefix='hippiekit-bench-')
+
+    if args.stub_embedder:
+        embedder = StubEmbedder(call_latency_ms=args.stub_call_ms, image_latency_ms=args.stub_image_ms)
+    else:
+        embedder = CLIPEmbedder()
+    embedder.warm_up()
+    clip_embedder_module._clip_embedder_instance = embedder
+
+    vector_store = StubVectorStore(
+        path=os.path.join(workdir, 'index'),
+        catalog_size=args.catalog_size,
+        latency_ms=args.vector_latency_ms
+    )
+    pinecone_service_module._pinecone_service_instance = vector_store
+
+    results: Dict[str, Any] = {
+        'meta': {
+            'git_commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'embedder': getattr(embedder, 'model_name', type(embedder).__name__),
+            'config': vars(args)
+        }
+    }
+
+    print(f"Corpus: {len(corpus)} images, catalog: {args.catalog_size} vectors")
+
+    # The routes log every request; keep the benchmark output readable
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    print("Timing scan stages...")
+    results['stages'] = benchmark_stages(corpus, embedder, vector_store, args.stage_rounds)
+
+    results['scan'] = []
+    for concurrency in args.concurrency:
+        print(f"Scanning with concurrency {concurrency}...")
+        with quiet:
+            results['scan'].append(await benchmark_scan_level(corpus, concurrency, args.requests))
+
+    if args.index_products:
+        print(f"Indexing {args.index_products} products...")
+        with quiet:
+            results['index'] = await benchmark_index(corpus, args.index_products, workdir)
+
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', help="Directory of fixture images (default: synthetic corpus)")
+    parser.add_argument('--corpus-size', type=int, default=16, help="Number of synthetic fixture images")
+    parser.add_argument('--catalog-size', type=int, default=5000, help="Number of vectors in the stub vector store")
+    parser.add_argument('--concurrency', type=lambda s: [int(c) for c in s.split(',')], default=[1, 4, 16],
+                        help="Comma-separated concurrency levels for /scan")
+    parser.add_argument('--requests', type=int, default=64, help="Scan requests per concurrency level")
+    parser.add_argument('--stage-rounds', type=int, default=2, help="Passes over the corpus for stage timings")
+    parser.add_argument('--index-products', type=int, default=200, help="Products to index (0 to skip)")
+    parser.add_argument('--vector-latency-ms', type=float, default=0.0, help="Simulated vector store round trip")
+    parser.add_argument('--stub-embedder', action='store_true', help="Use a stub embedder instead of CLIP")
+    parser.add_argument('--stub-call-ms', type=float, default=20.0, help="Stub embedder latency per model call")
+    parser.add_argument('--stub-image-ms', type=float, default=5.0, help="Stub embedder latency per image")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument('--compare', help="Previous result file to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['meta']['git_commit'] or 'nogit'}.json")
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    print(json.dumps({key: results[key] for key in results if key != 'meta'}, indent=2))
+    print(f"\nResults saved to: {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare_results(json.load(f), results)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
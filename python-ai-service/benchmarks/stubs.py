@@ -0,0 +1,146 @@
+import hashlib
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from models.clip_embedder import load_rgb_image
+from services import LocalVectorIndex
+
+
+class StubEmbedder:
+    """
+    Stand-in for CLIPEmbedder that returns deterministic vectors.
+
+    Still decodes and converts every image, and can simulate per-call and
+    per-image model latency, so the harness can be exercised without torch.
+    """
+
+    model_name = 'stub-clip'
+
+    def __init__(self, dimension: int = 512, call_latency_ms: float = 0.0, image_latency_ms: float = 0.0):
+        self.dimension = dimension
+        self.call_latency = call_latency_ms / 1000.0
+        self.image_latency = image_latency_ms / 1000.0
+
+    def _vector(self, image) -> np.ndarray:
+        seed = int(hashlib.md5(image.resize((8, 8)).tobytes()).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+
+    def embed_image(self, image) -> np.ndarray:
+        return self.embed_images_batch([image])[0]
+
+    def embed_images_batch(self, images: list) -> np.ndarray:
+        pil_images = [load_rgb_image(image) for image in images]
+        time.sleep(self.call_latency + self.image_latency * len(pil_images))
+        if not pil_images:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.stack([self._vector(image) for image in pil_images])
+
+    def embed_texts(self, texts: list) -> np.ndarray:
+        time.sleep(self.call_latency)
+        vectors = [
+            np.random.default_rng(int(hashlib.md5(text.encode('utf-8')).hexdigest()[:8], 16))
+            .standard_normal(self.dimension).astype(np.float32)
+            for text in texts
+        ]
+        return np.stack(vectors) if vectors else np.zeros((0, self.dimension), dtype=np.float32)
+
+    def warm_up(self):
+        pass
+
+    @property
+    def embedding_dimension(self) -> int:
+        return self.dimension
+
+
+class StubVectorStore:
+    """
+    Vector store backed by a LocalVectorIndex with a random catalog.
+
+    Adds an optional fixed latency per call to model the network round trip
+    of a hosted vector database.
+    """
+
+    def __init__(self, path: str, catalog_size: int = 5000, dimension: int = 512, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.index = LocalVectorIndex(path=path, dimension=dimension)
+
+        rng = np.random.default_rng(0)
+        products = [stub_product(i) for i in range(catalog_size)]
+        self.index.upsert_products(products, rng.standard_normal((catalog_size, dimension)).astype(np.float32))
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+    def upsert_products(self, products: List[Dict[str, Any]], embeddings: np.ndarray):
+        time.sleep(self.latency)
+        self.index.upsert_products(products, embeddings)
+
+    def upsert_stream(self, pairs, on_upserted=None, batch_size: int = 100) -> int:
+        def on_batch(chunk):
+            time.sleep(self.latency)
+            if on_upserted is not None:
+                on_upserted(chunk)
+        return self.index.upsert_stream(pairs, on_upserted=on_batch, batch_size=batch_size)
+
+    def query_similar_products(self, query_embedding: np.ndarray, top_k: int = 5, min_score: float = 0.6):
+        time.sleep(self.latency)
+        # Random catalog vectors never reach the production threshold, so always return top_k
+        return self.index.query_similar_products(query_embedding, top_k=top_k, min_score=-1.0)
+
+    def get_index_stats(self) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        return self.index.get_index_stats()
+
+
+def stub_product(i: int, image_url: str = '') -> Dict[str, Any]:
+    """Build a catalog product shaped like WordPressService output."""
+    return {
+        'id': 100000 + i,
+        'name': f"Benchmark product {i}",
+        'price': '9.99',
+        'image_url': image_url,
+        'permalink': f"https://example.com/products/{i}",
+        'description': 'Organic, plastic-free benchmark product. ' * 8,
+        'modified': '2024-01-01T00:00:00'
+    }
+
+
+class StubWordPressService:
+    """Serves a fixed product list whose images point at the local fixture server."""
+
+    def __init__(self, products: List[Dict[str, Any]]):
+        self.products = products
+
+    def fetch_products(self, max_products: Optional[int] = None, **kwargs) -> List[Dict[str, Any]]:
+        return [dict(product) for product in self.products[:max_products]]
+
+    def fetch_page(self, page: int, per_page: int = 100) -> List[Dict[str, Any]]:
+        return [dict(product) for product in self.products[(page - 1) * per_page:page * per_page]]
+
+    def iter_products(self, max_products: Optional[int] = None, **kwargs) -> Iterator[Dict[str, Any]]:
+        return iter(self.fetch_products(max_products))
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(directory: str) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serve a directory over HTTP on a free local port.
+
+    Args:
+        directory: Directory to serve
+
+    Returns:
+        Tuple of (server, base URL); call server.shutdown() when done
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(_QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
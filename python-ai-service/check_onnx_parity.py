@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Compare ONNX Runtime CLIP embeddings against the PyTorch model.
+
+Embeds a sample of images with both backends and reports the cosine
+agreement, so CLIP_BACKEND=onnx (optionally with CLIP_ONNX_QUANTIZE) can be
+turned on safely.
+
+Usage:
+    python check_onnx_parity.py                 # sample catalog images from WordPress
+    python check_onnx_parity.py path/to/images  # use local image files
+    python check_onnx_parity.py --quantize      # check the int8 model
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+
+import requests
+from PIL import Image
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from models import CLIPEmbedder, ONNXCLIPEmbedder, compare_embedders, primary_model_name
+from services import get_wordpress_service
+
+
+def load_local_images(directory: str, limit: int) -> list:
+    """Load up to `limit` images from a directory."""
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if len(images) >= limit:
+            break
+        try:
+            images.append(Image.open(os.path.join(directory, name)).convert('RGB'))
+        except Exception:
+            continue
+    return images
+
+
+def load_catalog_images(limit: int) -> list:
+    """Download up to `limit` product images from WordPress."""
+    images = []
+    for product in get_wordpress_service().fetch_products(max_products=limit):
+        try:
+            response = requests.get(product['image_url'], timeout=10)
+            response.raise_for_status()
+            images.append(Image.open(io.BytesIO(response.content)).convert('RGB'))
+        except Exception as e:
+            print(f"Skipping product {product.get('id')}: {e}")
+    return images
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('image_dir', nargs='?', help="Directory of sample images (defaults to catalog images)")
+    parser.add_argument('--samples', type=int, default=50, help="Number of images to compare")
+    parser.add_argument('--quantize', action='store_true', help="Check the int8 quantized model")
+    parser.add_argument('--min-cosine', type=float, default=0.99, help="Fail if any sample agrees less than this")
+    args = parser.parse_args()
+
+    images = load_local_images(args.image_dir, args.samples) if args.image_dir else load_catalog_images(args.samples)
+    if not images:
+        print("❌ No sample images found")
+        return 1
+
+    # Both backends load the model and thread count the service would use
+    model_name = primary_model_name()
+    num_threads = int(os.getenv('INFERENCE_THREADS', 0)) or None
+
+    print(f"Comparing backends for {model_name} on {len(images)} images...")
+    reference = CLIPEmbedder(model_name=model_name, num_threads=num_threads)
+    candidate = ONNXCLIPEmbedder(
+        model_name=model_name,
+        onnx_dir=os.getenv('CLIP_ONNX_DIR', 'data/onnx'),
+        quantize=args.quantize,
+        num_threads=num_threads
+    )
+
+    report = compare_embedders(reference, candidate, images)
+    report['backend'] = candidate.model_name
+    print(json.dumps(report, indent=2))
+
+    if report['min_cosine'] < args.min_cosine:
+        print(f"❌ Minimum cosine {report['min_cosine']:.4f} is below {args.min_cosine}")
+        return 1
+
+    print("✅ ONNX backend agrees with PyTorch")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
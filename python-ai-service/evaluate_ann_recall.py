@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Measure recall and latency of the ANN index against the exact scan.
+
+Builds an AnnVectorIndex over the local index's vectors (or a synthetic
+clustered catalog), queries it with perturbed copies of stored vectors, and
+reports recall@k against the exact top-k plus query latency for each
+ef_search (HNSW) or nprobe (IVF-PQ) setting, so ANN_* settings can be picked
+for a target recall.
+
+Usage:
+    python evaluate_ann_recall.py                          # vectors at LOCAL_INDEX_PATH
+    python evaluate_ann_recall.py --synthetic 200000       # synthetic catalog
+    python evaluate_ann_recall.py --index-type ivfpq --nprobe 4,8,16,32
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from services import AnnVectorIndex, LocalVectorIndex
+
+
+def synthetic_catalog(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, roughly like embeddings of product variants."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, count // 20), dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)]
+    vectors += 0.5 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentile_ms(latencies, q: float) -> float:
+    return round(float(np.percentile(latencies, q)) * 1000, 3)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--synthetic', type=int, default=0, help="Use N synthetic vectors instead of LOCAL_INDEX_PATH")
+    parser.add_argument('--index-type', choices=['hnsw', 'ivfpq'], default=os.getenv('ANN_INDEX_TYPE', 'hnsw'))
+    parser.add_argument('--queries', type=int, default=200, help="Number of queries")
+    parser.add_argument('--top-k', type=int, default=5, help="Results per query")
+    parser.add_argument('--noise', type=float, default=0.3, help="Query perturbation relative to a stored vector")
+    parser.add_argument('--ef-search', default='16,32,64,128', help="HNSW ef_search values to sweep")
+    parser.add_argument('--nprobe', default='4,8,16,32,64', help="IVF-PQ nprobe values to sweep")
+    args = parser.parse_args()
+
+    dimension = 512
+    if args.synthetic:
+        matrix = synthetic_catalog(args.synthetic, dimension)
+    else:
+        local = LocalVectorIndex(os.getenv('LOCAL_INDEX_PATH', 'data/local_index'))
+        stored, _, _, dead_rows = local._state
+        matrix = np.asarray(stored[np.setdiff1d(np.arange(len(stored)), dead_rows)])
+    if len(matrix) == 0:
+        print("No vectors to evaluate (index the catalog first or pass --synthetic N)")
+        return 1
+
+    rng = np.random.default_rng(1)
+    queries = matrix[rng.integers(0, len(matrix), args.queries)]
+    queries = queries + args.noise * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(dimension)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        index = AnnVectorIndex(
+            path=workdir,
+            dimension=dimension,
+            index_type=args.index_type,
+            hnsw_m=int(os.getenv('ANN_HNSW_M', 32)),
+            ef_construction=int(os.getenv('ANN_EF_CONSTRUCTION', 200)),
+            nlist=int(os.getenv('ANN_IVF_NLIST', 0)),
+            pq_m=int(os.getenv('ANN_PQ_M', 64)),
+            min_size=1,
+            refine_factor=int(os.getenv('ANN_REFINE_FACTOR', 4))
+        )
+        started = time.perf_counter()
+        index.upsert_products([{'id': i} for i in range(len(matrix))], matrix)
+        index.flush()
+        on_disk = sum(os.path.getsize(os.path.join(workdir, name)) for name in os.listdir(workdir))
+        print(f"Indexed {len(matrix)} vectors in {time.perf_counter() - started:.1f}s "
+              f"({on_disk / 1e6:.1f} MB on disk, including preallocated rows)")
+
+        exact_matrix, _, _, exact_dead = index._state
+        exact = []
+        exact_latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            rows, _ = LocalVectorIndex._search(
+                index, exact_matrix, index._normalize(query), args.top_k, exact_dead
+            )
+            exact_latencies.append(time.perf_counter() - started)
+            exact.append({str(row) for row in rows})
+        print(f"Exact scan: p50 {percentile_ms(exact_latencies, 50)} ms, p95 {percentile_ms(exact_latencies, 95)} ms\n")
+
+        name = 'ef_search' if args.index_type == 'hnsw' else 'nprobe'
+        values = args.ef_search if args.index_type == 'hnsw' else args.nprobe
+        print(f"{name:>10} {'recall@' + str(args.top_k):>10} {'p50 ms':>8} {'p95 ms':>8}")
+        for value in [int(v) for v in values.split(',')]:
+            setattr(index, 'ef_search' if args.index_type == 'hnsw' else 'nprobe', value)
+            index._configure(index._ann)
+
+            hits = 0
+            latencies = []
+            for query, expected in zip(queries, exact):
+                started = time.perf_counter()
+                results = index.query_similar_products(query, top_k=args.top_k, min_score=-1.0)
+                latencies.append(time.perf_counter() - started)
+                hits += len(expected & {result['id'] for result in results})
+
+            recall = hits / (len(queries) * min(args.top_k, len(matrix)))
+            print(f"{value:>10} {recall:>10.3f} {percentile_ms(latencies, 50):>8} {percentile_ms(latencies, 95):>8}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
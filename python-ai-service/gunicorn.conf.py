@@ -0,0 +1,63 @@
+"""
+Gunicorn configuration for production serving.
+
+Runs WEB_CONCURRENCY Uvicorn workers forked from a master that has already
+imported the app and loaded the CLIP weights (preload_app), so the ~600 MB
+of model weights are shared copy-on-write instead of loaded per worker.
+The local vector index is a memory-mapped .npy file, so every worker maps
+the same page-cache pages and the embedding matrix is shared as well.
+
+Workers do not share anything written after the fork. An index job runs
+in one worker; the others pick up its flushed index version (and rebuild
+or extend their ANN index) on their next query, drop their query caches
+when the shared QUERY_CACHE_GENERATION_PATH file is touched, and reload
+the index manifest when they start a job. /metrics counters, the query
+and embedding caches and the in-memory state of index jobs are per
+worker: scrape each worker separately, or run a single worker when exact
+totals matter.
+
+Usage:
+    gunicorn main:app -c gunicorn.conf.py
+"""
+
+import gc
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8001)}"
+workers = int(os.getenv('WEB_CONCURRENCY', max(2, multiprocessing.cpu_count() // 2)))
+worker_class = 'uvicorn.workers.UvicornWorker'
+preload_app = os.getenv('PRELOAD_MODEL', 'true').lower() == 'true'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Split the cores between workers so concurrent model calls do not oversubscribe the CPU
+os.environ.setdefault('INFERENCE_THREADS', str(max(1, multiprocessing.cpu_count() // workers)))
+
+
+def when_ready(server):
+    """Load the model in the master, after the app is imported and before workers fork."""
+    if not server.cfg.preload_app:
+        return
+
+    from models import preload_clip_model
+
+    if preload_clip_model():
+        # Move everything allocated so far out of the collector's reach, so
+        # collections in the workers do not write to (and un-share) these pages
+        gc.freeze()
+        server.log.info("CLIP model preloaded in master; workers will share it")
+
+
+def post_fork(server, worker):
+    """Give each worker its share of intra-op threads (the master was held at one)."""
+    import sys
+
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(int(os.environ['INFERENCE_THREADS']))
@@ -15,7 +15,7 @@ Write-Host ""
 
 try {
     $response = Invoke-WebRequest `
-        -Uri "http://localhost:8001/index/products?max_products=$MaxProducts" `
+        -Uri "http://localhost:8001/index/products?max_products=$MaxProducts&wait=true" `
         -Method POST `
         -ContentType "application/json"
     
@@ -48,3 +48,4 @@ Write-Host "  .\index-products.ps1 -MaxProducts 50" -ForegroundColor White
 Write-Host ""
 Write-Host "To index all products, run:" -ForegroundColor Cyan
 Write-Host "  Invoke-WebRequest -Uri 'http://localhost:8001/index/products' -Method POST" -ForegroundColor White
+Write-Host "  (returns a job_id; check progress at http://localhost:8001/index/jobs/<job_id>)" -ForegroundColor White
@@ -2,148 +2,102 @@
 """
 Script to index 20 products from page 2 of WordPress into Pinecone.
 Run this script to populate the Pinecone index with products.
+
+Runs an index job through the same job engine as POST /index/products,
+so progress is checkpointed and an interrupted run can be resumed:
+
+    python index_page2.py                 # skip unchanged products
+    python index_page2.py --full          # re-embed every product
+    python index_page2.py --resume JOB_ID # continue a failed or interrupted run
 """
 
 import asyncio
-import requests
-from PIL import Image
-import io
-import numpy as np
-import os
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 # Import services
-from services import get_pinecone_service, get_wordpress_service
-from models import get_clip_embedder
+from services import get_index_job_manager
+
 
+async def index_page2_products(full_reindex: bool = False, resume_job_id: str = None):
+    """
+    Index 20 products from page 2 of WordPress into Pinecone.
+
+    Args:
+        full_reindex: Re-embed every product instead of skipping unchanged ones
+        resume_job_id: Resume this job instead of starting a new one
+    """
 
-async def index_page2_products():
-    """Index 20 products from page 2 of WordPress into Pinecone."""
-    
     print("\n" + "="*60)
     print("Indexing 20 Products from Page 2 of WordPress")
     print("="*60 + "\n")
-    
+
     try:
-        # Initialize services
-        wordpress_service = get_wordpress_service()
-        pinecone_service = get_pinecone_service()
-        clip_embedder = get_clip_embedder()
-        
-        # Fetch products from page 2 (20 products max)
-        print("📥 Fetching 20 products from WordPress page 2...")
-        products = []
-        page = 2
-        per_page = 20
-        
-        params = {
-            'page': page,
-            'per_page': per_page
-        }
-        
-        try:
-            response = requests.get(
-                os.getenv('WORDPRESS_API_URL', 
-                         'https://dodgerblue-otter-660921.hostingersite.com/wp-json/wp/v2/products/'),
-                params=params,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            batch = response.json()
-            
-            # Process each product
-            for product in batch:
-                processed = wordpress_service._process_product(product)
-                if processed and processed.get('image_url'):
-                    products.append(processed)
-            
-            print(f"✓ Found {len(products)} products with images on page 2\n")
-            
-        except Exception as e:
-            print(f"❌ Error fetching products: {e}")
-            return
-        
-        if not products:
-            print("❌ No products with images found on page 2")
-            return
-        
-        # Download images and generate embeddings
-        print(f"🤖 Processing {len(products)} products with CLIP model...")
+        manager = get_index_job_manager()
+
+        if resume_job_id:
+            job = manager.resume(resume_job_id)
+            if job is None:
+                print(f"❌ Index job {resume_job_id} not found")
+                return
+        else:
+            # Skip products whose modified time and image URL are unchanged since the last run
+            job = manager.start(page=2, per_page=20, incremental=not full_reindex)
+
+        print(f"🤖 Index job {job.job_id} started (resume with: python index_page2.py --resume {job.job_id})")
         print("-" * 60)
-        
-        valid_products = []
-        embeddings = []
-        
-        for i, product in enumerate(products, 1):
-            try:
-                image_url = product.get('image_url')
-                product_name = product.get('name', 'Unknown')
-                
-                print(f"[{i:2d}/{len(products)}] Processing: {product_name[:50]}")
-                
-                # Download image
-                response = requests.get(image_url, timeout=10)
-                response.raise_for_status()
-                
-                # Load and process image
-                image = Image.open(io.BytesIO(response.content))
-                
-                # Generate CLIP embedding
-                embedding = clip_embedder.embed_image(image)
-                
-                valid_products.append(product)
-                embeddings.append(embedding)
-                
-                print(f"       ✓ Embedded successfully (embedding size: {len(embedding)})")
-                
-            except Exception as e:
-                print(f"       ❌ Error: {str(e)[:60]}")
-                continue
-        
+
+        # Report progress until the job finishes
+        waiter = asyncio.ensure_future(manager.wait(job.job_id))
+        while not waiter.done():
+            await asyncio.wait({waiter}, timeout=2)
+            info = job.to_dict()
+            progress = info['progress']
+            print(f"   {info['status']}: {progress['indexed_count']} indexed, "
+                  f"{progress['skipped_count']} skipped, {progress['unchanged_count']} unchanged "
+                  f"({info['products_per_second']} products/s)")
+
+        info = job.to_dict()
+        progress = info['progress']
         print("-" * 60)
-        print(f"\n✓ Successfully processed {len(valid_products)}/{len(products)} products\n")
-        
-        if not valid_products:
+
+        if info['status'] != 'completed':
+            print(f"\n❌ Index job {info['status']}: {info['error']}")
+            print(f"   Resume with: python index_page2.py --resume {job.job_id}\n")
+            return
+
+        print(f"\n✓ Successfully indexed {progress['indexed_count']} products "
+              f"({progress['reused_count']} reused unchanged images) in {info['elapsed_seconds']}s\n")
+
+        if not progress['indexed_count'] and not progress['unchanged_count'] and not progress['resumed_count']:
             print("❌ No valid products to index")
             return
-        
-        # Convert embeddings to numpy array
-        embeddings_array = np.array(embeddings)
-        
-        # Upsert to Pinecone
-        print(f"📤 Upserting {len(valid_products)} products to Pinecone...")
-        print("-" * 60)
-        
-        pinecone_service.upsert_products(valid_products, embeddings_array)
-        
-        print("-" * 60)
-        print("✓ Products successfully upserted to Pinecone!\n")
-        
-        # Get and display index stats
-        stats = pinecone_service.get_index_stats()
-        
+
+        # Display index stats
+        stats = info['index_stats'] or {}
+
         print("📊 Pinecone Index Statistics:")
         print("-" * 60)
-        print(f"Total vectors in index: {stats.get('total_vector_count', 'N/A')}")
+        print(f"Total vectors in index: {stats.get('total_vectors', 'N/A')}")
         print(f"Index dimension: {stats.get('dimension', 'N/A')}")
         print(f"Index fullness: {stats.get('index_fullness', 'N/A')}")
         print("-" * 60)
-        
+
         print("\n" + "="*60)
         print("✅ Indexing Complete!")
         print("="*60 + "\n")
-        
+
         # Summary
         print("Summary:")
         print(f"  • Page indexed: 2")
-        print(f"  • Products indexed: {len(valid_products)}")
+        print(f"  • Products indexed: {progress['indexed_count']}")
+        print(f"  • Products unchanged: {progress['unchanged_count']}")
         print(f"  • Embedding model: CLIP ViT-B/32")
-        print(f"  • Total vectors in Pinecone: {stats.get('total_vector_count', 'N/A')}\n")
-        
+        print(f"  • Total vectors in Pinecone: {stats.get('total_vectors', 'N/A')}\n")
+
     except Exception as e:
         print(f"\n❌ Error during indexing: {e}")
         import traceback
@@ -151,4 +105,6 @@ async def index_page2_products():
 
 
 if __name__ == "__main__":
-    asyncio.run(index_page2_products())
+    args = sys.argv[1:]
+    resume_job_id = args[args.index('--resume') + 1] if '--resume' in args[:-1] else None
+    asyncio.run(index_page2_products(full_reindex='--full' in args, resume_job_id=resume_job_id))
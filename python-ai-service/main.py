@@ -1,19 +1,81 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
+import threading
+import time
 import uvicorn
 import os
 
-from routers import scan_router, index_router
-
 # Load environment variables
 load_dotenv()
 
+from models import flush_embedding_cache, get_clip_embedder, get_model_registry, get_shadow_evaluator
+from routers import scan_router, index_router, search_router
+from services import get_pinecone_service
+from services.executors import shutdown_executors
+from services.index_jobs import shutdown_index_jobs
+from services.metrics import registry as metrics_registry
+
+# Readiness of the heavy dependencies, filled in by the background warm-up
+readiness = {
+    'model_loaded': False,
+    'vector_store_ready': False,
+    'warmup_seconds': None,
+    'error': None
+}
+
+def warm_up():
+    """Load the CLIP model and vector store and run a dummy inference."""
+    started = time.perf_counter()
+    try:
+        embedder = get_clip_embedder()
+        embedder.warm_up()
+        readiness['model_loaded'] = True
+        
+        get_pinecone_service()
+        readiness['vector_store_ready'] = True
+        
+        readiness['warmup_seconds'] = round(time.perf_counter() - started, 2)
+        print(f"Warm-up complete in {readiness['warmup_seconds']}s")
+    except Exception as e:
+        readiness['error'] = str(e)
+        print(f"Error during warm-up: {e}")
+        return
+    
+    # Load the shadow model too, so sampled scans do not wait for it
+    shadow = get_shadow_evaluator()
+    if shadow is not None:
+        try:
+            registry = get_model_registry()
+            registry.embedder(shadow.model).warm_up()
+            registry.vector_store(shadow.model)
+            print(f"Shadow model {shadow.model} loaded")
+        except Exception as e:
+            print(f"Error loading shadow model {shadow.model}: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start warming up in the background so / and /health answer immediately."""
+    # Fail fast on a SHADOW_MODEL missing from EMBEDDING_MODELS
+    shadow = get_shadow_evaluator()
+    if os.getenv('EAGER_WARMUP', 'true').lower() == 'true':
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+    yield
+    # Running index jobs are cancelled and left resumable from their last checkpoint
+    await shutdown_index_jobs()
+    if shadow is not None:
+        shadow.shutdown()
+    shutdown_executors()
+    flush_embedding_cache()
+
 # Create FastAPI app
 app = FastAPI(
     title="Hippiekit AI Service",
     description="AI-powered product recognition using CLIP and Pinecone",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -28,6 +90,7 @@ app.add_middleware(
 # Include routers
 app.include_router(scan_router, tags=["scan"])
 app.include_router(index_router, tags=["index"])
+app.include_router(search_router, tags=["search"])
 
 @app.get("/")
 async def root():
@@ -46,6 +109,36 @@ async def health_check():
         "service": "hippiekit-ai"
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint: 200 once the model and vector store are loaded, 503 until then."""
+    ready = readiness['model_loaded'] and readiness['vector_store_ready']
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            'status': 'ready' if ready else 'starting',
+            'service': 'hippiekit-ai',
+            **readiness
+        }
+    )
+
+@app.get("/models")
+async def list_models():
+    """Registered embedding models and, in shadow mode, how the shadow model compares with the primary."""
+    shadow = get_shadow_evaluator()
+    return {
+        'models': get_model_registry().describe(),
+        'shadow': shadow.stats() if shadow is not None else None
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: per-stage latencies, model batch sizes, cache hits and vector store errors."""
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4"
+    )
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8001))
     
@@ -63,6 +156,7 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=port,
-        reload=True,
+        # Development only; production runs gunicorn with gunicorn.conf.py
+        reload=os.getenv('UVICORN_RELOAD', 'false').lower() == 'true',
         log_level="info"
     )
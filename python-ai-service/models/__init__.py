@@ -1,4 +1,30 @@
 # Models package
-from .clip_embedder import CLIPEmbedder, get_clip_embedder
+from .clip_embedder import CLIPEmbedder, get_clip_embedder, preload_clip_model, primary_model_name
+from .onnx_clip_embedder import ONNXCLIPEmbedder, compare_embedders
+from .embedding_cache import EmbeddingCache, CachedEmbedder, flush_embedding_cache, get_embedding_cache
+from .text_embedding_cache import TextEmbeddingCache, get_text_embedding_cache
+from .embedding_batcher import EmbeddingBatcher, get_embedding_batcher
+from .registry import ModelRegistry, PRIMARY_MODEL, get_model_registry
+from .shadow import ShadowEvaluator, get_shadow_evaluator
 
-__all__ = ['CLIPEmbedder', 'get_clip_embedder']
+__all__ = [
+    'CLIPEmbedder',
+    'get_clip_embedder',
+    'preload_clip_model',
+    'primary_model_name',
+    'ONNXCLIPEmbedder',
+    'compare_embedders',
+    'EmbeddingCache',
+    'CachedEmbedder',
+    'get_embedding_cache',
+    'flush_embedding_cache',
+    'TextEmbeddingCache',
+    'get_text_embedding_cache',
+    'EmbeddingBatcher',
+    'get_embedding_batcher',
+    'ModelRegistry',
+    'PRIMARY_MODEL',
+    'get_model_registry',
+    'ShadowEvaluator',
+    'get_shadow_evaluator'
+]
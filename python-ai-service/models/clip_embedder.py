@@ -1,8 +1,59 @@
-from sentence_transformers import SentenceTransformer
 from PIL import Image
 import numpy as np
-from typing import Union
+from typing import List, Optional, Union
 import io
+import os
+import threading
+import time
+
+from services.metrics import MODEL_BATCH_SIZE, MODEL_INFERENCE_SECONDS
+
+def load_rgb_image(image: Union[Image.Image, bytes, str]) -> Image.Image:
+    """
+    Convert an image input to an RGB PIL Image.
+    
+    Args:
+        image: PIL Image, image bytes, or path to image file
+        
+    Returns:
+        RGB PIL Image
+    """
+    if isinstance(image, bytes):
+        image = Image.open(io.BytesIO(image))
+    elif isinstance(image, str):
+        image = Image.open(image)
+        
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+        
+    return image
+
+def encode_clip_texts(model, texts: List[str], model_name: str) -> np.ndarray:
+    """
+    Encode texts with a SentenceTransformer CLIP model.
+    
+    The CLIP tokenizer does not truncate, so texts longer than the 77-token
+    context are cut first instead of failing the whole batch.
+    
+    Args:
+        model: SentenceTransformer CLIP model
+        texts: Texts to encode
+        model_name: Model label for metrics
+        
+    Returns:
+        numpy array of embeddings (len(texts) x 512)
+    """
+    tokenizer = model[0].processor.tokenizer
+    max_tokens = tokenizer.model_max_length - 2  # start and end tokens
+    
+    truncated = []
+    for text in texts:
+        tokens = tokenizer.tokenize(text)
+        truncated.append(tokenizer.convert_tokens_to_string(tokens[:max_tokens]) if len(tokens) > max_tokens else text)
+    
+    MODEL_BATCH_SIZE.observe(len(truncated), model=f"{model_name}:text")
+    with MODEL_INFERENCE_SECONDS.time(model=f"{model_name}:text"):
+        return model.encode(truncated, convert_to_numpy=True)
 
 class CLIPEmbedder:
     """
@@ -10,14 +61,23 @@ class CLIPEmbedder:
     Uses SentenceTransformer's CLIP implementation for consistency.
     """
     
-    def __init__(self, model_name: str = 'clip-ViT-B-32'):
+    def __init__(self, model_name: str = 'clip-ViT-B-32', num_threads: Optional[int] = None):
         """
         Initialize the CLIP model.
         
         Args:
             model_name: Name of the pre-trained CLIP model
+            num_threads: Intra-op threads for torch (None keeps torch's default)
         """
+        # Imported here so that importing this module does not pull in torch
+        from sentence_transformers import SentenceTransformer
+        
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        
         print(f"Loading CLIP model: {model_name}...")
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
         print("CLIP model loaded successfully!")
         
@@ -31,18 +91,12 @@ class CLIPEmbedder:
         Returns:
             numpy array of embeddings (512 dimensions for ViT-B/32)
         """
-        # Convert bytes to PIL Image if needed
-        if isinstance(image, bytes):
-            image = Image.open(io.BytesIO(image))
-        elif isinstance(image, str):
-            image = Image.open(image)
-            
-        # Ensure RGB format
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        image = load_rgb_image(image)
             
         # Generate embedding
-        embedding = self.model.encode(image, convert_to_numpy=True)
+        MODEL_BATCH_SIZE.observe(1, model=self.model_name)
+        with MODEL_INFERENCE_SECONDS.time(model=self.model_name):
+            embedding = self.model.encode(image, convert_to_numpy=True)
         
         return embedding
     
@@ -57,23 +111,31 @@ class CLIPEmbedder:
             numpy array of embeddings (batch_size x 512)
         """
         # Process all images to PIL format
-        pil_images = []
-        for img in images:
-            if isinstance(img, bytes):
-                img = Image.open(io.BytesIO(img))
-            elif isinstance(img, str):
-                img = Image.open(img)
-            
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-                
-            pil_images.append(img)
+        pil_images = [load_rgb_image(img) for img in images]
         
         # Generate embeddings in batch
-        embeddings = self.model.encode(pil_images, convert_to_numpy=True)
+        MODEL_BATCH_SIZE.observe(len(pil_images), model=self.model_name)
+        with MODEL_INFERENCE_SECONDS.time(model=self.model_name):
+            embeddings = self.model.encode(pil_images, convert_to_numpy=True)
         
         return embeddings
     
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for texts in the same space as the image embeddings.
+        
+        Args:
+            texts: List of texts (e.g. product names and descriptions)
+            
+        Returns:
+            numpy array of embeddings (len(texts) x 512)
+        """
+        return encode_clip_texts(self.model, texts, self.model_name)
+    
+    def warm_up(self):
+        """Run a dummy inference so the first real request does not pay one-off setup costs."""
+        self.embed_image(Image.new('RGB', (224, 224)))
+    
     @property
     def embedding_dimension(self) -> int:
         """Get the dimension of embeddings produced by this model."""
@@ -82,15 +144,105 @@ class CLIPEmbedder:
 
 # Global instance to avoid reloading model on each request
 _clip_embedder_instance = None
+_clip_embedder_lock = threading.Lock()
 
-def get_clip_embedder() -> CLIPEmbedder:
+def get_clip_embedder():
     """
     Get or create the global CLIP embedder instance.
     This ensures the model is only loaded once.
+    
+    CLIP_MODEL_NAME selects the model (default clip-ViT-B-32) and
+    CLIP_BACKEND the inference backend: 'torch' (default) or 'onnx'
+    (ONNX Runtime, int8-quantized when CLIP_ONNX_QUANTIZE is true). Unless
+    EMBEDDING_CACHE_ENABLED is false, the embedder is wrapped in a
+    CachedEmbedder so repeated images skip the model.
     """
     global _clip_embedder_instance
     
-    if _clip_embedder_instance is None:
-        _clip_embedder_instance = CLIPEmbedder()
+    if _clip_embedder_instance is not None:
+        return _clip_embedder_instance
+    
+    # The background warm-up and the first request may race to load the model
+    with _clip_embedder_lock:
+        if _clip_embedder_instance is None:
+            _clip_embedder_instance = _create_clip_embedder()
         
     return _clip_embedder_instance
+
+def clip_embedder_loaded() -> bool:
+    """Whether the global CLIP embedder has been created (without loading it)."""
+    return _clip_embedder_instance is not None
+
+def primary_model_name() -> str:
+    """Name of the primary embedding model, from CLIP_MODEL_NAME."""
+    return os.getenv('CLIP_MODEL_NAME', 'clip-ViT-B-32')
+
+def create_backend(model_name: str):
+    """
+    Create a raw embedder for a model with the backend selected by CLIP_BACKEND.
+    
+    Args:
+        model_name: Name of the pre-trained CLIP model
+        
+    Returns:
+        CLIPEmbedder or ONNXCLIPEmbedder
+    """
+    backend = os.getenv('CLIP_BACKEND', 'torch').lower()
+    num_threads = int(os.getenv('INFERENCE_THREADS', 0)) or None
+    
+    if backend == 'onnx':
+        from .onnx_clip_embedder import ONNXCLIPEmbedder
+        return ONNXCLIPEmbedder(
+            model_name=model_name,
+            onnx_dir=os.getenv('CLIP_ONNX_DIR', 'data/onnx'),
+            quantize=os.getenv('CLIP_ONNX_QUANTIZE', 'false').lower() == 'true',
+            num_threads=num_threads
+        )
+    elif backend == 'torch':
+        return CLIPEmbedder(model_name=model_name, num_threads=num_threads)
+    else:
+        raise ValueError(f"Unknown CLIP_BACKEND: {backend}")
+
+def _create_clip_embedder():
+    """Create the embedder selected by CLIP_BACKEND, wrapped in the embedding cache if enabled."""
+    embedder = _preloaded_backend if _preloaded_backend is not None else create_backend(primary_model_name())
+    
+    if os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true':
+        from .embedding_cache import CachedEmbedder, get_embedding_cache
+        embedder = CachedEmbedder(embedder, get_embedding_cache())
+    
+    return embedder
+
+# Model loaded in a pre-fork server's master process, shared copy-on-write with the workers
+_preloaded_backend = None
+
+def preload_clip_model() -> bool:
+    """
+    Load the CLIP weights before worker processes are forked.
+    
+    Only the model is loaded: no inference runs and the embedding cache
+    (a SQLite connection) is not opened, since neither is safe to carry
+    across fork(). Torch is held at one thread so no OpenMP pool exists
+    in the master; workers set their own thread count after forking.
+    The ONNX backend is not preloaded because ONNX Runtime sessions own
+    thread pools that do not survive fork().
+    
+    Only the weights stay shared: the vector index, caches and metrics are
+    created per worker after the fork (see gunicorn.conf.py).
+    
+    Returns:
+        True if the model was preloaded
+    """
+    global _preloaded_backend
+    
+    if os.getenv('CLIP_BACKEND', 'torch').lower() != 'torch':
+        print("Skipping model preload: only the torch backend can be shared across workers")
+        return False
+    
+    with _clip_embedder_lock:
+        if _preloaded_backend is None:
+            import torch
+            torch.set_num_threads(1)
+            _preloaded_backend = CLIPEmbedder(model_name=primary_model_name())
+    
+    return True
@@ -0,0 +1,145 @@
+import asyncio
+import os
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from services.executors import get_inference_executor, run_inference
+
+from .clip_embedder import get_clip_embedder
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embedding requests into batched model calls.
+
+    Callers await `embed()` with a single image. Requests arriving within
+    `max_wait_ms` of each other (up to `max_batch_size`) are run through
+    `embed_images_batch` together on the inference executor, and each caller
+    receives its own vector.
+    """
+
+    def __init__(self, embedder=None, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        """
+        Initialize the batcher.
+
+        Args:
+            embedder: Object exposing `embed_images_batch` (defaults to the global CLIP embedder)
+            max_batch_size: Maximum number of images per model call
+            max_wait_ms: How long to wait for more requests after the first one arrives
+        """
+        self._embedder = embedder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = get_clip_embedder()
+        return self._embedder
+
+    def _embed_images(self, images: List[Any]) -> np.ndarray:
+        # Resolved on the worker thread so a first-time model load never blocks the event loop
+        return self.embedder.embed_images_batch(images)
+
+    def _ensure_worker(self):
+        """Start the collector task on the running event loop if needed."""
+        loop = asyncio.get_running_loop()
+
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def embed(self, image: Any) -> np.ndarray:
+        """
+        Embed a single image, sharing a model call with concurrent requests.
+
+        Args:
+            image: PIL Image, image bytes, or path to image file
+
+        Returns:
+            numpy array of embeddings (512 dimensions for ViT-B/32)
+        """
+        self._ensure_worker()
+
+        future = self._loop.create_future()
+        await self._queue.put((image, future))
+        return await future
+
+    async def embed_batch(self, images: List[Any]) -> np.ndarray:
+        """
+        Embed several images from one request in a single model call.
+
+        The images already form a batch, so they bypass the coalescing
+        window and go straight to `embed_images_batch`.
+
+        Args:
+            images: List of PIL Images, image bytes, or paths
+
+        Returns:
+            numpy array of shape (len(images), embedding_dim)
+        """
+        return await run_inference(self._embed_images, images)
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        """Wait for one request, then gather more until the batch is full or the window closes."""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        # Drop requests whose callers have gone away
+        return [(image, future) for image, future in batch if not future.cancelled()]
+
+    async def _run(self):
+        """Collector loop: batch pending requests and dispatch them to the inference executor."""
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+
+            images = [image for image, _ in batch]
+            try:
+                embeddings = await self._loop.run_in_executor(
+                    get_inference_executor(), self._embed_images, images
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+
+# Global instance shared by all scan requests
+_embedding_batcher_instance = None
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """
+    Get or create the global embedding batcher.
+    Batch size and wait window are read from SCAN_BATCH_MAX_SIZE and SCAN_BATCH_MAX_WAIT_MS.
+    """
+    global _embedding_batcher_instance
+
+    if _embedding_batcher_instance is None:
+        _embedding_batcher_instance = EmbeddingBatcher(
+            max_batch_size=int(os.getenv('SCAN_BATCH_MAX_SIZE', 16)),
+            max_wait_ms=float(os.getenv('SCAN_BATCH_MAX_WAIT_MS', 5))
+        )
+
+    return _embedding_batcher_instance
@@ -0,0 +1,330 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from services.metrics import EMBEDDING_CACHE_REQUESTS
+
+from .clip_embedder import load_rgb_image
+
+
+class EmbeddingCache:
+    """
+    Content-addressed store of image embeddings.
+
+    An in-memory LRU sits in front of a size-bounded SQLite table. Keys are
+    hashes of the decoded pixels plus the model name, so the same picture
+    uploaded twice (or re-downloaded during a reindex) maps to the same entry.
+
+    Lookups and inserts never commit on their own: new embeddings and the
+    last-used times of disk hits are buffered in memory and written in one
+    transaction once `write_batch_size` are pending or `write_interval`
+    seconds have passed, so the hot path does not pay a commit per image.
+    Buffered embeddings are still served from memory, and at most one
+    interval's worth of them is lost if the process dies.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        memory_size: int = 1024,
+        max_entries: int = 100000,
+        write_batch_size: int = 64,
+        write_interval: float = 5.0
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            path: Path of the SQLite database file
+            memory_size: Maximum number of embeddings kept in memory
+            max_entries: Maximum number of embeddings kept on disk
+            write_batch_size: Number of buffered writes that triggers a commit
+            write_interval: Maximum seconds a write stays buffered (checked on each access)
+        """
+        self.path = path
+        self.memory_size = max(0, memory_size)
+        self.max_entries = max(1, max_entries)
+        self.write_batch_size = max(1, write_batch_size)
+        self.write_interval = write_interval
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        # Buffered writes: new embeddings, and last-used times of disk hits
+        self._pending_puts: Dict[str, Tuple[np.ndarray, float]] = {}
+        self._pending_touches: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            'key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+        self._db.commit()
+        self._disk_entries = self._db.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+
+    @staticmethod
+    def make_key(image: Image.Image, model_name: str) -> str:
+        """
+        Build the cache key for a decoded image.
+
+        Args:
+            image: RGB PIL Image
+            model_name: Name of the model producing the embedding
+
+        Returns:
+            Hex digest identifying the image pixels and model
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(model_name.encode('utf-8'))
+        digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode('utf-8'))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        """Insert into the in-memory LRU. Caller must hold the lock."""
+        if not self.memory_size:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Look up an embedding.
+
+        Args:
+            key: Cache key from `make_key`
+
+        Returns:
+            Cached embedding or None
+        """
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is None and key in self._pending_puts:
+                vector = self._pending_puts[key][0]
+            if vector is not None:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                else:
+                    self._remember(key, vector)
+                self._counters['memory_hits'] += 1
+                EMBEDDING_CACHE_REQUESTS.inc(result='memory_hit')
+                self._maybe_flush()
+                return vector
+
+            row = self._db.execute('SELECT vector FROM embeddings WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self._counters['misses'] += 1
+                EMBEDDING_CACHE_REQUESTS.inc(result='miss')
+                self._maybe_flush()
+                return None
+
+            vector = np.frombuffer(row[0], dtype=np.float32).copy()
+            self._pending_touches[key] = time.time()
+            self._remember(key, vector)
+            self._counters['disk_hits'] += 1
+            EMBEDDING_CACHE_REQUESTS.inc(result='disk_hit')
+            self._maybe_flush()
+            return vector
+
+    def put(self, key: str, vector: np.ndarray):
+        """
+        Store an embedding (written to disk with the next batch).
+
+        Args:
+            key: Cache key from `make_key`
+            vector: Embedding to store
+        """
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+
+        with self._lock:
+            self._remember(key, vector)
+            self._pending_puts[key] = (vector, time.time())
+            self._pending_touches.pop(key, None)
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        """Write buffered changes if enough are pending or they are old enough. Caller must hold the lock."""
+        pending = len(self._pending_puts) + len(self._pending_touches)
+        if pending and (pending >= self.write_batch_size
+                        or time.monotonic() - self._flushed_at >= self.write_interval):
+            self._flush()
+
+    def _flush(self):
+        """
+        Write buffered embeddings and last-used times in one transaction, evicting
+        the least recently used entries if the disk store is full. Caller must hold the lock.
+        """
+        puts, self._pending_puts = self._pending_puts, {}
+        touches, self._pending_touches = self._pending_touches, {}
+        self._flushed_at = time.monotonic()
+        if not puts and not touches:
+            return
+
+        try:
+            with self._db:
+                if touches:
+                    self._db.executemany(
+                        'UPDATE embeddings SET last_used = ? WHERE key = ?',
+                        [(last_used, key) for key, last_used in touches.items()]
+                    )
+                if puts:
+                    self._db.executemany(
+                        'INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)',
+                        [(key, vector.tobytes(), last_used) for key, (vector, last_used) in puts.items()]
+                    )
+                    self._disk_entries = self._db.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+
+                if self._disk_entries > self.max_entries:
+                    # Evict a slice at a time so eviction is not paid on every batch
+                    excess = self._disk_entries - self.max_entries + max(1, self.max_entries // 10)
+                    cursor = self._db.execute(
+                        'DELETE FROM embeddings WHERE key IN '
+                        '(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)',
+                        (excess,)
+                    )
+                    self._counters['evictions'] += cursor.rowcount
+                    self._disk_entries -= cursor.rowcount
+        except sqlite3.Error as e:
+            # A cache write failing (e.g. the database is locked by another worker) only costs a recompute later
+            print(f"Error writing embedding cache: {e}")
+
+    def flush(self):
+        """Write all buffered changes to disk."""
+        with self._lock:
+            self._flush()
+
+    def clear(self):
+        """Remove all cached embeddings."""
+        with self._lock:
+            self._memory.clear()
+            self._pending_puts.clear()
+            self._pending_touches.clear()
+            self._db.execute('DELETE FROM embeddings')
+            self._db.commit()
+            self._disk_entries = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and current sizes."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._memory)
+            stats['disk_entries'] = self._disk_entries
+
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class CachedEmbedder:
+    """
+    Wraps an embedder so that images already seen skip the model.
+
+    Exposes the same `embed_image` / `embed_images_batch` API as CLIPEmbedder;
+    any other attribute is delegated to the wrapped embedder.
+    """
+
+    def __init__(self, embedder, cache: EmbeddingCache):
+        """
+        Initialize the wrapper.
+
+        Args:
+            embedder: Embedder to call on cache misses
+            cache: Embedding cache to consult first
+        """
+        self.embedder = embedder
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.embedder, name)
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.embedder, 'model_name', 'unknown')
+
+    def embed_image(self, image) -> np.ndarray:
+        """
+        Generate embedding for an image, using the cache when possible.
+
+        Args:
+            image: PIL Image, image bytes, or path to image file
+
+        Returns:
+            numpy array of embeddings (512 dimensions for ViT-B/32)
+        """
+        return self.embed_images_batch([image])[0]
+
+    def embed_images_batch(self, images: list) -> np.ndarray:
+        """
+        Generate embeddings for multiple images, only running the model on cache misses.
+
+        Args:
+            images: List of PIL Images, image bytes, or paths
+
+        Returns:
+            numpy array of embeddings (batch_size x 512)
+        """
+        if not images:
+            return self.embedder.embed_images_batch([])
+
+        pil_images = [load_rgb_image(image) for image in images]
+        keys = [EmbeddingCache.make_key(image, self.model_name) for image in pil_images]
+
+        results: List[Optional[np.ndarray]] = [self.cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(results) if vector is None]
+
+        if missing:
+            computed = self.embedder.embed_images_batch([pil_images[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                vector = np.asarray(vector, dtype=np.float32)
+                self.cache.put(keys[i], vector)
+                results[i] = vector
+
+        return np.stack(results)
+
+
+# Global instance
+_embedding_cache_instance = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Get or create the global embedding cache.
+    Location and bounds come from EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_SIZE
+    and EMBEDDING_CACHE_MAX_ENTRIES; writes are batched per EMBEDDING_CACHE_WRITE_BATCH
+    and EMBEDDING_CACHE_WRITE_INTERVAL_SECONDS.
+    """
+    global _embedding_cache_instance
+
+    if _embedding_cache_instance is None:
+        with _embedding_cache_lock:
+            if _embedding_cache_instance is None:
+                _embedding_cache_instance = EmbeddingCache(
+                    path=os.getenv('EMBEDDING_CACHE_PATH', 'data/embedding_cache.sqlite3'),
+                    memory_size=int(os.getenv('EMBEDDING_CACHE_MEMORY_SIZE', 1024)),
+                    max_entries=int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 100000)),
+                    write_batch_size=int(os.getenv('EMBEDDING_CACHE_WRITE_BATCH', 64)),
+                    write_interval=float(os.getenv('EMBEDDING_CACHE_WRITE_INTERVAL_SECONDS', 5))
+                )
+
+    return _embedding_cache_instance
+
+def flush_embedding_cache():
+    """Write buffered cache entries at shutdown, without creating the cache if unused."""
+    if _embedding_cache_instance is not None:
+        _embedding_cache_instance.flush()
@@ -0,0 +1,191 @@
+import io
+import os
+from typing import BinaryIO, Optional, Union
+
+from PIL import Image
+
+# Shortest side CLIP ViT-B/32 resizes to before center-cropping
+CLIP_INPUT_SIZE = 224
+
+# EXIF orientation tag value -> transpose needed to display the image upright
+_EXIF_ORIENTATION_TAG = 0x0112
+_ORIENTATION_TRANSPOSE = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+
+
+# Leading bytes of the formats PIL decodes out of the box, checked before an upload is fully received
+SNIFF_BYTES = 12
+_MAGIC_NUMBERS = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'BM', 'BMP'),
+    (b'II*\x00', 'TIFF'),
+    (b'MM\x00*', 'TIFF'),
+)
+
+
+def sniff_image_format(header: bytes) -> Optional[str]:
+    """
+    Identify an image format from its first bytes.
+
+    Args:
+        header: The first SNIFF_BYTES bytes of the file (fewer if it is shorter)
+
+    Returns:
+        PIL format name, or None if the bytes do not start a supported image
+    """
+    header = bytes(header[:SNIFF_BYTES])
+    for magic, image_format in _MAGIC_NUMBERS:
+        if header.startswith(magic):
+            return image_format
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+class InvalidImageError(ValueError):
+    """The input could not be decoded as an image."""
+
+
+class ImageTooLargeError(ValueError):
+    """The input exceeds the configured byte or pixel limits."""
+
+
+def _default_max_bytes() -> int:
+    return int(os.getenv('SCAN_MAX_UPLOAD_BYTES', 20 * 1024 * 1024))
+
+
+def _default_max_pixels() -> int:
+    return int(os.getenv('SCAN_MAX_IMAGE_PIXELS', 50_000_000))
+
+
+def decode_image(
+    source: Union[bytes, BinaryIO],
+    target_size: int = CLIP_INPUT_SIZE,
+    max_bytes: Optional[int] = None,
+    max_pixels: Optional[int] = None
+) -> Image.Image:
+    """
+    Decode an image with bounded cost.
+
+    Limits are checked before any pixel data is decoded. JPEGs are decoded
+    in draft mode at the smallest DCT scale that still covers target_size,
+    and EXIF orientation is applied to the (already reduced) result.
+
+    Args:
+        source: Encoded image bytes or a seekable binary file object
+        target_size: Shortest side the image will be resized to afterwards
+        max_bytes: Maximum encoded size (defaults to SCAN_MAX_UPLOAD_BYTES)
+        max_pixels: Maximum width x height (defaults to SCAN_MAX_IMAGE_PIXELS)
+
+    Returns:
+        Decoded, upright PIL Image
+
+    Raises:
+        ImageTooLargeError: If the byte or pixel limits are exceeded
+        InvalidImageError: If the data is not a decodable image
+    """
+    max_bytes = _default_max_bytes() if max_bytes is None else max_bytes
+    max_pixels = _default_max_pixels() if max_pixels is None else max_pixels
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        size = len(source)
+        source = io.BytesIO(source)
+    else:
+        source.seek(0, os.SEEK_END)
+        size = source.tell()
+        source.seek(0)
+
+    if max_bytes and size > max_bytes:
+        raise ImageTooLargeError(f"Image is {size} bytes; the limit is {max_bytes} bytes")
+
+    try:
+        # Only parses the header; no pixel data is decoded yet
+        image = Image.open(source)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+    except Exception as e:
+        raise InvalidImageError(str(e)) from e
+
+    width, height = image.size
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLargeError(f"Image is {width}x{height} pixels; the limit is {max_pixels} pixels")
+
+    try:
+        orientation = image.getexif().get(_EXIF_ORIENTATION_TAG, 1)
+    except Exception:
+        orientation = 1
+
+    # JPEG only: decode at 1/2, 1/4 or 1/8 scale while both sides stay >= target_size
+    image.draft('RGB', (target_size, target_size))
+
+    try:
+        image.load()
+    except Exception as e:
+        raise InvalidImageError(str(e)) from e
+
+    transpose = _ORIENTATION_TRANSPOSE.get(orientation)
+    if transpose is not None:
+        image = image.transpose(transpose)
+
+    return image
+
+
+def resize_for_clip(image: Image.Image, target_size: int = CLIP_INPUT_SIZE) -> Image.Image:
+    """
+    Convert to RGB and shrink so the shortest side equals target_size.
+
+    CLIP's own preprocessing resizes the shortest side to 224 with bicubic
+    resampling before center-cropping, so doing it here gives the model the
+    same pixels while the expensive large-image work happens only once.
+
+    Args:
+        image: Decoded PIL Image
+        target_size: Shortest side to resize to
+
+    Returns:
+        RGB PIL Image (unchanged in size if already small enough)
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    width, height = image.size
+    shortest = min(width, height)
+    if shortest <= target_size:
+        return image
+
+    scale = target_size / shortest
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    # reducing_gap: box-reduce by an integer factor first, then resample the last 2x bicubically
+    return image.resize(size, Image.BICUBIC, reducing_gap=2.0)
+
+
+def prepare_image(
+    source: Union[bytes, BinaryIO],
+    target_size: int = CLIP_INPUT_SIZE,
+    max_bytes: Optional[int] = None,
+    max_pixels: Optional[int] = None
+) -> Image.Image:
+    """
+    Decode and downscale an image to CLIP's input scale with bounded time and memory.
+
+    Args:
+        source: Encoded image bytes or a seekable binary file object
+        target_size: Shortest side to resize to
+        max_bytes: Maximum encoded size (defaults to SCAN_MAX_UPLOAD_BYTES)
+        max_pixels: Maximum width x height (defaults to SCAN_MAX_IMAGE_PIXELS)
+
+    Returns:
+        Upright RGB PIL Image whose shortest side is at most target_size
+    """
+    image = decode_image(source, target_size=target_size, max_bytes=max_bytes, max_pixels=max_pixels)
+    return resize_for_clip(image, target_size=target_size)
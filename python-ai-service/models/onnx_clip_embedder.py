@@ -0,0 +1,220 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+from services.metrics import MODEL_BATCH_SIZE, MODEL_INFERENCE_SECONDS
+
+from .clip_embedder import encode_clip_texts, load_rgb_image
+
+
+class ONNXCLIPEmbedder:
+    """
+    CLIP image embedder running the vision tower on ONNX Runtime.
+
+    The vision encoder and projection of the SentenceTransformer CLIP model
+    are exported to ONNX once (optionally int8 dynamically quantized) and
+    cached on disk. Exposes the same `embed_image` / `embed_images_batch`
+    API as CLIPEmbedder and produces embeddings of the same dimension.
+    Text embeddings (`embed_texts`) use the PyTorch text tower, loaded on
+    first use.
+    """
+
+    def __init__(
+        self,
+        model_name: str = 'clip-ViT-B-32',
+        onnx_dir: str = 'data/onnx',
+        quantize: bool = False,
+        num_threads: Optional[int] = None
+    ):
+        """
+        Initialize the ONNX backend, exporting the model if needed.
+
+        Args:
+            model_name: Name of the pre-trained CLIP model
+            onnx_dir: Directory where exported ONNX models are cached
+            quantize: Use int8 dynamic quantization for the weights
+            num_threads: Intra-op threads for ONNX Runtime (None keeps its default)
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("CLIP_BACKEND=onnx requires the onnx and onnxruntime packages (pip install -r requirements-optional.txt)") from e
+
+        self.base_model_name = model_name
+        self.quantize = quantize
+        self.model_name = f"{model_name}:onnx{'-int8' if quantize else ''}"
+
+        os.makedirs(onnx_dir, exist_ok=True)
+        export_path = os.path.join(onnx_dir, f"{model_name}-vision.onnx")
+        processor_path = os.path.join(onnx_dir, f"{model_name}-processor")
+        model_path = export_path.replace('.onnx', '.int8.onnx') if quantize else export_path
+
+        print(f"Loading CLIP preprocessing for: {model_name}...")
+        from transformers import CLIPImageProcessor
+        from sentence_transformers import SentenceTransformer
+
+        if not (os.path.exists(export_path) and os.path.exists(processor_path)):
+            # The PyTorch model is only needed once, to export the graph and preprocessing config
+            clip_model = SentenceTransformer(model_name)[0]
+            clip_model.processor.image_processor.save_pretrained(processor_path)
+            self._export(clip_model.model, export_path)
+            del clip_model
+
+        if quantize and not os.path.exists(model_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            print(f"Quantizing ONNX model to int8: {model_path}")
+            quantize_dynamic(export_path, model_path, weight_type=QuantType.QInt8)
+
+        self.processor = CLIPImageProcessor.from_pretrained(processor_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self._input_name = self.session.get_inputs()[0].name
+        self._dimension = self.session.get_outputs()[0].shape[-1]
+        self._text_model = None
+        self._text_model_lock = threading.Lock()
+
+        print(f"ONNX CLIP model loaded successfully from: {model_path}")
+
+    @staticmethod
+    def _export(clip_model, path: str):
+        """
+        Export the vision tower and projection of a transformers CLIPModel to ONNX.
+
+        Args:
+            clip_model: transformers CLIPModel
+            path: Destination ONNX file
+        """
+        import torch
+
+        class VisionEncoder(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, pixel_values):
+                return self.model.get_image_features(pixel_values=pixel_values)
+
+        encoder = VisionEncoder(clip_model).eval()
+        size = clip_model.config.vision_config.image_size
+        dummy = torch.zeros(1, 3, size, size, dtype=torch.float32)
+
+        print(f"Exporting CLIP vision encoder to ONNX: {path}")
+        tmp_path = path + '.tmp'
+        with torch.no_grad():
+            torch.onnx.export(
+                encoder,
+                (dummy,),
+                tmp_path,
+                input_names=['pixel_values'],
+                output_names=['image_embeds'],
+                dynamic_axes={'pixel_values': {0: 'batch'}, 'image_embeds': {0: 'batch'}},
+                opset_version=14
+            )
+        os.replace(tmp_path, path)
+
+    def embed_image(self, image: Union[Image.Image, bytes, str]) -> np.ndarray:
+        """
+        Generate embedding for an image.
+
+        Args:
+            image: PIL Image, image bytes, or path to image file
+
+        Returns:
+            numpy array of embeddings (512 dimensions for ViT-B/32)
+        """
+        return self.embed_images_batch([image])[0]
+
+    def embed_images_batch(self, images: list) -> np.ndarray:
+        """
+        Generate embeddings for multiple images.
+
+        Args:
+            images: List of PIL Images, image bytes, or paths
+
+        Returns:
+            numpy array of embeddings (batch_size x 512)
+        """
+        if not images:
+            return np.zeros((0, self._dimension), dtype=np.float32)
+
+        pil_images = [load_rgb_image(img) for img in images]
+        MODEL_BATCH_SIZE.observe(len(pil_images), model=self.model_name)
+        with MODEL_INFERENCE_SECONDS.time(model=self.model_name):
+            pixel_values = self.processor(images=pil_images, return_tensors='np')['pixel_values']
+            outputs = self.session.run(None, {self._input_name: pixel_values.astype(np.float32)})
+
+        return outputs[0]
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for texts in the same space as the image embeddings.
+
+        Args:
+            texts: List of texts (e.g. product names and descriptions)
+
+        Returns:
+            numpy array of embeddings (len(texts) x 512)
+        """
+        if self._text_model is None:
+            with self._text_model_lock:
+                if self._text_model is None:
+                    from sentence_transformers import SentenceTransformer
+
+                    print(f"Loading CLIP text encoder: {self.base_model_name}...")
+                    self._text_model = SentenceTransformer(self.base_model_name)
+
+        return encode_clip_texts(self._text_model, texts, self.model_name)
+
+    def warm_up(self):
+        """Run a dummy inference so the first real request does not pay one-off setup costs."""
+        self.embed_image(Image.new('RGB', (224, 224)))
+
+    @property
+    def embedding_dimension(self) -> int:
+        """Get the dimension of embeddings produced by this model."""
+        return self._dimension
+
+
+def compare_embedders(reference, candidate, images: List[Any]) -> Dict[str, Any]:
+    """
+    Measure how closely a candidate embedder agrees with a reference one.
+
+    Args:
+        reference: Reference embedder (e.g. the PyTorch CLIPEmbedder)
+        candidate: Embedder under test (e.g. ONNXCLIPEmbedder)
+        images: Sample images (PIL Images, bytes or paths)
+
+    Returns:
+        Cosine similarity statistics between paired embeddings
+    """
+    expected = np.asarray(reference.embed_images_batch(images), dtype=np.float32)
+    actual = np.asarray(candidate.embed_images_batch(images), dtype=np.float32)
+
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    actual /= np.linalg.norm(actual, axis=1, keepdims=True)
+    cosine = np.sum(expected * actual, axis=1)
+
+    # Also check that nearest-neighbour rankings within the sample are preserved
+    same_neighbour = None
+    if len(images) > 1:
+        expected_sim = expected @ expected.T
+        actual_sim = actual @ actual.T
+        np.fill_diagonal(expected_sim, -np.inf)
+        np.fill_diagonal(actual_sim, -np.inf)
+        same_neighbour = float(np.mean(expected_sim.argmax(axis=1) == actual_sim.argmax(axis=1)))
+
+    return {
+        'samples': len(images),
+        'mean_cosine': float(cosine.mean()),
+        'min_cosine': float(cosine.min()),
+        'p05_cosine': float(np.percentile(cosine, 5)),
+        'nearest_neighbour_agreement': same_neighbour
+    }
@@ -0,0 +1,199 @@
+import os
+import re
+import threading
+from typing import Any, Dict, List
+
+from .clip_embedder import clip_embedder_loaded, create_backend, get_clip_embedder, primary_model_name
+
+# Key of the model serving live scans
+PRIMARY_MODEL = 'default'
+
+_KEY_PATTERN = re.compile(r'[a-z0-9][a-z0-9_-]{0,31}')
+
+
+def parse_model_specs(spec: str) -> Dict[str, str]:
+    """
+    Parse an EMBEDDING_MODELS value such as "b16=clip-ViT-B-16,l14=clip-ViT-L-14".
+
+    Args:
+        spec: Comma-separated key=model_name pairs
+
+    Returns:
+        Model names keyed by model key
+
+    Raises:
+        ValueError: If an entry is malformed or a key is invalid
+    """
+    models = {}
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        key, sep, model_name = entry.partition('=')
+        key, model_name = key.strip().lower(), model_name.strip()
+        if not sep or not model_name:
+            raise ValueError(f"Invalid EMBEDDING_MODELS entry: {entry!r} (expected key=model_name)")
+        if not _KEY_PATTERN.fullmatch(key) or key == PRIMARY_MODEL:
+            raise ValueError(f"Invalid embedding model key: {key!r}")
+        models[key] = model_name
+    return models
+
+
+class ModelRegistry:
+    """
+    Named embedding models, each paired with its own vector index namespace.
+
+    The primary model ('default') serves live scans; its embedder and vector
+    store are the global get_clip_embedder() / get_pinecone_service()
+    instances. Candidate models are loaded on first use, side by side with
+    the primary, and keep their vectors and index manifest apart under their
+    key, so they can be indexed and shadow-evaluated without touching the
+    primary index.
+    """
+
+    def __init__(self, candidates: Dict[str, str]):
+        """
+        Initialize the registry. No model is loaded until it is used.
+
+        Args:
+            candidates: Sentence-transformers model names keyed by model key
+        """
+        self.candidates = dict(candidates)
+        self._embedders: Dict[str, Any] = {}
+        self._vector_stores: Dict[str, Any] = {}
+        self._manifests: Dict[str, Any] = {}
+        # Reentrant: creating a vector store loads the embedder for its dimension
+        self._lock = threading.RLock()
+
+    def keys(self) -> List[str]:
+        """Keys of all registered models, primary first."""
+        return [PRIMARY_MODEL] + list(self.candidates)
+
+    def __contains__(self, key: str) -> bool:
+        return key == PRIMARY_MODEL or key in self.candidates
+
+    def _check(self, key: str):
+        if key not in self:
+            raise KeyError(f"Unknown embedding model: {key} (registered: {', '.join(self.keys())})")
+
+    def model_name(self, key: str) -> str:
+        """Sentence-transformers name of a registered model."""
+        self._check(key)
+        return primary_model_name() if key == PRIMARY_MODEL else self.candidates[key]
+
+    def embedder(self, key: str = PRIMARY_MODEL):
+        """
+        Get the embedder of a model, loading it on first use.
+
+        Args:
+            key: Model key
+
+        Returns:
+            Embedder, wrapped in the embedding cache unless EMBEDDING_CACHE_ENABLED=false
+
+        Raises:
+            KeyError: If the model is not registered
+        """
+        self._check(key)
+        if key == PRIMARY_MODEL:
+            return get_clip_embedder()
+
+        embedder = self._embedders.get(key)
+        if embedder is not None:
+            return embedder
+
+        with self._lock:
+            if key not in self._embedders:
+                embedder = create_backend(self.candidates[key])
+                if os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true':
+                    from .embedding_cache import CachedEmbedder, get_embedding_cache
+                    embedder = CachedEmbedder(embedder, get_embedding_cache())
+                self._embedders[key] = embedder
+        return self._embedders[key]
+
+    def vector_store(self, key: str = PRIMARY_MODEL):
+        """
+        Get the vector store holding a model's product vectors.
+
+        Args:
+            key: Model key
+
+        Returns:
+            Vector store; candidates use the namespace named after their key
+
+        Raises:
+            KeyError: If the model is not registered
+        """
+        self._check(key)
+        # Imported here: the services package imports from models lazily
+        from services.pinecone_service import create_vector_store, get_pinecone_service
+
+        if key == PRIMARY_MODEL:
+            return get_pinecone_service()
+
+        store = self._vector_stores.get(key)
+        if store is not None:
+            return store
+
+        with self._lock:
+            if key not in self._vector_stores:
+                dimension = self.embedder(key).embedding_dimension
+                self._vector_stores[key] = create_vector_store(dimension=dimension, namespace=key)
+        return self._vector_stores[key]
+
+    def manifest(self, key: str = PRIMARY_MODEL):
+        """
+        Get the index manifest of a model.
+
+        Args:
+            key: Model key
+
+        Returns:
+            IndexManifest; candidates keep theirs at INDEX_MANIFEST_PATH-<key>
+
+        Raises:
+            KeyError: If the model is not registered
+        """
+        self._check(key)
+        from services.index_manifest import IndexManifest, get_index_manifest
+
+        if key == PRIMARY_MODEL:
+            return get_index_manifest(model_name=getattr(get_clip_embedder(), 'model_name', None))
+
+        with self._lock:
+            if key not in self._manifests:
+                path = f"{os.getenv('INDEX_MANIFEST_PATH', 'data/index_manifest')}-{key}"
+                self._manifests[key] = IndexManifest(
+                    path=path, model_name=getattr(self.embedder(key), 'model_name', None)
+                )
+        return self._manifests[key]
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Summary of the registered models (no model is loaded)."""
+        return [
+            {
+                'key': key,
+                'model_name': self.model_name(key),
+                'primary': key == PRIMARY_MODEL,
+                'loaded': clip_embedder_loaded() if key == PRIMARY_MODEL else key in self._embedders
+            }
+            for key in self.keys()
+        ]
+
+
+# Global instance
+_model_registry_instance = None
+_model_registry_lock = threading.Lock()
+
+def get_model_registry() -> ModelRegistry:
+    """Get or create the global model registry, with candidates from EMBEDDING_MODELS."""
+    global _model_registry_instance
+
+    if _model_registry_instance is None:
+        with _model_registry_lock:
+            if _model_registry_instance is None:
+                _model_registry_instance = ModelRegistry(
+                    candidates=parse_model_specs(os.getenv('EMBEDDING_MODELS', ''))
+                )
+
+    return _model_registry_instance
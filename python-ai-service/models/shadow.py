@@ -0,0 +1,208 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+from services.metrics import SHADOW_COMPARISONS, SHADOW_SCAN_SECONDS, SHADOW_TOPK_OVERLAP
+from .registry import ModelRegistry, get_model_registry
+
+
+def topk_overlap(primary_ids: List[str], shadow_ids: List[str]) -> float:
+    """Fraction of the larger of two result lists found in both (1.0 when both are empty)."""
+    if not primary_ids and not shadow_ids:
+        return 1.0
+    return len(set(primary_ids) & set(shadow_ids)) / max(len(primary_ids), len(shadow_ids))
+
+
+def _lower_thread_priority():
+    """Run the calling thread at the lowest scheduling priority (Linux nice 19 per thread)."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+class ShadowEvaluator:
+    """
+    Runs a sample of live scans through a candidate model as well.
+
+    After the primary model has answered a scan, the same image is embedded
+    with the candidate and queried against the candidate's namespace on a
+    dedicated background thread, off the request path. Both models are
+    compared on their raw vector search results (before any re-ranking):
+    latency and agreement (top-k overlap and whether the best match is the
+    same product) are logged and exported as metrics, so models can be
+    compared on production traffic before a cutover.
+
+    The shadow thread never takes a slot in the shared inference pool, so
+    live scans do not queue behind a slow candidate, and it runs at the
+    lowest OS scheduling priority where supported. It still competes with
+    live inference for CPU cores while a comparison is running. When
+    `max_pending` comparisons are queued or running, further samples are
+    dropped rather than queued, so a slow candidate never builds up a
+    backlog.
+    """
+
+    def __init__(self, registry: ModelRegistry, model: str, sample_rate: float = 0.05, max_pending: int = 2):
+        """
+        Initialize the evaluator.
+
+        Args:
+            registry: Model registry holding the candidate
+            model: Key of the candidate model
+            sample_rate: Fraction of scans to shadow (0-1)
+            max_pending: Maximum number of queued or running comparisons
+
+        Raises:
+            KeyError: If the model is not registered
+        """
+        registry.model_name(model)
+        self.registry = registry
+        self.model = model
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.max_pending = max(1, max_pending)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='shadow', initializer=_lower_thread_priority
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {'comparisons': 0, 'top1_matches': 0, 'overlap_sum': 0.0,
+                       'primary_seconds_sum': 0.0, 'shadow_seconds_sum': 0.0,
+                       'dropped': 0, 'errors': 0}
+
+    def maybe_submit(
+        self,
+        image: Image.Image,
+        primary_products: List[Dict[str, Any]],
+        primary_seconds: float,
+        top_k: int = 5,
+        min_score: float = 0.6
+    ) -> bool:
+        """
+        Sample a scan for shadow evaluation. Never blocks.
+
+        Args:
+            image: Scanned image (must not be modified afterwards)
+            primary_products: Vector search matches of the primary model, before re-ranking
+            primary_seconds: Embed and query time of the primary model
+            top_k: Number of results the scan asked for
+            min_score: Minimum similarity score of the scan
+
+        Returns:
+            True if the scan was submitted
+        """
+        if random.random() >= self.sample_rate:
+            return False
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats['dropped'] += 1
+                SHADOW_COMPARISONS.inc(model=self.model, result='dropped')
+                return False
+            self._pending += 1
+
+        primary_ids = [str(product['id']) for product in primary_products]
+        try:
+            self._executor.submit(self._evaluate, image, primary_ids, primary_seconds, top_k, min_score)
+        except RuntimeError:
+            # Shut down
+            with self._lock:
+                self._pending -= 1
+            return False
+        return True
+
+    def _evaluate(self, image: Image.Image, primary_ids: List[str], primary_seconds: float, top_k: int, min_score: float):
+        """Embed and query with the candidate, then compare with the primary results."""
+        try:
+            embedder = self.registry.embedder(self.model)
+            vector_store = self.registry.vector_store(self.model)
+
+            started = time.perf_counter()
+            embedding = embedder.embed_image(image)
+            products = vector_store.query_similar_products(
+                query_embedding=embedding, top_k=top_k, min_score=min_score
+            )
+            shadow_seconds = time.perf_counter() - started
+
+            shadow_ids = [str(product['id']) for product in products]
+            overlap = topk_overlap(primary_ids[:top_k], shadow_ids)
+            top1_match = primary_ids[:1] == shadow_ids[:1]
+
+            SHADOW_SCAN_SECONDS.observe(shadow_seconds, model=self.model)
+            SHADOW_TOPK_OVERLAP.observe(overlap, model=self.model)
+            SHADOW_COMPARISONS.inc(model=self.model, result='top1_match' if top1_match else 'top1_differs')
+            with self._lock:
+                self._stats['comparisons'] += 1
+                self._stats['top1_matches'] += int(top1_match)
+                self._stats['overlap_sum'] += overlap
+                self._stats['primary_seconds_sum'] += primary_seconds
+                self._stats['shadow_seconds_sum'] += shadow_seconds
+
+            print(f"Shadow scan ({self.model}): {shadow_seconds * 1000:.0f}ms vs primary "
+                  f"{primary_seconds * 1000:.0f}ms, top-{top_k} overlap {overlap:.2f}, "
+                  f"top-1 {'matches' if top1_match else 'differs'}")
+
+        except Exception as e:
+            with self._lock:
+                self._stats['errors'] += 1
+            SHADOW_COMPARISONS.inc(model=self.model, result='error')
+            print(f"Error in shadow scan ({self.model}): {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Running summary of the comparisons so far."""
+        with self._lock:
+            stats = dict(self._stats)
+        comparisons = stats['comparisons']
+        return {
+            'model': self.model,
+            'model_name': self.registry.model_name(self.model),
+            'sample_rate': self.sample_rate,
+            'comparisons': comparisons,
+            'dropped': stats['dropped'],
+            'errors': stats['errors'],
+            'mean_topk_overlap': round(stats['overlap_sum'] / comparisons, 4) if comparisons else None,
+            'top1_agreement': round(stats['top1_matches'] / comparisons, 4) if comparisons else None,
+            'mean_primary_ms': round(stats['primary_seconds_sum'] * 1000 / comparisons, 2) if comparisons else None,
+            'mean_shadow_ms': round(stats['shadow_seconds_sum'] * 1000 / comparisons, 2) if comparisons else None
+        }
+
+    def shutdown(self):
+        """Stop the background thread, dropping comparisons that have not started."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global instance
+_shadow_evaluator_instance = None
+_shadow_evaluator_lock = threading.Lock()
+
+def get_shadow_evaluator() -> Optional[ShadowEvaluator]:
+    """
+    Get the global shadow evaluator, or None unless SHADOW_MODEL names a
+    model registered in EMBEDDING_MODELS. Tuned by SHADOW_SAMPLE_RATE and
+    SHADOW_MAX_PENDING.
+    """
+    global _shadow_evaluator_instance
+
+    model = os.getenv('SHADOW_MODEL', '').strip().lower()
+    if not model:
+        return None
+
+    if _shadow_evaluator_instance is None:
+        with _shadow_evaluator_lock:
+            if _shadow_evaluator_instance is None:
+                _shadow_evaluator_instance = ShadowEvaluator(
+                    registry=get_model_registry(),
+                    model=model,
+                    sample_rate=float(os.getenv('SHADOW_SAMPLE_RATE', 0.05)),
+                    max_pending=int(os.getenv('SHADOW_MAX_PENDING', 2))
+                )
+
+    return _shadow_evaluator_instance
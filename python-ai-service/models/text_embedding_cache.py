@@ -0,0 +1,100 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from services.metrics import TEXT_EMBEDDING_CACHE_REQUESTS
+
+
+class TextEmbeddingCache:
+    """
+    In-memory LRU of search query embeddings.
+
+    Queries are keyed by model name and the query text with case and
+    whitespace normalized (the CLIP tokenizer ignores both), so popular
+    searches are answered without running the text encoder.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of query embeddings kept
+        """
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Collapse case and whitespace so equivalent queries share an entry."""
+        return ' '.join(text.lower().split())
+
+    def get(self, text: str, model_name: str) -> Optional[np.ndarray]:
+        """
+        Look up a query embedding.
+
+        Args:
+            text: Query text
+            model_name: Name of the model producing the embedding
+
+        Returns:
+            Cached embedding or None
+        """
+        key = (model_name, self.normalize(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                TEXT_EMBEDDING_CACHE_REQUESTS.inc(result='miss')
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            TEXT_EMBEDDING_CACHE_REQUESTS.inc(result='hit')
+            return vector
+
+    def put(self, text: str, model_name: str, vector: np.ndarray):
+        """
+        Store a query embedding, evicting the least recently used one when full.
+
+        Args:
+            text: Query text
+            model_name: Name of the model producing the embedding
+            vector: Embedding to store
+        """
+        key = (model_name, self.normalize(text))
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache size and hit/miss counters."""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# Global instance
+_text_embedding_cache_instance = None
+_text_embedding_cache_lock = threading.Lock()
+
+def get_text_embedding_cache() -> TextEmbeddingCache:
+    """Get or create the global search query embedding cache (size from SEARCH_QUERY_CACHE_SIZE)."""
+    global _text_embedding_cache_instance
+
+    if _text_embedding_cache_instance is None:
+        with _text_embedding_cache_lock:
+            if _text_embedding_cache_instance is None:
+                _text_embedding_cache_instance = TextEmbeddingCache(
+                    max_entries=int(os.getenv('SEARCH_QUERY_CACHE_SIZE', 4096))
+                )
+
+    return _text_embedding_cache_instance
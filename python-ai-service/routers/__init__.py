@@ -1,5 +1,6 @@
 # Routers package
 from .scan import router as scan_router
 from .index import router as index_router
+from .search import router as search_router
 
-__all__ = ['scan_router', 'index_router']
+__all__ = ['scan_router', 'index_router', 'search_router']
@@ -1,117 +1,186 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional, Dict, Any
-import requests
-from PIL import Image
-import io
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import Optional, Dict, Any, List
+import asyncio
+import os
 
-from models import get_clip_embedder
-from services import get_pinecone_service, get_wordpress_service
+from models import get_model_registry
+from services.executors import run_io
+from services.index_jobs import IndexJob, IndexJobConflictError, get_index_job_manager
 
 router = APIRouter()
 
-@router.post("/index/products")
-async def index_products(max_products: Optional[int] = Query(None, description="Maximum number of products to index")) -> Dict[str, Any]:
+
+def _job_summary(job: IndexJob) -> Dict[str, Any]:
+    """Final result of a finished job, in the shape /index/products has always returned."""
+    if job.status == 'failed':
+        raise HTTPException(
+            status_code=502 if job.error_type == 'WordPressFetchError' else 500,
+            detail=f"Error indexing products: {job.error}"
+        )
+    if job.status != 'completed':
+        raise HTTPException(
+            status_code=409,
+            detail=f"Index job {job.job_id} was {job.status}"
+        )
+    
+    job_info = job.to_dict()
+    progress = job_info['progress']
+    incremental = job.params.get('incremental')
+    
+    if not progress['total_products'] and not incremental:
+        return {
+            'success': False,
+            'message': 'No products found to index',
+            'indexed_count': 0,
+            'job_id': job.job_id
+        }
+    if not progress['indexed_count'] and not incremental:
+        return {
+            'success': False,
+            'message': 'No valid products with images to index',
+            'indexed_count': 0,
+            'job_id': job.job_id
+        }
+    
+    return {
+        'success': True,
+        'message': f"Successfully indexed {progress['indexed_count']} products",
+        'job_id': job.job_id,
+        'indexed_count': progress['indexed_count'],
+        'skipped_count': progress['skipped_count'],
+        'unchanged_count': progress['unchanged_count'],
+        'reused_embedding_count': progress['reused_count'],
+        'deleted_count': progress['deleted_count'],
+        'elapsed_seconds': job_info['elapsed_seconds'],
+        'index_stats': job.index_stats
+    }
+
+
+def _get_job_or_404(job_id: str) -> IndexJob:
+    job = get_index_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Index job {job_id} not found")
+    return job
+
+
+@router.post("/index/products", status_code=202)
+async def index_products(
+    response: Response,
+    max_products: Optional[int] = Query(None, description="Maximum number of products to index"),
+    incremental: bool = Query(False, description="Only re-embed products whose image changed and delete removed products"),
+    model: str = Query('default', description="Embedding model to index with, as registered in EMBEDDING_MODELS"),
+    wait: bool = Query(False, description="Wait for the job to finish and return its result")
+) -> Dict[str, Any]:
     """
     Index products from WordPress into Pinecone vector database.
     
+    Starts a background indexing job and returns its ID immediately; poll
+    GET /index/jobs/{job_id} for progress. With `wait=true` the request
+    blocks until the job finishes and returns the indexing result.
+    
     Args:
-        max_products: Maximum number of products to index (None for all)
+        max_products: Optional limit on number of products to index
+        incremental: Skip products unchanged since the last run (per the local
+            manifest) and delete vectors of products no longer in WordPress
+        model: Key of the embedding model; candidate models index into their own namespace
+        wait: Wait for the job to finish
         
     Returns:
-        Indexing status and statistics
+        Job ID and status, or the indexing result when waiting
     """
+    manager = get_index_job_manager()
     try:
-        # Fetch products from WordPress
-        print("Fetching products from WordPress...")
-        wordpress_service = get_wordpress_service()
-        products = wordpress_service.fetch_products(max_products=max_products)
-        
-        if not products:
-            return {
-                'success': False,
-                'message': 'No products found to index',
-                'indexed_count': 0
-            }
-        
-        # Download and embed product images
-        print(f"Processing {len(products)} products...")
-        valid_products = []
-        embeddings = []
-        
-        clip_embedder = get_clip_embedder()
-        
-        for i, product in enumerate(products):
-            try:
-                # Download image
-                image_url = product.get('image_url')
-                if not image_url:
-                    print(f"Skipping product {product.get('id')} - no image URL")
-                    continue
-                
-                print(f"Processing product {i+1}/{len(products)}: {product.get('name')}")
-                
-                response = requests.get(image_url, timeout=10)
-                response.raise_for_status()
-                
-                # Load image
-                image = Image.open(io.BytesIO(response.content))
-                
-                # Generate embedding
-                embedding = clip_embedder.embed_image(image)
-                
-                valid_products.append(product)
-                embeddings.append(embedding)
-                
-            except Exception as e:
-                print(f"Error processing product {product.get('id')}: {e}")
-                continue
-        
-        if not valid_products:
-            return {
-                'success': False,
-                'message': 'No valid products with images to index',
-                'indexed_count': 0
-            }
-        
-        # Convert embeddings list to numpy array
-        import numpy as np
-        embeddings_array = np.array(embeddings)
-        
-        # Upsert to Pinecone
-        print(f"Upserting {len(valid_products)} products to Pinecone...")
-        pinecone_service = get_pinecone_service()
-        pinecone_service.upsert_products(valid_products, embeddings_array)
-        
-        # Get index stats
-        stats = pinecone_service.get_index_stats()
-        
-        return {
-            'success': True,
-            'message': f'Successfully indexed {len(valid_products)} products',
-            'indexed_count': len(valid_products),
-            'skipped_count': len(products) - len(valid_products),
-            'index_stats': stats
-        }
-        
-    except Exception as e:
-        print(f"Error indexing products: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error indexing products: {str(e)}"
-        )
+        job = manager.start(max_products=max_products, incremental=incremental, model=model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IndexJobConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if wait:
+        await manager.wait(job.job_id)
+        response.status_code = 200
+        return _job_summary(job)
+    
+    return {
+        'success': True,
+        'message': 'Indexing job started',
+        'job_id': job.job_id,
+        'status': job.status,
+        'status_url': f"/index/jobs/{job.job_id}"
+    }
+
+@router.get("/index/jobs")
+async def list_index_jobs() -> Dict[str, Any]:
+    """List indexing jobs, newest first."""
+    jobs = get_index_job_manager().list_jobs()
+    return {
+        'success': True,
+        'jobs': [job.to_dict() for job in jobs]
+    }
+
+@router.get("/index/jobs/{job_id}")
+async def get_index_job(job_id: str) -> Dict[str, Any]:
+    """Get the status, progress and throughput of an indexing job."""
+    job = _get_job_or_404(job_id)
+    return {
+        'success': True,
+        'job': job.to_dict()
+    }
+
+@router.post("/index/jobs/{job_id}/cancel")
+async def cancel_index_job(job_id: str) -> Dict[str, Any]:
+    """Cancel a running indexing job; batches already upserted stay indexed."""
+    _get_job_or_404(job_id)
+    try:
+        job = get_index_job_manager().cancel(job_id)
+    except (ValueError, IndexJobConflictError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return {
+        'success': True,
+        'message': f"Cancelling index job {job_id}",
+        'job': job.to_dict()
+    }
+
+@router.post("/index/jobs/{job_id}/resume", status_code=202)
+async def resume_index_job(job_id: str) -> Dict[str, Any]:
+    """Resume a failed, cancelled or interrupted job from its last checkpoint."""
+    _get_job_or_404(job_id)
+    try:
+        job = get_index_job_manager().resume(job_id)
+    except (ValueError, IndexJobConflictError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return {
+        'success': True,
+        'message': f"Resuming index job {job_id}",
+        'job': job.to_dict()
+    }
 
 @router.get("/index/stats")
-async def get_index_stats() -> Dict[str, Any]:
+async def get_index_stats(
+    model: str = Query('default', description="Embedding model whose index namespace to describe")
+) -> Dict[str, Any]:
     """Get statistics about the Pinecone index."""
+    registry = get_model_registry()
+    if model not in registry:
+        raise HTTPException(status_code=400, detail=f"Unknown embedding model: {model}")
+    
     try:
-        pinecone_service = get_pinecone_service()
-        stats = pinecone_service.get_index_stats()
+        timeout = float(os.getenv('VECTOR_STORE_TIMEOUT_SECONDS', 10))
+        pinecone_service = await run_io(registry.vector_store, model, timeout=timeout)
+        stats = await run_io(pinecone_service.get_index_stats, timeout=timeout)
         
         return {
             'success': True,
             'stats': stats
         }
         
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail="Timed out getting index stats"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -1,70 +1,304 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
 from PIL import Image
-import io
-from typing import List, Dict, Any
+import asyncio
+import os
+import time
+from typing import List, Dict, Any, Tuple
 
-from models import get_clip_embedder
-from services import get_pinecone_service
+import numpy as np
+
+from models import get_embedding_batcher, get_shadow_evaluator
+from models.image_preprocessing import SNIFF_BYTES, prepare_image, sniff_image_format, ImageTooLargeError, InvalidImageError
+from services import get_pinecone_service, get_reranker
+from services.executors import run_cpu, run_io
+from services.metrics import SCAN_STAGE_SECONDS, SCAN_REQUESTS
+from .uploads import StreamedUpload, receive_image_upload
 
 router = APIRouter()
 
-@router.post("/scan")
-async def scan_product(image: UploadFile = File(...)) -> Dict[str, Any]:
+
+def _scan_timeout() -> float:
+    """Request-level deadline for a scan, from SCAN_TIMEOUT_SECONDS."""
+    return float(os.getenv('SCAN_TIMEOUT_SECONDS', 30))
+
+
+async def _load_upload(image: UploadFile) -> Image.Image:
+    """
+    Validate and decode an uploaded image.
+
+    Args:
+        image: Uploaded image file
+
+    Returns:
+        RGB PIL Image at the model's input scale
+    """
+    # Validate file type, by declared content type and by the file's first bytes
+    if not image.content_type or not image.content_type.startswith('image/'):
+        raise HTTPException(
+            status_code=400,
+            detail=f"File must be an image: {image.filename}"
+        )
+    
+    with SCAN_STAGE_SECONDS.time(stage='read'):
+        head = await image.read(SNIFF_BYTES)
+        await image.seek(0)
+    if sniff_image_format(head) is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File must be an image: {image.filename}"
+        )
+
+    # Decoded straight from the spooled upload file, without reading it into bytes
+    return await _decode(image.file)
+
+
+async def _decode(source) -> Image.Image:
+    """Decode an image file at reduced scale and shrink it to the model's input size."""
+    # On the CPU pool, so a burst of decodes never ties up the I/O pool
+    try:
+        with SCAN_STAGE_SECONDS.time(stage='decode'):
+            return await run_cpu(prepare_image, source)
+    except ImageTooLargeError as e:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image too large: {str(e)}"
+        )
+    except InvalidImageError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid image file: {str(e)}"
+        )
+
+
+def _search_products(embedding: np.ndarray) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Search the vector store for products similar to an embedding.
+
+    With the hybrid re-ranker enabled, a wider candidate set is fetched and
+    rescored with the products' precomputed text embeddings.
+
+    Returns:
+        Tuple of (top products, top vector search matches before re-ranking)
+    """
+    pinecone_service = get_pinecone_service()
+    reranker = get_reranker()
+    with SCAN_STAGE_SECONDS.time(stage='query'):
+        matches = pinecone_service.query_similar_products(
+            query_embedding=embedding,
+            top_k=reranker.candidates if reranker is not None else 5,
+            min_score=0.6
+        )
+
+    if reranker is None:
+        return matches, matches
+    with SCAN_STAGE_SECONDS.time(stage='rerank'):
+        return reranker.rerank(embedding, matches, top_k=5), matches[:5]
+
+
+def _query_products(embedding: np.ndarray) -> List[Dict[str, Any]]:
+    """Search the vector store for products similar to an embedding (re-ranked when enabled)."""
+    return _search_products(embedding)[0]
+
+
+def _fuse_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """Average L2-normalized embeddings into a single unit-length query vector."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    fused = (embeddings / np.maximum(norms, 1e-12)).mean(axis=0)
+    return fused / max(float(np.linalg.norm(fused)), 1e-12)
+
+
+async def _receive(request: Request) -> Image.Image:
+    """Stream the `image` field out of a /scan request and decode it in place."""
+    with SCAN_STAGE_SECONDS.time(stage='read'):
+        upload: StreamedUpload = await receive_image_upload(request, field_name='image')
+    try:
+        return await _decode(upload.file)
+    finally:
+        upload.close()
+
+
+async def _scan(request: Request) -> Dict[str, Any]:
+    """Receive, decode, embed and search a single uploaded image."""
+    pil_image = await _receive(request)
+    started = time.perf_counter()
+    
+    # Generate embedding
+    print(f"Generating embedding for uploaded image...")
+    # Concurrent scans are coalesced into a single batched forward pass
+    batcher = get_embedding_batcher()
+    with SCAN_STAGE_SECONDS.time(stage='embed'):
+        embedding = await batcher.embed(pil_image)
+    
+    # Search for similar products
+    print(f"Searching for similar products...")
+    products, matches = await run_io(_search_products, embedding)
+    
+    # A sample of scans is replayed against the shadow model in the background,
+    # compared on raw vector search results since the re-ranker only knows the primary model
+    shadow = get_shadow_evaluator()
+    if shadow is not None:
+        shadow.maybe_submit(pil_image, matches, time.perf_counter() - started)
+    
+    return {
+        'success': True,
+        'matches_found': len(products),
+        'products': products,
+        'message': f'Found {len(products)} matching products' if products else 'No matching products found'
+    }
+
+
+# The body is parsed by hand (see receive_image_upload), so describe it for the OpenAPI docs
+_SCAN_REQUEST_BODY = {
+    'requestBody': {
+        'required': True,
+        'content': {
+            'multipart/form-data': {
+                'schema': {
+                    'type': 'object',
+                    'properties': {'image': {'type': 'string', 'format': 'binary'}},
+                    'required': ['image']
+                }
+            }
+        }
+    }
+}
+
+
+@router.post("/scan", openapi_extra=_SCAN_REQUEST_BODY)
+async def scan_product(request: Request) -> Dict[str, Any]:
     """
     Scan an image to find matching products.
     
+    Expects multipart/form-data with the photo in an `image` field. The
+    upload is streamed into a spooled buffer and decoded in place; requests
+    that declare or stream more than SCAN_MAX_UPLOAD_BYTES, or whose file
+    does not start like a JPEG, PNG, GIF, WebP, BMP or TIFF image, are
+    rejected as soon as that is known, without receiving the rest.
+    
+    The whole scan, including receiving the upload, runs under
+    SCAN_TIMEOUT_SECONDS; on timeout the request is cancelled (dropping it
+    from the embedding batch if it has not run yet) and a 504 is returned.
+    
     Args:
-        image: Uploaded image file
+        request: Incoming multipart request
         
     Returns:
         Dictionary with matching products and scan info
     """
     try:
-        # Validate file type
-        if not image.content_type.startswith('image/'):
-            raise HTTPException(
-                status_code=400,
-                detail="File must be an image"
-            )
-        
-        # Read image bytes
-        image_bytes = await image.read()
-        
-        # Load image
-        try:
-            pil_image = Image.open(io.BytesIO(image_bytes))
-        except Exception as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid image file: {str(e)}"
-            )
-        
-        # Generate embedding
-        print(f"Generating embedding for uploaded image...")
-        clip_embedder = get_clip_embedder()
-        embedding = clip_embedder.embed_image(pil_image)
+        result = await asyncio.wait_for(_scan(request), timeout=_scan_timeout())
+        SCAN_REQUESTS.inc(status='ok')
+        return result
         
-        # Search for similar products
-        print(f"Searching for similar products...")
-        pinecone_service = get_pinecone_service()
-        products = pinecone_service.query_similar_products(
-            query_embedding=embedding,
-            top_k=5,
-            min_score=0.6
+    except asyncio.TimeoutError:
+        SCAN_REQUESTS.inc(status='timeout')
+        raise HTTPException(
+            status_code=504,
+            detail="Timed out processing image"
+        )
+    except HTTPException:
+        SCAN_REQUESTS.inc(status='rejected')
+        raise
+    except Exception as e:
+        SCAN_REQUESTS.inc(status='error')
+        print(f"Error during scan: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing image: {str(e)}"
         )
+
+
+async def _scan_batch(images: List[UploadFile], fuse: bool) -> Dict[str, Any]:
+    """Decode, embed (in one model call) and search several uploaded images."""
+    max_images = int(os.getenv('SCAN_BATCH_MAX_IMAGES', 8))
+    if not images:
+        raise HTTPException(status_code=400, detail="At least one image is required")
+    if len(images) > max_images:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images: {len(images)} (maximum is {max_images})"
+        )
+    
+    pil_images = await asyncio.gather(*[_load_upload(image) for image in images])
+    
+    # Generate all embeddings in one forward pass
+    print(f"Generating embeddings for {len(pil_images)} uploaded images...")
+    batcher = get_embedding_batcher()
+    with SCAN_STAGE_SECONDS.time(stage='embed'):
+        embeddings = await batcher.embed_batch(list(pil_images))
+    
+    if fuse:
+        print(f"Searching for products similar to the fused embedding...")
+        products = await run_io(_query_products, _fuse_embeddings(embeddings))
         
         return {
             'success': True,
+            'fused': True,
+            'images_count': len(pil_images),
             'matches_found': len(products),
             'products': products,
             'message': f'Found {len(products)} matching products' if products else 'No matching products found'
         }
+    
+    # Search for every image concurrently
+    print(f"Searching for similar products for {len(pil_images)} images...")
+    results = await asyncio.gather(*[run_io(_query_products, embedding) for embedding in embeddings])
+    
+    return {
+        'success': True,
+        'fused': False,
+        'images_count': len(pil_images),
+        'results': [
+            {
+                'filename': image.filename,
+                'matches_found': len(products),
+                'products': products
+            }
+            for image, products in zip(images, results)
+        ],
+        'message': f"Scanned {len(pil_images)} images"
+    }
+
+
+@router.post("/scan/batch")
+async def scan_products_batch(
+    images: List[UploadFile] = File(...),
+    fuse: bool = Query(False, description="Rank products once using the averaged embedding of all images")
+) -> Dict[str, Any]:
+    """
+    Scan several photos of one item (e.g. front, back, label) in one request.
+    
+    All images are embedded in a single model call. Without `fuse`, each
+    image is searched separately (concurrently) and per-image results are
+    returned; with `fuse`, the normalized embeddings are averaged and a
+    single ranking is returned. Runs under SCAN_TIMEOUT_SECONDS like /scan.
+    
+    Args:
+        images: Uploaded image files
+        fuse: Return one fused ranking instead of per-image results
         
+    Returns:
+        Dictionary with matching products per image, or the fused matches
+    """
+    try:
+        result = await asyncio.wait_for(_scan_batch(images, fuse), timeout=_scan_timeout())
+        SCAN_REQUESTS.inc(status='ok')
+        return result
+        
+    except asyncio.TimeoutError:
+        SCAN_REQUESTS.inc(status='timeout')
+        raise HTTPException(
+            status_code=504,
+            detail="Timed out processing images"
+        )
     except HTTPException:
+        SCAN_REQUESTS.inc(status='rejected')
         raise
     except Exception as e:
-        print(f"Error during scan: {e}")
+        SCAN_REQUESTS.inc(status='error')
+        print(f"Error during batch scan: {e}")
         raise HTTPException(
             status_code=500,
-            detail=f"Error processing image: {str(e)}"
+            detail=f"Error processing images: {str(e)}"
         )
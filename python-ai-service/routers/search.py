@@ -0,0 +1,100 @@
+from fastapi import APIRouter, HTTPException, Query
+import asyncio
+import os
+from typing import Dict, Any
+
+import numpy as np
+
+from models import get_clip_embedder, get_text_embedding_cache
+from services import get_pinecone_service
+from services.executors import run_inference, run_io
+from services.metrics import SEARCH_REQUESTS
+
+router = APIRouter()
+
+
+def _search_timeout() -> float:
+    """Request-level deadline for a text search, from SEARCH_TIMEOUT_SECONDS."""
+    return float(os.getenv('SEARCH_TIMEOUT_SECONDS', 10))
+
+
+async def _embed_query(query: str) -> np.ndarray:
+    """Embed a search query with the CLIP text encoder, reusing cached embeddings."""
+    embedder = await run_io(get_clip_embedder)
+    model_name = getattr(embedder, 'model_name', 'unknown')
+
+    cache = get_text_embedding_cache()
+    embedding = cache.get(query, model_name)
+    if embedding is None:
+        embedding = (await run_inference(embedder.embed_texts, [query]))[0]
+        cache.put(query, model_name, embedding)
+    return embedding
+
+
+async def _search(query: str, top_k: int, min_score: float) -> Dict[str, Any]:
+    """Embed a text query and search the product image vectors."""
+    embedding = await _embed_query(query)
+
+    print(f"Searching for products matching: {query!r}")
+    pinecone_service = get_pinecone_service()
+    products = await run_io(
+        pinecone_service.query_similar_products,
+        query_embedding=embedding,
+        top_k=top_k,
+        min_score=min_score
+    )
+
+    return {
+        'success': True,
+        'query': query,
+        'matches_found': len(products),
+        'products': products,
+        'message': f'Found {len(products)} matching products' if products else 'No matching products found'
+    }
+
+
+@router.get("/search/text")
+async def search_text(
+    q: str = Query(..., min_length=1, max_length=500, description="Search query, e.g. 'organic lavender soap'"),
+    top_k: int = Query(10, ge=1, le=50, description="Maximum number of products to return"),
+    min_score: float = Query(0.2, ge=-1.0, le=1.0, description="Minimum text-to-image similarity")
+) -> Dict[str, Any]:
+    """
+    Search products by text using CLIP's shared text/image embedding space.
+
+    The query is encoded with the CLIP text encoder and matched against the
+    same product image vectors used by /scan. Text-to-image cosines are
+    lower than image-to-image ones, hence the lower default `min_score`.
+    Repeated queries reuse a cached embedding and skip the model.
+
+    Args:
+        q: Search query
+        top_k: Maximum number of products to return
+        min_score: Minimum similarity score
+
+    Returns:
+        Dictionary with matching products and search info
+    """
+    query = q.strip()
+    if not query:
+        SEARCH_REQUESTS.inc(status='rejected')
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+
+    try:
+        result = await asyncio.wait_for(_search(query, top_k, min_score), timeout=_search_timeout())
+        SEARCH_REQUESTS.inc(status='ok')
+        return result
+
+    except asyncio.TimeoutError:
+        SEARCH_REQUESTS.inc(status='timeout')
+        raise HTTPException(
+            status_code=504,
+            detail="Timed out searching products"
+        )
+    except Exception as e:
+        SEARCH_REQUESTS.inc(status='error')
+        print(f"Error during text search: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error searching products: {str(e)}"
+        )
@@ -0,0 +1,196 @@
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+import multipart
+from fastapi import HTTPException, Request
+from multipart.multipart import parse_options_header
+
+from models.image_preprocessing import SNIFF_BYTES, sniff_image_format
+from services.executors import run_io
+
+# Multipart boundaries and part headers on top of the file itself
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+def _default_max_bytes() -> int:
+    return int(os.getenv('SCAN_MAX_UPLOAD_BYTES', 20 * 1024 * 1024))
+
+
+def _default_spool_bytes() -> int:
+    return int(os.getenv('SCAN_UPLOAD_SPOOL_BYTES', 1024 * 1024))
+
+
+class StreamedUpload:
+    """
+    An image file received from a multipart request.
+
+    The file is held in a SpooledTemporaryFile (in memory up to
+    SCAN_UPLOAD_SPOOL_BYTES, on disk beyond) positioned at the start, so it
+    can be decoded in place without copying it into a bytes object first.
+    """
+
+    def __init__(self, file, filename: Optional[str], content_type: str, image_format: str, size: int):
+        self.file = file
+        self.filename = filename
+        self.content_type = content_type
+        self.image_format = image_format
+        self.size = size
+
+    def close(self):
+        self.file.close()
+
+
+async def receive_image_upload(
+    request: Request,
+    field_name: str = 'image',
+    max_bytes: Optional[int] = None,
+    spool_bytes: Optional[int] = None
+) -> StreamedUpload:
+    """
+    Stream one image file out of a multipart/form-data request body.
+
+    The body is parsed as it arrives. Declared Content-Length, the part's
+    content type, the file's leading bytes (its format) and its size are
+    checked as soon as they are known, so oversized or non-image uploads
+    are rejected without receiving the rest of the body. Other form fields
+    are discarded.
+
+    Args:
+        request: Incoming request
+        field_name: Form field holding the image
+        max_bytes: Maximum file size (defaults to SCAN_MAX_UPLOAD_BYTES)
+        spool_bytes: File size kept in memory before spilling to disk
+            (defaults to SCAN_UPLOAD_SPOOL_BYTES)
+
+    Returns:
+        The received upload; the caller must close it
+
+    Raises:
+        HTTPException: 400 for malformed requests or non-image files, 413 for
+            oversized ones, 422 if the field is missing
+    """
+    max_bytes = _default_max_bytes() if max_bytes is None else max_bytes
+    spool_bytes = _default_spool_bytes() if spool_bytes is None else spool_bytes
+
+    content_type, params = parse_options_header(request.headers.get('content-type', ''))
+    boundary = params.get(b'boundary')
+    if content_type != b'multipart/form-data' or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data request with an image file")
+
+    declared = request.headers.get('content-length')
+    if max_bytes and declared and declared.isdigit() and int(declared) > max_bytes + _MULTIPART_OVERHEAD:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image too large: request is {declared} bytes; the limit is {max_bytes} bytes"
+        )
+
+    # Parser callbacks run synchronously inside parser.write(); file data is
+    # collected as memoryview slices of the received chunk and written afterwards
+    state: Dict = {'headers': {}, 'field': b'', 'value': b'', 'target': False}
+    upload: Optional[StreamedUpload] = None
+    head = bytearray()
+    pending: List[memoryview] = []
+
+    def check_format():
+        image_format = sniff_image_format(head)
+        if image_format is None:
+            raise HTTPException(status_code=400, detail=f"File must be an image: {upload.filename}")
+        upload.image_format = image_format
+
+    def on_part_begin():
+        state.update(headers={}, field=b'', value=b'', target=False)
+
+    def on_header_field(data, start, end):
+        state['field'] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state['value'] += data[start:end]
+
+    def on_header_end():
+        state['headers'][state['field'].lower()] = state['value']
+        state.update(field=b'', value=b'')
+
+    def on_headers_finished():
+        nonlocal upload
+        _, disposition = parse_options_header(state['headers'].get(b'content-disposition', b''))
+        if upload is not None or disposition.get(b'name', b'').decode('latin-1') != field_name:
+            return
+
+        filename = disposition.get(b'filename')
+        filename = filename.decode('utf-8', 'replace') if filename is not None else None
+        part_type = state['headers'].get(b'content-type', b'').decode('latin-1')
+        if not part_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail=f"File must be an image: {filename}")
+
+        upload = StreamedUpload(
+            file=tempfile.SpooledTemporaryFile(max_size=spool_bytes),
+            filename=filename,
+            content_type=part_type,
+            image_format='',
+            size=0
+        )
+        state['target'] = True
+
+    def on_part_data(data, start, end):
+        if not state['target']:
+            return
+        upload.size += end - start
+        if max_bytes and upload.size > max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Image too large: the limit is {max_bytes} bytes"
+            )
+        if len(head) < SNIFF_BYTES:
+            head.extend(data[start:min(end, start + SNIFF_BYTES - len(head))])
+            if len(head) >= SNIFF_BYTES:
+                check_format()
+        pending.append(memoryview(data)[start:end])
+
+    def on_part_end():
+        if state['target']:
+            state['target'] = False
+            if len(head) < SNIFF_BYTES:
+                check_format()
+
+    parser = multipart.MultipartParser(boundary, {
+        'on_part_begin': on_part_begin,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end
+    })
+
+    written = 0
+    try:
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                for view in pending:
+                    written += len(view)
+                    # Once the file spills to disk (past spool_bytes), writes go through the I/O pool
+                    if spool_bytes and written > spool_bytes:
+                        await run_io(upload.file.write, view)
+                    else:
+                        upload.file.write(view)
+                pending.clear()
+            parser.finalize()
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid multipart request: {str(e)}")
+
+        if upload is None:
+            raise HTTPException(status_code=422, detail=f"Missing image file field: {field_name}")
+        if not upload.image_format:
+            raise HTTPException(status_code=400, detail=f"File must be an image: {upload.filename}")
+    except BaseException:
+        # Including cancellation (e.g. SCAN_TIMEOUT), so the spooled file is never leaked
+        if upload is not None:
+            upload.close()
+        raise
+
+    upload.file.seek(0)
+    return upload
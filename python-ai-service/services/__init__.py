@@ -1,10 +1,35 @@
 # Services package
 from .pinecone_service import PineconeService, get_pinecone_service
-from .wordpress_service import WordPressService, get_wordpress_service
+from .local_vector_index import LocalVectorIndex
+from .ann_index import AnnVectorIndex
+from .wordpress_service import WordPressService, WordPressFetchError, get_wordpress_service
+from .product_catalog import ProductCatalog, get_product_catalog
+from .reranker import HybridReranker, get_reranker
+from .query_cache import QueryCache, CachedVectorStore
+from .index_manifest import IndexManifest, get_index_manifest
+from .indexing_pipeline import IndexingPipeline, create_indexing_pipeline
+from .index_jobs import IndexJob, IndexJobManager, IndexJobConflictError, get_index_job_manager
 
 __all__ = [
     'PineconeService',
     'get_pinecone_service',
+    'LocalVectorIndex',
+    'AnnVectorIndex',
+    'ProductCatalog',
+    'get_product_catalog',
+    'HybridReranker',
+    'get_reranker',
+    'QueryCache',
+    'CachedVectorStore',
     'WordPressService',
-    'get_wordpress_service'
+    'WordPressFetchError',
+    'get_wordpress_service',
+    'IndexManifest',
+    'get_index_manifest',
+    'IndexingPipeline',
+    'create_indexing_pipeline',
+    'IndexJob',
+    'IndexJobManager',
+    'IndexJobConflictError',
+    'get_index_job_manager'
 ]
@@ -0,0 +1,236 @@
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .local_vector_index import LocalVectorIndex
+
+ANN_INDEX_TYPES = ('hnsw', 'ivfpq')
+
+
+class AnnVectorIndex(LocalVectorIndex):
+    """
+    LocalVectorIndex searched through a faiss approximate nearest-neighbour index.
+
+    The exact float32 matrix stays the source of truth (memory-mapped on disk);
+    faiss holds a graph (HNSW, lowest latency) or product-quantized inverted
+    lists (IVF-PQ, lowest memory) over its rows. Each query fetches
+    `refine_factor * top_k` candidates from faiss and rescores them exactly
+    against the matrix, so returned scores are always exact cosines.
+
+    Appended rows are added to the faiss index incrementally, in the writing
+    process on upsert and in other processes when they reload a new version.
+    Rows of re-upserted or deleted products stay in faiss as dead rows and
+    are filtered out of the candidates until the next compaction, which
+    rebuilds the index. The faiss index is saved on flush (after a rebuild or
+    once 10% more rows were added) and referenced from the index marker, so
+    a saved graph always matches the rows it was built over. Catalogs below
+    `min_size` rows are searched exactly.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dimension: int = 512,
+        catalog=None,
+        index_type: str = 'hnsw',
+        hnsw_m: int = 32,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+        nlist: int = 0,
+        pq_m: int = 64,
+        nprobe: int = 16,
+        min_size: int = 10000,
+        refine_factor: int = 4,
+        compact_fraction: float = 0.2,
+        reload_interval: float = 1.0
+    ):
+        """
+        Initialize the index, loading any previously saved state.
+
+        Args:
+            path: Directory where the index is persisted
+            dimension: Dimension of vectors (512 for CLIP ViT-B/32)
+            catalog: Optional ProductCatalog for compact metadata mode
+            index_type: 'hnsw' or 'ivfpq'
+            hnsw_m: HNSW graph degree (higher: better recall, more memory)
+            ef_construction: HNSW build-time candidate list size
+            ef_search: HNSW query-time candidate list size (higher: better recall, slower)
+            nlist: IVF list count (0 picks 4 * sqrt(rows) at build time)
+            pq_m: PQ sub-quantizers; must divide the dimension (64 gives 64-byte codes)
+            nprobe: IVF lists scanned per query (higher: better recall, slower)
+            min_size: Row count below which queries use the exact scan
+            refine_factor: Candidates fetched per requested result for exact rescoring
+            compact_fraction: Fraction of dead rows that triggers a compaction (and rebuild)
+            reload_interval: Seconds between checks for a version written by another process
+        """
+        try:
+            import faiss
+        except ImportError as e:
+            raise ImportError("VECTOR_BACKEND=ann requires the faiss-cpu package (pip install -r requirements-optional.txt)") from e
+
+        if index_type not in ANN_INDEX_TYPES:
+            raise ValueError(f"Unknown ANN index type: {index_type} (expected one of {ANN_INDEX_TYPES})")
+        if index_type == 'ivfpq' and dimension % pq_m:
+            raise ValueError(f"pq_m ({pq_m}) must divide the dimension ({dimension})")
+
+        self._faiss = faiss
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.nprobe = nprobe
+        self.min_size = max(1, min_size)
+        self.refine_factor = max(1, refine_factor)
+
+        self._ann = None
+        self._saved_ann: Optional[Dict[str, Any]] = None  # marker entry of the last saved faiss file
+        self._ann_lock = threading.Lock()
+
+        super().__init__(
+            path=path, dimension=dimension, catalog=catalog,
+            compact_fraction=compact_fraction, reload_interval=reload_interval
+        )
+
+    def _params(self) -> Dict[str, Any]:
+        """Build parameters a saved index must match to be reused."""
+        params = {'index_type': self.index_type, 'dimension': self.dimension}
+        if self.index_type == 'hnsw':
+            params.update(hnsw_m=self.hnsw_m, ef_construction=self.ef_construction)
+        else:
+            params.update(nlist=self.nlist, pq_m=self.pq_m)
+        return params
+
+    def _on_load(self, marker: Optional[Dict[str, Any]]):
+        """Load the faiss index saved with this version, rebuilding it if missing or built with other parameters."""
+        matrix = self._state[0]
+        saved = (marker or {}).get('ann')
+
+        ann = None
+        if (saved and saved.get('params') == self._params() and saved.get('layout') == self._layout
+                and saved.get('rows', 0) <= len(matrix)):
+            try:
+                ann = self._faiss.read_index(self._file(saved['file']))
+            except RuntimeError as e:
+                print(f"Ignoring unreadable {self.index_type} index: {e}")
+
+        if ann is None:
+            self._saved_ann = None
+            ann = self._build(matrix)
+        else:
+            self._saved_ann = saved
+            # Rows appended after the index was last written
+            if ann.ntotal < len(matrix):
+                ann.add(np.ascontiguousarray(matrix[ann.ntotal:], dtype=np.float32))
+            self._configure(ann)
+            print(f"Loaded {self.index_type} index with {ann.ntotal} vectors from: {self.path}")
+
+        with self._ann_lock:
+            self._ann = ann
+
+    def _build(self, matrix: np.ndarray):
+        """Build a faiss index over every row of the matrix (None below min_size)."""
+        rows = len(matrix)
+        if rows < self.min_size:
+            return None
+
+        faiss = self._faiss
+        vectors = np.ascontiguousarray(matrix, dtype=np.float32)
+
+        if self.index_type == 'hnsw':
+            ann = faiss.IndexHNSWFlat(self.dimension, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            ann.hnsw.efConstruction = self.ef_construction
+        else:
+            nlist = self.nlist or max(1, int(4 * np.sqrt(rows)))
+            quantizer = faiss.IndexFlatIP(self.dimension)
+            ann = faiss.IndexIVFPQ(quantizer, self.dimension, nlist, self.pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+            # k-means needs roughly 40-250 points per centroid; more only slows training
+            sample = vectors
+            if rows > nlist * 256:
+                sample = vectors[np.random.default_rng(0).choice(rows, nlist * 256, replace=False)]
+            ann.train(sample)
+
+        ann.add(vectors)
+        self._configure(ann)
+        print(f"Built {self.index_type} index over {rows} vectors")
+        return ann
+
+    def _configure(self, ann):
+        """Apply query-time parameters."""
+        if self.index_type == 'hnsw':
+            ann.hnsw.efSearch = self.ef_search
+        else:
+            ann.nprobe = self.nprobe
+
+    def _persist_extra(self, version: int) -> Dict[str, Any]:
+        # The faiss file is only rewritten after a rebuild or once 10% more rows were
+        # added; rows appended since then are re-added from the matrix on load
+        ann = self._ann
+        if ann is None:
+            self._saved_ann = None
+            return {}
+
+        saved = self._saved_ann
+        if (saved is not None and saved['layout'] == self._layout and saved['params'] == self._params()
+                and ann.ntotal - saved['rows'] < 0.1 * ann.ntotal):
+            return {'ann': saved}
+
+        name = f"ann-{version:06d}.faiss"
+        self._faiss.write_index(ann, self._file(name))
+        self._saved_ann = {'file': name, 'layout': self._layout, 'rows': ann.ntotal, 'params': self._params()}
+        return {'ann': self._saved_ann}
+
+    def _publish(self, matrix: np.ndarray, ids: List[str], metadata: List[Dict[str, Any]],
+                 dead_rows: np.ndarray, appended_from: Optional[int] = None):
+        ann = self._ann
+        rebuild = (
+            appended_from is None
+            or (ann is None and len(matrix) >= self.min_size)
+            or (ann is not None and ann.ntotal != appended_from)
+        )
+
+        if rebuild:
+            # Built outside the search lock; queries keep using the old index meanwhile
+            ann = self._build(matrix)
+            with self._ann_lock:
+                self._ann = ann
+                self._state = (matrix, ids, metadata, dead_rows)
+            return
+
+        with self._ann_lock:
+            if ann is not None and len(matrix) > appended_from:
+                ann.add(np.ascontiguousarray(matrix[appended_from:], dtype=np.float32))
+            self._state = (matrix, ids, metadata, dead_rows)
+
+    def _search(self, matrix: np.ndarray, query: np.ndarray, k: int, dead_rows: np.ndarray):
+        with self._ann_lock:
+            ann = self._ann
+            if ann is not None:
+                _, labels = ann.search(query.reshape(1, -1), k * self.refine_factor)
+                indexed = ann.ntotal
+        if ann is None:
+            return super()._search(matrix, query, k, dead_rows)
+
+        # Drop padding (-1), rows newer than this snapshot and dead rows, add rows
+        # not in faiss yet, then rescore exactly
+        candidates = labels[0]
+        candidates = np.unique(candidates[(candidates >= 0) & (candidates < len(matrix))])
+        if indexed < len(matrix):
+            candidates = np.union1d(candidates, np.arange(indexed, len(matrix)))
+        if len(dead_rows):
+            candidates = np.setdiff1d(candidates, dead_rows, assume_unique=True)
+        scores = np.asarray(matrix[candidates], dtype=np.float32) @ query
+        order = np.argsort(-scores)[:k]
+        return candidates[order], scores[order]
+
+    def get_index_stats(self) -> Dict[str, Any]:
+        """Get statistics about the index."""
+        stats = super().get_index_stats()
+        ann = self._ann
+        stats.update({
+            'ann_index_type': self.index_type if ann is not None else 'exact',
+            'ann_vectors': ann.ntotal if ann is not None else 0
+        })
+        return stats
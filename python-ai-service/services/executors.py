@@ -0,0 +1,136 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+# Blocking work is never run on the event loop or on the loop's default executor:
+# - the I/O pool runs network-bound SDK and HTTP calls (Pinecone, WordPress,
+#   file writes); they mostly wait, so it is sized generously
+# - the inference pool runs the embedding model; one model call already uses
+#   every intra-op thread, so it is kept small and heavy scans queue there
+#   instead of starving the I/O pool
+# - the CPU pool runs other CPU-bound request work (image decoding and
+#   resizing); it is sized to the cores, so a burst of uploads queues there
+#   instead of crowding the I/O pool
+
+_io_executor: Optional[ThreadPoolExecutor] = None
+_inference_executor: Optional[ThreadPoolExecutor] = None
+_cpu_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Get or create the thread pool for blocking I/O (size from IO_EXECUTOR_WORKERS)."""
+    global _io_executor
+
+    if _io_executor is None:
+        with _executor_lock:
+            if _io_executor is None:
+                _io_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv('IO_EXECUTOR_WORKERS', 32)),
+                    thread_name_prefix='io'
+                )
+
+    return _io_executor
+
+
+def get_inference_executor() -> ThreadPoolExecutor:
+    """Get or create the thread pool for model inference (size from INFERENCE_WORKERS)."""
+    global _inference_executor
+
+    if _inference_executor is None:
+        with _executor_lock:
+            if _inference_executor is None:
+                _inference_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv('INFERENCE_WORKERS', 1)),
+                    thread_name_prefix='inference'
+                )
+
+    return _inference_executor
+
+
+def get_cpu_executor() -> ThreadPoolExecutor:
+    """Get or create the thread pool for CPU-bound work (size from CPU_EXECUTOR_WORKERS, default the CPU count)."""
+    global _cpu_executor
+
+    if _cpu_executor is None:
+        with _executor_lock:
+            if _cpu_executor is None:
+                _cpu_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv('CPU_EXECUTOR_WORKERS', 0)) or os.cpu_count() or 1,
+                    thread_name_prefix='cpu'
+                )
+
+    return _cpu_executor
+
+
+async def _run(executor: ThreadPoolExecutor, func: Callable, args, kwargs, timeout: Optional[float]) -> Any:
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, partial(func, *args, **kwargs))
+    if timeout is None:
+        return await future
+    # The worker thread cannot be interrupted, but the awaiting request is released
+    return await asyncio.wait_for(future, timeout=timeout)
+
+
+async def run_io(func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """
+    Run a blocking I/O call on the I/O pool.
+
+    Args:
+        func: Blocking callable
+        *args: Positional arguments for func
+        timeout: Seconds to wait before raising asyncio.TimeoutError (None waits indefinitely)
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        The return value of func
+    """
+    return await _run(get_io_executor(), func, args, kwargs, timeout)
+
+
+async def run_inference(func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """
+    Run a CPU-bound model call on the inference pool.
+
+    Args:
+        func: Blocking callable
+        *args: Positional arguments for func
+        timeout: Seconds to wait before raising asyncio.TimeoutError (None waits indefinitely)
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        The return value of func
+    """
+    return await _run(get_inference_executor(), func, args, kwargs, timeout)
+
+
+async def run_cpu(func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """
+    Run a CPU-bound call (other than the model) on the CPU pool.
+
+    Args:
+        func: Blocking callable
+        *args: Positional arguments for func
+        timeout: Seconds to wait before raising asyncio.TimeoutError (None waits indefinitely)
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        The return value of func
+    """
+    return await _run(get_cpu_executor(), func, args, kwargs, timeout)
+
+
+def shutdown_executors():
+    """Shut down all pools without waiting for running calls (used at application shutdown)."""
+    global _io_executor, _inference_executor, _cpu_executor
+
+    with _executor_lock:
+        for executor in (_io_executor, _inference_executor, _cpu_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        _io_executor = None
+        _inference_executor = None
+        _cpu_executor = None
@@ -0,0 +1,671 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from .executors import run_inference, run_io
+from .indexing_pipeline import create_indexing_pipeline
+from .product_catalog import get_product_catalog
+from .reranker import get_reranker
+from .wordpress_service import get_wordpress_service
+
+try:
+    import fcntl
+except ImportError:  # Windows: jobs are only serialized within one process
+    fcntl = None
+
+# Jobs in these states can be resumed; products they already upserted are skipped
+RESUMABLE_STATUSES = ('failed', 'cancelled', 'interrupted')
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    """Whether a process with this ID exists (another server worker may own a running job)."""
+    if not pid or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class IndexJobConflictError(Exception):
+    """Raised when a job is started while another one is still running."""
+
+
+class IndexJob:
+    """
+    One indexing run: its parameters, progress and checkpoint.
+
+    The checkpoint is the set of product IDs upserted so far. Upserted
+    batches are recorded in memory and, at most every `checkpoint_interval`
+    seconds, the vector store is flushed and the job written to disk, so the
+    checkpoint only ever lists products whose vectors are durable. A job
+    that fails, is cancelled or dies with the process can be resumed without
+    redoing that work. Counts
+    describe the latest attempt; `resumed_count` is the number of products
+    that attempt skipped because an earlier one had already upserted them.
+    """
+
+    def __init__(self, job_id: str, params: Dict[str, Any], path: str, checkpoint_interval: float = 30.0):
+        """
+        Initialize a job.
+
+        Args:
+            job_id: Unique job ID
+            params: Job parameters (max_products, incremental, page, per_page)
+            path: JSON file the job is checkpointed to
+            checkpoint_interval: Minimum seconds between checkpoints written to disk
+        """
+        self.job_id = job_id
+        self.params = params
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+
+        self.status = 'pending'
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.attempts = 0
+        self.pid: Optional[int] = None
+        self.error: Optional[str] = None
+        self.error_type: Optional[str] = None
+        self.index_stats: Optional[Dict[str, Any]] = None
+
+        self.counts = {
+            'total_products': 0,
+            'indexed_count': 0,
+            'skipped_count': 0,
+            'reused_count': 0,
+            'unchanged_count': 0,
+            'deleted_count': 0,
+            'resumed_count': 0
+        }
+        self.completed_ids: set = set()
+
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._pipeline = None
+        self._run_lock = None  # lock file held while the job runs
+        self._mtime: Optional[int] = None  # of the job file when it was loaded
+        # Upserted but not yet flushed to the vector store
+        self._pending_ids: List[str] = []
+        self._flush: Optional[Callable[[], None]] = None
+        self._persisted_at = 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.status not in ('pending', 'running')
+
+    def progress(self) -> Dict[str, Any]:
+        """Current counts, including live pipeline counts while running."""
+        with self._lock:
+            counts = dict(self.counts)
+        if self.status == 'running' and self._pipeline is not None:
+            counts.update({key: value for key, value in self._pipeline.stats.items() if key in counts})
+        return counts
+
+    def checkpoint(self, products: List[Dict[str, Any]], stats: Dict[str, Any]):
+        """
+        Record an upserted batch, persisting the job when a checkpoint is due (pipeline callback).
+
+        Args:
+            products: Products in the batch that was just upserted
+            stats: Running pipeline counts after the batch
+        """
+        with self._lock:
+            self._pending_ids.extend(str(product.get('id')) for product in products)
+            self.counts.update({key: value for key, value in stats.items() if key in self.counts})
+        if time.monotonic() - self._persisted_at >= self.checkpoint_interval:
+            self.persist()
+
+    def persist(self):
+        """Flush the vector store, then add the flushed products to the checkpoint and save the job."""
+        with self._lock:
+            pending, self._pending_ids = self._pending_ids, []
+        if self._flush is not None:
+            try:
+                self._flush()
+            except Exception:
+                with self._lock:
+                    self._pending_ids = pending + self._pending_ids
+                raise
+        with self._lock:
+            self.completed_ids.update(pending)
+        self.save()
+        self._persisted_at = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Job status as returned by the API."""
+        progress = self.progress()
+        end = self.finished_at or time.time()
+        elapsed = (end - self.started_at) if self.started_at else 0.0
+
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'params': self.params,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'attempts': self.attempts,
+            'progress': progress,
+            'elapsed_seconds': round(elapsed, 3),
+            'products_per_second': round(progress['indexed_count'] / elapsed, 2) if elapsed > 0 else 0.0,
+            'completed_products': len(self.completed_ids),
+            'error': self.error,
+            'error_type': self.error_type,
+            'index_stats': self.index_stats
+        }
+
+    def save(self):
+        """Persist the job and its checkpoint, replacing the previous file atomically."""
+        with self._lock:
+            state = {
+                'job_id': self.job_id,
+                'params': self.params,
+                'status': self.status,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'attempts': self.attempts,
+                'pid': self.pid,
+                'error': self.error,
+                'error_type': self.error_type,
+                'index_stats': self.index_stats,
+                'counts': dict(self.counts),
+                'completed_ids': sorted(self.completed_ids)
+            }
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    @classmethod
+    def load(cls, path: str) -> 'IndexJob':
+        """Load a job from its checkpoint file."""
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+        job = cls(state['job_id'], state.get('params', {}), path)
+        job.status = state.get('status', 'interrupted')
+        job.created_at = state.get('created_at', job.created_at)
+        job.started_at = state.get('started_at')
+        job.finished_at = state.get('finished_at')
+        job.attempts = state.get('attempts', 0)
+        job.pid = state.get('pid')
+        job.error = state.get('error')
+        job.error_type = state.get('error_type')
+        job.index_stats = state.get('index_stats')
+        job.counts.update(state.get('counts', {}))
+        job.completed_ids = set(state.get('completed_ids', []))
+        return job
+
+
+def _forget_recorded_embeddings(products: Iterable[Dict[str, Any]], manifest) -> Iterator[Dict[str, Any]]:
+    """Yield products after dropping their manifest entries, so the pipeline embeds them again."""
+    for product in products:
+        manifest.remove([product.get('id')])
+        yield product
+
+
+class IndexJobManager:
+    """
+    Runs indexing jobs in the background on the event loop.
+
+    Jobs crawl WordPress, stream products through the indexing pipeline and
+    checkpoint every `checkpoint_interval` seconds. Only one job runs at a time,
+    since jobs share the index manifest: a running job holds an exclusive
+    lock on `path`/job.lock, so the rule also holds across server workers.
+    Job files live under `path` and are rescanned when jobs are listed;
+    jobs that were running when their process stopped are reported as
+    'interrupted' and can be resumed. A job can only be cancelled by the
+    worker running it.
+    """
+
+    def __init__(self, path: str, checkpoint_interval: float = 30.0):
+        """
+        Initialize the manager, loading previously recorded jobs.
+
+        Args:
+            path: Directory where job checkpoints are stored
+            checkpoint_interval: Minimum seconds between job checkpoints (each flushes the vector store)
+        """
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        os.makedirs(path, exist_ok=True)
+
+        self._jobs: Dict[str, IndexJob] = {}
+        self._lock = threading.Lock()
+
+        for filename in os.listdir(path):
+            if filename.endswith('.json'):
+                self._load(filename[:-len('.json')])
+
+    def _load(self, job_id: str) -> Optional[IndexJob]:
+        """(Re)load a job from disk, e.g. one started or updated by another worker."""
+        path = os.path.join(self.path, f"{job_id}.json")
+        if not os.path.exists(path):
+            return None
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            job = IndexJob.load(path)
+            job._mtime = mtime
+        except Exception as e:
+            print(f"Ignoring unreadable index job {job_id}: {e}")
+            return None
+        if not job.done and not _pid_alive(job.pid) and self._run_lock_holder() != job.job_id:
+            # The process running it stopped before the job finished
+            job.status = 'interrupted'
+        self._jobs[job.job_id] = job
+        return job
+
+    def _running_job(self) -> Optional[IndexJob]:
+        for job in list(self._jobs.values()):
+            if job._task is not None and not job._task.done():
+                return job
+        return None
+
+    def _acquire_run_lock(self, job: IndexJob):
+        """
+        Take the lock that only one running job across all processes may hold.
+
+        Raises:
+            IndexJobConflictError: If another job holds it
+        """
+        if fcntl is None:
+            return None
+
+        lock_file = open(os.path.join(self.path, 'job.lock'), 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.seek(0)
+            holder = lock_file.read().strip() or 'unknown'
+            lock_file.close()
+            raise IndexJobConflictError(f"Index job {holder} is already running in another worker process")
+
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(job.job_id)
+        lock_file.flush()
+        return lock_file
+
+    def _run_lock_holder(self) -> Optional[str]:
+        """ID of the job holding the run lock, if any."""
+        if fcntl is None:
+            return None
+        path = os.path.join(self.path, 'job.lock')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except OSError:
+                return lock_file.read().strip() or None
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        return None
+
+    @staticmethod
+    def _release_run_lock(job: IndexJob):
+        if job._run_lock is not None:
+            # Closing the file releases the lock
+            job._run_lock.close()
+            job._run_lock = None
+
+    def _launch(self, job: IndexJob) -> IndexJob:
+        """Start a job's task on the running event loop, holding the run lock until it finishes."""
+        running = self._running_job()
+        if running is not None:
+            raise IndexJobConflictError(f"Index job {running.job_id} is already running")
+        job._run_lock = self._acquire_run_lock(job)
+
+        job.status = 'pending'
+        job.error = None
+        job.error_type = None
+        job.finished_at = None
+        job.checkpoint_interval = self.checkpoint_interval
+        try:
+            job.save()
+            job._task = asyncio.get_running_loop().create_task(self._run(job))
+        except BaseException:
+            self._release_run_lock(job)
+            raise
+        return job
+
+    def start(
+        self,
+        max_products: Optional[int] = None,
+        incremental: bool = False,
+        page: Optional[int] = None,
+        per_page: int = 100,
+        model: str = 'default'
+    ) -> IndexJob:
+        """
+        Start a new indexing job in the background.
+
+        Args:
+            max_products: Maximum number of products to index (None for all)
+            incremental: Only re-embed changed products and delete removed ones
+            page: Index a single catalog page instead of crawling the whole catalog
+            per_page: Products per page when `page` is set
+            model: Key of the embedding model to index with (see ModelRegistry)
+
+        Returns:
+            The started job
+
+        Raises:
+            ValueError: If the model is not registered
+            IndexJobConflictError: If another job is running
+        """
+        from models import get_model_registry
+
+        if model not in get_model_registry():
+            raise ValueError(f"Unknown embedding model: {model}")
+
+        with self._lock:
+            job_id = uuid.uuid4().hex[:12]
+            params = {
+                'max_products': max_products,
+                'incremental': incremental,
+                'page': page,
+                'per_page': per_page,
+                'model': model
+            }
+            job = IndexJob(job_id, params, os.path.join(self.path, f"{job_id}.json"))
+            self._launch(job)
+            self._jobs[job_id] = job
+
+        print(f"Started index job {job_id}: {params}")
+        return job
+
+    def resume(self, job_id: str) -> Optional[IndexJob]:
+        """
+        Resume a failed, cancelled or interrupted job, skipping products it already upserted.
+
+        Args:
+            job_id: Job to resume
+
+        Returns:
+            The resumed job, or None if there is no such job
+
+        Raises:
+            ValueError: If the job is not in a resumable state
+            IndexJobConflictError: If another job is running
+        """
+        with self._lock:
+            # Refreshed from disk: another worker may have run it since
+            job = self.get(job_id)
+            if job is None:
+                return None
+            if job.status not in RESUMABLE_STATUSES:
+                raise ValueError(f"Index job {job_id} is {job.status} and cannot be resumed")
+            self._launch(job)
+
+        print(f"Resuming index job {job_id} ({len(job.completed_ids)} products already upserted)")
+        return job
+
+    def cancel(self, job_id: str) -> Optional[IndexJob]:
+        """
+        Cancel a running job. Upserted batches stay indexed and the job can be resumed.
+
+        Args:
+            job_id: Job to cancel
+
+        Returns:
+            The job, or None if there is no such job
+
+        Raises:
+            ValueError: If the job has already finished
+            IndexJobConflictError: If the job is running in another process
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.done:
+            raise ValueError(f"Index job {job_id} is already {job.status}")
+        if job._task is None:
+            raise IndexJobConflictError(f"Index job {job_id} is running in another worker process")
+
+        job._task.cancel()
+        return job
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        """Get a job by ID, refreshing it from disk if another process updated it."""
+        job = self._jobs.get(job_id)
+        if job is None or ((job._task is None or job._task.done()) and self._modified(job)):
+            job = self._load(job_id) or job
+        return job
+
+    def _modified(self, job: IndexJob) -> bool:
+        try:
+            return os.stat(job.path).st_mtime_ns != job._mtime
+        except FileNotFoundError:
+            return False
+
+    def list_jobs(self) -> List[IndexJob]:
+        """All jobs, including those started by other processes, newest first."""
+        for filename in os.listdir(self.path):
+            if filename.endswith('.json'):
+                self.get(filename[:-len('.json')])
+        return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    async def wait(self, job_id: str) -> Optional[IndexJob]:
+        """
+        Wait for a job to finish.
+
+        Args:
+            job_id: Job to wait for
+
+        Returns:
+            The finished job, or None if there is no such job
+        """
+        job = self._jobs.get(job_id)
+        if job is not None and job._task is not None:
+            # Shield so that a caller giving up does not cancel the job itself
+            try:
+                await asyncio.shield(job._task)
+            except asyncio.CancelledError:
+                if not job._task.cancelled():
+                    raise
+        return job
+
+    async def shutdown(self, timeout: float = 30):
+        """
+        Stop running jobs (at application shutdown); they are left resumable.
+
+        Args:
+            timeout: Seconds to wait for cancelled jobs to save their manifest and checkpoint
+        """
+        tasks = [job._task for job in self._jobs.values() if job._task is not None and not job._task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    async def _run(self, job: IndexJob):
+        """Crawl, embed and upsert for one job, checkpointing as batches land."""
+        # Imported here: the models package itself imports from services
+        from models import PRIMARY_MODEL, get_model_registry
+
+        params = job.params
+        page = params.get('page')
+        max_products = params.get('max_products')
+        incremental = params.get('incremental', False)
+        model = params.get('model', PRIMARY_MODEL)
+
+        job.status = 'running'
+        job.started_at = time.time()
+        job.attempts += 1
+        job.pid = os.getpid()
+        with job._lock:
+            # Counts describe this attempt only
+            job.counts = {key: 0 for key in job.counts}
+        job._pending_ids = []
+        job._persisted_at = time.monotonic()
+        job.save()
+
+        removed: List[str] = []
+        try:
+            wordpress_service = get_wordpress_service()
+            # Each registered model indexes into its own namespace with its own manifest
+            registry = get_model_registry()
+            pinecone_service = await run_io(registry.vector_store, model)
+            job._flush = pinecone_service.flush
+            clip_embedder = await run_io(registry.embedder, model)
+            manifest = await run_io(registry.manifest, model)
+            # Another server worker may have run the previous job
+            await run_io(manifest.refresh)
+            catalog = await run_io(get_product_catalog)
+
+            if page is not None:
+                print(f"Fetching products from WordPress page {page}...")
+                products = await run_io(wordpress_service.fetch_page, page, params.get('per_page', 100))
+                products = products[:max_products] if max_products else products
+            elif incremental:
+                # Fetch products from WordPress; the whole list is needed to plan the reindex
+                print("Fetching products from WordPress...")
+                products = await run_io(
+                    wordpress_service.fetch_products, max_products=max_products, raise_on_error=True
+                )
+            else:
+                # Stream products from WordPress straight into the pipeline
+                print("Streaming products from WordPress...")
+                products = wordpress_service.iter_products(max_products=max_products)
+
+            # Every crawled product refreshes the display data used by compact metadata mode
+            if isinstance(products, list):
+                await run_io(catalog.upsert, products)
+            else:
+                products = catalog.record(products)
+
+            if incremental:
+                # Removals can only be detected when the whole catalog was crawled
+                complete = page is None and max_products is None
+                products, unchanged, removed = manifest.plan(products, complete=complete)
+                job.counts['unchanged_count'] = len(unchanged)
+                print(f"Incremental reindex: {len(products)} changed, {len(unchanged)} unchanged, {len(removed)} removed")
+
+            # Products upserted by an earlier attempt of this job are already indexed
+            products = self._skip_completed(job, products)
+
+            if not incremental:
+                # Full reindex: forget the recorded embeddings of the products about to be
+                # embedded again (after the skip, so resumed products keep theirs)
+                products = _forget_recorded_embeddings(products, manifest)
+
+            pipeline = create_indexing_pipeline(clip_embedder, pinecone_service, manifest=manifest)
+            job._pipeline = pipeline
+            try:
+                result = await pipeline.run(products, on_batch_upserted=job.checkpoint)
+
+                if removed:
+                    await run_io(pinecone_service.delete_products, removed)
+                    manifest.remove(removed)
+                    await run_io(catalog.delete, removed)
+                    job.counts['deleted_count'] = len(removed)
+            finally:
+                # Vectors are flushed first, so the checkpoint and the manifest never
+                # list products whose vectors were lost
+                await run_io(job.persist)
+                await run_io(manifest.save)
+
+            # The re-ranker scores text against the primary model's image embeddings
+            if model == PRIMARY_MODEL and get_reranker() is not None:
+                await self._embed_product_texts(catalog, clip_embedder, registry.model_name(model))
+
+            with job._lock:
+                job.counts.update({key: value for key, value in result.items() if key in job.counts})
+            job.index_stats = await run_io(pinecone_service.get_index_stats)
+            job.status = 'completed'
+            print(f"Index job {job.job_id} completed: {job.progress()}")
+
+        except asyncio.CancelledError:
+            job.status = 'cancelled'
+            print(f"Index job {job.job_id} cancelled")
+            raise
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            job.error_type = type(e).__name__
+            print(f"Index job {job.job_id} failed: {e}")
+        finally:
+            if job._pipeline is not None and job.status != 'completed':
+                with job._lock:
+                    job.counts.update({
+                        key: value for key, value in job._pipeline.stats.items() if key in job.counts
+                    })
+            job._pipeline = None
+            job._flush = None
+            job.finished_at = time.time()
+            try:
+                job.save()
+            finally:
+                self._release_run_lock(job)
+
+    @staticmethod
+    async def _embed_product_texts(catalog, embedder, model_name: str, batch_size: int = 64):
+        """Fill in text embeddings for catalog products lacking one from this model (used by the re-ranker)."""
+        embedded = 0
+        after = ''
+        try:
+            while True:
+                batch = await run_io(catalog.missing_text_embeddings, after, batch_size, model_name)
+                if not batch:
+                    break
+                product_ids = [product_id for product_id, _ in batch]
+                embeddings = await run_inference(embedder.embed_texts, [text for _, text in batch])
+                await run_io(catalog.set_text_embeddings, product_ids, embeddings, model_name)
+                embedded += len(batch)
+                after = product_ids[-1]
+        except Exception as e:
+            # Re-ranking falls back to image similarity for products without text embeddings
+            print(f"Error embedding product texts: {e}")
+        if embedded:
+            print(f"Embedded text of {embedded} products for re-ranking")
+
+    @staticmethod
+    def _skip_completed(job: IndexJob, products: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Drop products the job already upserted, counting them as resumed."""
+        completed = set(job.completed_ids)
+        for product in products:
+            if str(product.get('id')) in completed:
+                with job._lock:
+                    job.counts['resumed_count'] += 1
+                continue
+            yield product
+
+
+# Global instance
+_index_job_manager_instance = None
+_index_job_manager_lock = threading.Lock()
+
+def get_index_job_manager() -> IndexJobManager:
+    """
+    Get or create the global index job manager.
+    Job checkpoints are stored under INDEX_JOBS_PATH and written at most
+    every INDEX_CHECKPOINT_SECONDS.
+    """
+    global _index_job_manager_instance
+
+    if _index_job_manager_instance is None:
+        with _index_job_manager_lock:
+            if _index_job_manager_instance is None:
+                _index_job_manager_instance = IndexJobManager(
+                    path=os.getenv('INDEX_JOBS_PATH', 'data/index_jobs'),
+                    checkpoint_interval=float(os.getenv('INDEX_CHECKPOINT_SECONDS', 30))
+                )
+
+    return _index_job_manager_instance
+
+async def shutdown_index_jobs():
+    """Cancel running jobs at application shutdown, without creating the manager if unused."""
+    if _index_job_manager_instance is not None:
+        await _index_job_manager_instance.shutdown()
@@ -0,0 +1,270 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class IndexManifest:
+    """
+    Local record of what has been indexed, used for incremental reindexing.
+
+    For every indexed product it keeps the WordPress `modified` time, the
+    image URL, a hash of the downloaded image bytes and the embedding that
+    was upserted. Products whose `modified` time and image URL are unchanged
+    are skipped entirely; products whose image bytes hash the same reuse the
+    stored embedding instead of running the model again.
+    """
+
+    MANIFEST_FILE = 'manifest.json'
+    # Embeddings file of manifests saved before files were versioned
+    EMBEDDINGS_FILE = 'embeddings.npy'
+
+    def __init__(self, path: str, model_name: Optional[str] = None):
+        """
+        Initialize the manifest, loading any previously saved state.
+
+        Args:
+            path: Directory where the manifest is persisted
+            model_name: Embedding model the stored vectors belong to; a saved
+                manifest for a different model is discarded
+        """
+        self.path = path
+        self.model_name = model_name
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._embeddings: Dict[str, np.ndarray] = {}
+        self._mtime: Optional[int] = None  # of the manifest file as last loaded or saved
+        self._generation = 0  # of the manifest as last loaded or saved, names its embeddings file
+
+        self._load()
+
+    def _stat(self) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(self.path, self.MANIFEST_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def refresh(self) -> bool:
+        """
+        Reload the manifest if another process saved it since it was last loaded.
+
+        Returns:
+            True if it was reloaded
+        """
+        mtime = self._stat()
+        if mtime is None or mtime == self._mtime:
+            return False
+        with self._lock:
+            self._entries = {}
+            self._embeddings = {}
+        self._load()
+        return True
+
+    def _load(self):
+        """Load the manifest and the embeddings file it references from disk."""
+        manifest_path = os.path.join(self.path, self.MANIFEST_FILE)
+
+        self._mtime = self._stat()
+        if not os.path.exists(manifest_path):
+            return
+
+        # A concurrent save may replace the manifest and delete the embeddings file
+        # it referenced between the two reads; the new manifest is read again then
+        for attempt in range(2):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Manifests saved before versioned embeddings files use the fixed name
+            embeddings_path = os.path.join(self.path, data.get('embeddings_file', self.EMBEDDINGS_FILE))
+            try:
+                embeddings = np.load(embeddings_path)
+                break
+            except FileNotFoundError:
+                if attempt:
+                    print("Ignoring index manifest whose embeddings file is missing")
+                    return
+
+        self._generation = data.get('generation', 0)
+        if self.model_name and data.get('model_name') != self.model_name:
+            print(f"Ignoring index manifest built with model {data.get('model_name')}")
+            return
+
+        order = data.get('order', [])
+        if len(order) != len(embeddings):
+            print("Ignoring inconsistent index manifest")
+            return
+
+        self._entries = data.get('products', {})
+        self._embeddings = {product_id: embeddings[row] for row, product_id in enumerate(order)}
+        print(f"Loaded index manifest with {len(self._entries)} products")
+
+    def save(self):
+        """
+        Persist the manifest.
+
+        The embeddings go to a new file named after the manifest generation,
+        and replacing `manifest.json` (which names that file) is the single
+        commit point, so a crash at any time leaves either the old or the new
+        pair on disk, never a mix of the two. Older embeddings files are
+        deleted afterwards.
+        """
+        with self._lock:
+            order = [product_id for product_id in self._entries if product_id in self._embeddings]
+            entries = {product_id: self._entries[product_id] for product_id in order}
+            if order:
+                embeddings = np.stack([self._embeddings[product_id] for product_id in order])
+            else:
+                embeddings = np.zeros((0, 0), dtype=np.float32)
+
+        os.makedirs(self.path, exist_ok=True)
+        manifest_path = os.path.join(self.path, self.MANIFEST_FILE)
+        generation = self._generation + 1
+        embeddings_file = f"embeddings-{generation:06d}.npy"
+
+        with open(os.path.join(self.path, embeddings_file), 'wb') as f:
+            np.save(f, embeddings.astype(np.float32))
+            f.flush()
+            os.fsync(f.fileno())
+
+        tmp_manifest = manifest_path + '.tmp'
+        with open(tmp_manifest, 'w', encoding='utf-8') as f:
+            json.dump({
+                'model_name': self.model_name,
+                'generation': generation,
+                'embeddings_file': embeddings_file,
+                'order': order,
+                'products': entries
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_manifest, manifest_path)
+        self._generation = generation
+        self._mtime = self._stat()
+
+        for name in os.listdir(self.path):
+            if name.startswith('embeddings') and name.endswith('.npy') and name != embeddings_file:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def product_ids(self) -> List[str]:
+        """Get the ids of all products in the manifest."""
+        with self._lock:
+            return list(self._entries)
+
+    def is_unchanged(self, product: Dict[str, Any]) -> bool:
+        """
+        Check whether a product can be skipped without downloading its image.
+
+        Args:
+            product: Processed product dictionary
+
+        Returns:
+            True if the product's modified time and image URL match the manifest
+        """
+        entry = self._entries.get(str(product.get('id')))
+        if not entry or not product.get('modified'):
+            return False
+        return entry.get('modified') == product.get('modified') and entry.get('image_url') == product.get('image_url')
+
+    def lookup_embedding(self, product_id: Any, image_hash: str) -> Optional[np.ndarray]:
+        """
+        Get the stored embedding for a product if its image bytes are unchanged.
+
+        Args:
+            product_id: Product ID
+            image_hash: Hash of the newly downloaded image bytes
+
+        Returns:
+            Stored embedding, or None if the image changed or is unknown
+        """
+        product_id = str(product_id)
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry and entry.get('image_hash') == image_hash:
+                return self._embeddings.get(product_id)
+        return None
+
+    def record(self, product: Dict[str, Any], image_hash: str, embedding: np.ndarray):
+        """
+        Record a product that has been upserted.
+
+        Args:
+            product: Processed product dictionary
+            image_hash: Hash of the image bytes that were embedded
+            embedding: Embedding that was upserted
+        """
+        product_id = str(product.get('id'))
+        with self._lock:
+            self._entries[product_id] = {
+                'modified': product.get('modified'),
+                'image_url': product.get('image_url'),
+                'image_hash': image_hash
+            }
+            self._embeddings[product_id] = np.asarray(embedding, dtype=np.float32)
+
+    def remove(self, product_ids: Iterable[Any]):
+        """Remove products from the manifest."""
+        with self._lock:
+            for product_id in product_ids:
+                self._entries.pop(str(product_id), None)
+                self._embeddings.pop(str(product_id), None)
+
+    def plan(
+        self,
+        products: List[Dict[str, Any]],
+        complete: bool = True
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[str]]:
+        """
+        Split a crawl into products to process, unchanged products and removed product ids.
+
+        Args:
+            products: Products returned by the WordPress crawl
+            complete: Whether the crawl covered the whole catalog; removals are
+                only computed for complete crawls
+
+        Returns:
+            Tuple of (products to process, unchanged products, ids of removed products)
+        """
+        to_process = []
+        unchanged = []
+        for product in products:
+            if self.is_unchanged(product):
+                unchanged.append(product)
+            else:
+                to_process.append(product)
+
+        removed = []
+        if complete:
+            seen = {str(product.get('id')) for product in products}
+            removed = [product_id for product_id in self.product_ids() if product_id not in seen]
+
+        return to_process, unchanged, removed
+
+
+# Global instance
+_index_manifest_instance = None
+
+def get_index_manifest(model_name: Optional[str] = None) -> IndexManifest:
+    """
+    Get or create the global index manifest stored at INDEX_MANIFEST_PATH.
+
+    Args:
+        model_name: Embedding model the manifest's vectors belong to
+    """
+    global _index_manifest_instance
+
+    if _index_manifest_instance is None:
+        _index_manifest_instance = IndexManifest(
+            path=os.getenv('INDEX_MANIFEST_PATH', 'data/index_manifest'),
+            model_name=model_name
+        )
+
+    return _index_manifest_instance
@@ -0,0 +1,314 @@
+import asyncio
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from models.image_preprocessing import prepare_image
+
+from .executors import get_inference_executor
+from .metrics import INDEX_STAGE_SECONDS, INDEX_PRODUCTS
+
+_DONE = object()
+
+
+class IndexingPipeline:
+    """
+    Streaming download -> decode -> embed -> upsert pipeline for product images.
+
+    Downloads run on a bounded pool of HTTP workers, decoding runs on a
+    separate thread pool, and decoded images are embedded in batches and
+    streamed into the vector store's `upsert_stream` on its own thread, which
+    keeps several requests in flight while embedding continues. Stages are
+    connected by bounded queues, so memory stays flat regardless of how many
+    products are streamed through.
+
+    When an IndexManifest is supplied, images whose downloaded bytes hash to
+    the value recorded in the manifest reuse the stored embedding instead of
+    being decoded and embedded again, and every product is recorded once the
+    request that upserted it has succeeded.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        vector_store,
+        max_concurrent_downloads: int = 16,
+        decode_workers: int = 4,
+        embed_batch_size: int = 32,
+        upsert_queue_size: int = 256,
+        download_timeout: float = 10,
+        manifest=None
+    ):
+        """
+        Initialize the pipeline.
+
+        Args:
+            embedder: Object exposing `embed_images_batch`
+            vector_store: Object exposing `upsert_stream`
+            max_concurrent_downloads: Maximum number of image downloads in flight
+            decode_workers: Number of threads decoding and resizing images
+            embed_batch_size: Number of images per model call
+            upsert_queue_size: Maximum number of embedded products waiting for the vector store
+            download_timeout: Per-image HTTP timeout in seconds
+            manifest: Optional IndexManifest used to reuse unchanged embeddings
+        """
+        self.embedder = embedder
+        self.vector_store = vector_store
+        self.max_concurrent_downloads = max(1, max_concurrent_downloads)
+        self.decode_workers = max(1, decode_workers)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.upsert_queue_size = max(1, upsert_queue_size)
+        self.download_timeout = download_timeout
+        self.manifest = manifest
+        self.stats: Dict[str, Any] = {}
+
+    def _create_session(self) -> requests.Session:
+        """Create an HTTP session whose connection pool matches the download concurrency."""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.max_concurrent_downloads,
+            pool_maxsize=self.max_concurrent_downloads
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    async def run(
+        self,
+        products: Iterable[Dict[str, Any]],
+        on_batch_upserted: Optional[Callable[[List[Dict[str, Any]], Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Stream products through the pipeline.
+
+        Args:
+            products: Iterable of product dictionaries (may be a lazy generator)
+            on_batch_upserted: Optional blocking callback run on the upsert thread after
+                each successful upsert request with its products and a copy of the
+                running counts (used to checkpoint progress)
+
+        Returns:
+            Dictionary with indexed/skipped counts and elapsed time
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+
+        # Live counts, readable through `self.stats` while the run is in progress
+        stats = {'total_products': 0, 'indexed_count': 0, 'skipped_count': 0, 'reused_count': 0}
+        self.stats = stats
+
+        # Bounded queues provide backpressure between stages
+        product_queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_concurrent_downloads * 2)
+        image_queue: asyncio.Queue = asyncio.Queue(maxsize=self.embed_batch_size * 2)
+        # Chunks of at most embed_batch_size embedded products
+        upsert_queue: asyncio.Queue = asyncio.Queue(
+            maxsize=max(1, -(-self.upsert_queue_size // self.embed_batch_size))
+        )
+        # Image hash of each queued or in-flight product, keyed by id() of its dictionary
+        image_hashes: Dict[int, str] = {}
+
+        session = self._create_session()
+        download_pool = ThreadPoolExecutor(
+            max_workers=self.max_concurrent_downloads, thread_name_prefix='index-download'
+        )
+        decode_pool = ThreadPoolExecutor(
+            max_workers=self.decode_workers, thread_name_prefix='index-decode'
+        )
+        upsert_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='index-upsert')
+
+        async def produce():
+            iterator = iter(products)
+            while True:
+                # The source may be a lazy crawler doing blocking HTTP, so pull it off the event loop
+                product = await loop.run_in_executor(download_pool, next, iterator, _DONE)
+                if product is _DONE:
+                    break
+
+                stats['total_products'] += 1
+                if not product.get('image_url'):
+                    print(f"Skipping product {product.get('id')} - no image URL")
+                    stats['skipped_count'] += 1
+                    continue
+
+                await product_queue.put(product)
+
+            for _ in range(self.max_concurrent_downloads):
+                await product_queue.put(_DONE)
+
+        async def fetch_and_decode():
+            while True:
+                product = await product_queue.get()
+                if product is _DONE:
+                    break
+
+                try:
+                    with INDEX_STAGE_SECONDS.time(stage='download'):
+                        response = await loop.run_in_executor(
+                            download_pool,
+                            lambda: session.get(product['image_url'], timeout=self.download_timeout)
+                        )
+                    response.raise_for_status()
+                    image_hash = hashlib.sha256(response.content).hexdigest()
+
+                    # Unchanged image bytes: reuse the embedding recorded in the manifest
+                    embedding = None
+                    if self.manifest is not None:
+                        embedding = self.manifest.lookup_embedding(product.get('id'), image_hash)
+
+                    image = None
+                    if embedding is None:
+                        with INDEX_STAGE_SECONDS.time(stage='decode'):
+                            image = await loop.run_in_executor(
+                                decode_pool, prepare_image, response.content
+                            )
+                except Exception as e:
+                    print(f"Error processing product {product.get('id')}: {e}")
+                    stats['skipped_count'] += 1
+                    continue
+
+                await image_queue.put((product, image_hash, image, embedding))
+
+        # Runs on the upsert thread: the vector store pulls pairs from the queue as it
+        # sends requests, so several requests are in flight while embedding continues
+        def queued_pairs():
+            while True:
+                chunk = asyncio.run_coroutine_threadsafe(upsert_queue.get(), loop).result()
+                if chunk is _DONE:
+                    return
+                yield from chunk
+
+        # Runs on the upsert thread once a request has succeeded, so the manifest and
+        # the checkpoint only ever list products whose vectors were accepted
+        def on_upserted(pairs: List[Tuple[Dict[str, Any], np.ndarray]]):
+            batch_hashes = [image_hashes.pop(id(product)) for product, _ in pairs]
+            if self.manifest is not None:
+                for (product, embedding), image_hash in zip(pairs, batch_hashes):
+                    self.manifest.record(product, image_hash, embedding)
+            stats['indexed_count'] += len(pairs)
+
+            if on_batch_upserted is not None:
+                on_batch_upserted([product for product, _ in pairs], dict(stats))
+
+        async def embed():
+            queued = 0
+
+            async def enqueue(pairs):
+                nonlocal queued
+                for product, image_hash, _ in pairs:
+                    image_hashes[id(product)] = image_hash
+                queued += len(pairs)
+                # Time spent here is time the vector store is behind the model
+                with INDEX_STAGE_SECONDS.time(stage='upsert'):
+                    await upsert_queue.put([(product, embedding) for product, _, embedding in pairs])
+
+            finished = False
+            while not finished:
+                batch = []
+                reused = []
+                while len(batch) < self.embed_batch_size and len(reused) < self.embed_batch_size:
+                    item = await image_queue.get()
+                    if item is _DONE:
+                        finished = True
+                        break
+
+                    product, image_hash, image, embedding = item
+                    if embedding is not None:
+                        reused.append((product, image_hash, np.asarray(embedding, dtype=np.float32)))
+                        stats['reused_count'] += 1
+                    else:
+                        batch.append((product, image_hash, image))
+
+                if reused:
+                    await enqueue(reused)
+
+                if batch:
+                    images = [image for _, _, image in batch]
+                    try:
+                        with INDEX_STAGE_SECONDS.time(stage='embed'):
+                            embeddings = await loop.run_in_executor(
+                                get_inference_executor(), self.embedder.embed_images_batch, images
+                            )
+                    except Exception as e:
+                        print(f"Error embedding batch of {len(batch)} images: {e}")
+                        stats['skipped_count'] += len(batch)
+                    else:
+                        embeddings = np.asarray(embeddings, dtype=np.float32)
+                        await enqueue([
+                            (product, image_hash, embedding)
+                            for (product, image_hash, _), embedding in zip(batch, embeddings)
+                        ])
+                        print(f"Embedded {queued} products so far")
+
+            await upsert_queue.put(_DONE)
+
+        async def feed():
+            await produce()
+            await asyncio.gather(*fetchers)
+            await image_queue.put(_DONE)
+
+        fetchers = [
+            asyncio.ensure_future(fetch_and_decode())
+            for _ in range(self.max_concurrent_downloads)
+        ]
+        feeder = asyncio.ensure_future(feed())
+        consumer = asyncio.ensure_future(embed())
+        upserter = loop.run_in_executor(
+            upsert_pool, lambda: self.vector_store.upsert_stream(queued_pairs(), on_upserted=on_upserted)
+        )
+        tasks = fetchers + [feeder, consumer]
+
+        try:
+            # Surface a failure in any stage immediately instead of deadlocking on a full queue
+            done, _ = await asyncio.wait({feeder, consumer, upserter}, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+            await consumer
+            await upserter
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            # Drop the queued products and let the upsert thread finish (and record) the
+            # requests already in flight, so nothing is recorded after run() returns
+            while not upsert_queue.empty():
+                upsert_queue.get_nowait()
+            upsert_queue.put_nowait(_DONE)
+            await asyncio.wait({upserter})
+            raise
+        finally:
+            session.close()
+            download_pool.shutdown(wait=False)
+            decode_pool.shutdown(wait=False)
+            upsert_pool.shutdown(wait=False)
+
+            INDEX_PRODUCTS.inc(stats['indexed_count'] - stats['reused_count'], result='embedded')
+            INDEX_PRODUCTS.inc(stats['reused_count'], result='reused')
+            INDEX_PRODUCTS.inc(stats['skipped_count'], result='skipped')
+
+        stats['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+        return stats
+
+
+def create_indexing_pipeline(embedder, vector_store, manifest=None) -> IndexingPipeline:
+    """
+    Create an indexing pipeline configured from environment variables.
+
+    Args:
+        embedder: Object exposing `embed_images_batch`
+        vector_store: Object exposing `upsert_stream`
+        manifest: Optional IndexManifest for incremental reindexing
+    """
+    return IndexingPipeline(
+        embedder=embedder,
+        vector_store=vector_store,
+        max_concurrent_downloads=int(os.getenv('INDEX_MAX_CONCURRENT_DOWNLOADS', 16)),
+        decode_workers=int(os.getenv('INDEX_DECODE_WORKERS', 4)),
+        embed_batch_size=int(os.getenv('INDEX_EMBED_BATCH_SIZE', 32)),
+        upsert_queue_size=int(os.getenv('INDEX_UPSERT_QUEUE_SIZE', 256)),
+        manifest=manifest
+    )
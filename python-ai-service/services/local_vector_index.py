@@ -0,0 +1,591 @@
+import json
+import os
+import threading
+import time
+from itertools import islice
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .metrics import VECTOR_STORE_ERRORS
+from .pinecone_service import build_vector_metadata, format_product_matches
+
+
+class LocalVectorIndex:
+    """
+    In-process vector index with the same surface as PineconeService.
+
+    Embeddings are kept L2-normalized in a contiguous float32 matrix so an
+    exact cosine top-k is a single matrix-vector product plus argpartition.
+
+    On disk the matrix is a preallocated .npy file that every process
+    memory-maps and that is only ever appended to: upserts write new rows
+    past the published row count, and the old row of a re-upserted or
+    deleted product is kept as a dead row (excluded from results) until the
+    next compaction. Product ids and metadata are appended to a JSON-lines
+    file. A small marker file records the row count, the length of the
+    products file and the dead rows; replacing it is the single commit
+    point, so a crash always leaves a consistent version behind.
+
+    Writes are published to queries in this process immediately and become
+    durable on `flush()`; index jobs flush at their checkpoints. Other
+    processes notice a new marker on their next query (checked at most every
+    `reload_interval` seconds) and map the new rows without copying them.
+
+    Once more than `compact_fraction` of the rows are dead, or the file is
+    full, live rows are copied into a new file, doubling its capacity when
+    needed, so appends cost amortized O(1).
+    """
+
+    MARKER_FILE = 'index.json'
+    # Written by versions that rewrote the whole index on every upsert
+    LEGACY_EMBEDDINGS_FILE = 'embeddings.npy'
+    LEGACY_PRODUCTS_FILE = 'products.json'
+    MIN_CAPACITY = 1024
+
+    def __init__(
+        self,
+        path: str,
+        dimension: int = 512,
+        catalog=None,
+        compact_fraction: float = 0.2,
+        reload_interval: float = 1.0
+    ):
+        """
+        Initialize the local index, loading any previously saved state.
+
+        Args:
+            path: Directory where the index is persisted
+            dimension: Dimension of vectors (512 for CLIP ViT-B/32)
+            catalog: Optional ProductCatalog; when set, only product ids are stored
+                and query results are hydrated from the catalog
+            compact_fraction: Fraction of dead rows that triggers a compaction on flush
+            reload_interval: Seconds between checks for a version written by another process
+        """
+        self.path = path
+        self.index_name = f"local:{path}"
+        self.dimension = dimension
+        self.catalog = catalog
+        self.compact_fraction = compact_fraction
+        self.reload_interval = reload_interval
+
+        self._lock = threading.Lock()
+        # (matrix, ids, metadata, dead rows) snapshot; swapped atomically so queries
+        # never see a partial update. Rows are never modified once published and the
+        # id and metadata lists are only appended to, so readers index them by row
+        # count of their own matrix.
+        self._state = (np.zeros((0, dimension), dtype=np.float32), [], [], np.zeros(0, dtype=np.int64))
+
+        self._vectors = None            # memory-mapped vectors file of the current layout
+        self._layout = 0                # bumped whenever rows move (compaction)
+        self._version = 0               # version of the last loaded or written marker
+        self._marker_layout = 0
+        self._marker_mtime: Optional[int] = None
+        self._checked_at = 0.0
+        self._persisted_rows = 0
+        self._persisted_dead = 0
+        self._products_bytes = 0
+        self._legacy = False
+        self._positions: Optional[Dict[str, int]] = None  # product id -> live row, built on first write
+
+        self._load()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @staticmethod
+    def _vectors_name(layout: int) -> str:
+        return f"vectors-{layout:06d}.npy"
+
+    @staticmethod
+    def _products_name(layout: int) -> str:
+        return f"products-{layout:06d}.jsonl"
+
+    def _read_marker(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._file(self.MARKER_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _marker_stat(self) -> Optional[int]:
+        try:
+            return os.stat(self._file(self.MARKER_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        """Load the saved index, memory-mapping the vectors file."""
+        mtime = self._marker_stat()
+        marker = self._read_marker()
+        if marker is not None:
+            self._apply_marker(marker)
+            self._marker_mtime = mtime
+            print(f"Loaded local index with {self._live_count()} vectors from: {self.path}")
+            return
+
+        embeddings_path = self._file(self.LEGACY_EMBEDDINGS_FILE)
+        products_path = self._file(self.LEGACY_PRODUCTS_FILE)
+        if not (os.path.exists(embeddings_path) and os.path.exists(products_path)):
+            print(f"Starting empty local index at: {self.path}")
+            self._on_load(None)
+            return
+
+        # Rewritten into the current format on the first flush
+        matrix = np.load(embeddings_path, mmap_mode='r')
+        with open(products_path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        self._check_shape(matrix, len(records))
+
+        self._vectors = matrix
+        self._legacy = True
+        self._persisted_rows = len(records)
+        self._state = (
+            matrix,
+            [record['id'] for record in records],
+            [record['metadata'] for record in records],
+            np.zeros(0, dtype=np.int64)
+        )
+        self._on_load(None)
+        print(f"Loaded local index with {len(records)} vectors from: {self.path}")
+
+    def _check_shape(self, vectors: np.ndarray, rows: int):
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimension or vectors.shape[0] < rows:
+            raise ValueError(
+                f"Local index at {self.path} is inconsistent "
+                f"(matrix {vectors.shape}, {rows} products, expected dimension {self.dimension})"
+            )
+
+    def _apply_marker(self, marker: Dict[str, Any]):
+        """Map the version described by a marker, reading only products appended since the last one."""
+        if marker.get('dimension') != self.dimension:
+            raise ValueError(
+                f"Local index at {self.path} has dimension {marker.get('dimension')}, expected {self.dimension}"
+            )
+
+        rows = marker['rows']
+        same_layout = self._vectors is not None and not self._legacy and marker['layout'] == self._layout
+        if same_layout:
+            # The mapping already covers the whole preallocated file
+            vectors = self._vectors
+            previous_rows = len(self._state[0])
+            _, ids, metadata, _ = self._state
+            offset = self._products_bytes
+        else:
+            vectors = np.load(self._file(marker['vectors']), mmap_mode='r')
+            previous_rows = None
+            ids, metadata = [], []
+            offset = 0
+
+        with open(self._file(marker['products']), 'rb') as f:
+            f.seek(offset)
+            data = f.read(marker['products_bytes'] - offset)
+        for line in data.splitlines():
+            record = json.loads(line)
+            ids.append(record['id'])
+            metadata.append(record['metadata'])
+        self._check_shape(vectors, rows)
+        if len(ids) != rows:
+            raise ValueError(f"Local index at {self.path} is inconsistent ({len(ids)} products, {rows} rows)")
+
+        dead_rows = np.asarray(marker.get('dead_rows', []), dtype=np.int64)
+        self._vectors = vectors
+        self._layout = marker['layout']
+        self._marker_layout = marker['layout']
+        self._version = marker['version']
+        self._products_bytes = marker['products_bytes']
+        self._persisted_rows = rows
+        self._persisted_dead = len(dead_rows)
+        self._legacy = False
+        self._positions = None
+
+        if same_layout:
+            self._publish(vectors[:rows], ids, metadata, dead_rows, appended_from=previous_rows)
+        else:
+            self._state = (vectors[:rows], ids, metadata, dead_rows)
+            self._on_load(marker)
+
+    def _on_load(self, marker: Optional[Dict[str, Any]]):
+        """Hook run after a new layout was mapped (marker is None for new or legacy indexes)."""
+
+    def _persist_extra(self, version: int) -> Dict[str, Any]:
+        """Hook returning extra marker fields to commit with a flush."""
+        return {}
+
+    def _live_count(self) -> int:
+        matrix, _, _, dead_rows = self._state
+        return len(matrix) - len(dead_rows)
+
+    def _dirty(self) -> bool:
+        """Whether this process holds writes that are not flushed yet."""
+        matrix, _, _, dead_rows = self._state
+        return (
+            len(matrix) != self._persisted_rows
+            or len(dead_rows) != self._persisted_dead
+            or self._layout != self._marker_layout
+        )
+
+    def refresh(self) -> bool:
+        """
+        Pick up a version flushed by another process.
+
+        Checks the marker at most every `reload_interval` seconds and never
+        while this process has unflushed writes of its own.
+
+        Returns:
+            True if a new version was loaded
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return False
+        self._checked_at = now
+
+        mtime = self._marker_stat()
+        if mtime is None or mtime == self._marker_mtime:
+            return False
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self._dirty():
+                return False
+            return self._reload(mtime)
+        finally:
+            self._lock.release()
+
+    def _reload(self, mtime: Optional[int]) -> bool:
+        """Load the marker's version if it is newer (write lock held)."""
+        marker = self._read_marker()
+        self._marker_mtime = mtime
+        if marker is None or marker['version'] == self._version:
+            return False
+        try:
+            self._apply_marker(marker)
+        except (OSError, ValueError, KeyError) as e:
+            # e.g. a compaction removed the files between reading the marker and mapping them
+            self._marker_mtime = None
+            print(f"Error reloading local index at {self.path}: {e}")
+            return False
+        print(f"Reloaded local index version {self._version} ({self._live_count()} vectors)")
+        return True
+
+    def _prepare_write(self, new_rows: int = 0):
+        """Catch up with other processes and make room for new rows (write lock held)."""
+        if not self._dirty():
+            self._reload(self._marker_stat())
+
+        matrix, ids, _, dead_rows = self._state
+        if self._positions is None:
+            dead = set(dead_rows.tolist())
+            self._positions = {product_id: row for row, product_id in enumerate(ids[:len(matrix)]) if row not in dead}
+
+        capacity = 0 if self._vectors is None or self._legacy else len(self._vectors)
+        if len(matrix) + new_rows > capacity:
+            live = len(matrix) - len(dead_rows)
+            self._compact(capacity=max(2 * (live + new_rows), self.MIN_CAPACITY))
+        elif self._vectors is not None and not self._vectors.flags.writeable:
+            self._vectors = np.load(self._file(self._vectors_name(self._layout)), mmap_mode='r+')
+
+    def _compact(self, capacity: int):
+        """Copy live rows into a new vectors file of the given capacity (write lock held)."""
+        matrix, ids, metadata, dead_rows = self._state
+        live_rows = np.setdiff1d(np.arange(len(matrix)), dead_rows)
+        layout = self._layout + 1
+        capacity = max(capacity, len(live_rows), self.MIN_CAPACITY)
+
+        os.makedirs(self.path, exist_ok=True)
+        vectors = np.lib.format.open_memmap(
+            self._file(self._vectors_name(layout)), mode='w+', dtype=np.float32, shape=(capacity, self.dimension)
+        )
+        # Copied in chunks so a memory-mapped source is never loaded at once
+        for start in range(0, len(live_rows), 65536):
+            chunk = live_rows[start:start + 65536]
+            vectors[start:start + len(chunk)] = matrix[chunk]
+        open(self._file(self._products_name(layout)), 'wb').close()
+
+        ids = [ids[row] for row in live_rows]
+        metadata = [metadata[row] for row in live_rows]
+        self._vectors = vectors
+        self._layout = layout
+        self._legacy = False
+        self._persisted_rows = 0
+        self._persisted_dead = 0
+        self._products_bytes = 0
+        self._positions = {product_id: row for row, product_id in enumerate(ids)}
+        self._publish(vectors[:len(ids)], ids, metadata, np.zeros(0, dtype=np.int64))
+        print(f"Compacted local index to {len(ids)} vectors (capacity {capacity})")
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows so that dot products are cosine similarities."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def upsert_products(self, products: List[Dict[str, Any]], embeddings: np.ndarray):
+        """
+        Insert or update product embeddings in the local index.
+
+        The rows are visible to queries in this process right away; call
+        `flush()` to make them durable and visible to other processes.
+
+        Args:
+            products: List of product dictionaries with id, name, image, etc.
+            embeddings: Corresponding embeddings array (products x dimension)
+        """
+        if not products:
+            return
+
+        new_vectors = self._normalize(np.asarray(embeddings).reshape(len(products), self.dimension))
+
+        with self._lock:
+            try:
+                self._prepare_write(new_rows=len(products))
+            except Exception:
+                VECTOR_STORE_ERRORS.inc(operation='upsert')
+                raise
+
+            matrix, ids, metadata, dead_rows = self._state
+            start = len(matrix)
+            replaced = []
+            for i, product in enumerate(products):
+                product_id = str(product.get('id'))
+                previous = self._positions.get(product_id)
+                if previous is not None:
+                    replaced.append(previous)
+                self._positions[product_id] = start + i
+
+            # Written past the published rows, so concurrent queries never see them half-written
+            end = start + len(products)
+            self._vectors[start:end] = new_vectors
+            ids.extend(str(product.get('id')) for product in products)
+            metadata.extend(build_vector_metadata(product, compact=self.catalog is not None) for product in products)
+            if replaced:
+                dead_rows = np.union1d(dead_rows, replaced)
+            self._publish(self._vectors[:end], ids, metadata, dead_rows, appended_from=start)
+
+        print(f"Upserted {len(products)} products to local index ({self._live_count()} total)")
+
+    def upsert_stream(
+        self,
+        pairs: Iterable[Tuple[Dict[str, Any], np.ndarray]],
+        on_upserted: Optional[Callable[[List[Tuple[Dict[str, Any], np.ndarray]]], None]] = None,
+        batch_size: int = 1000
+    ) -> int:
+        """
+        Insert or update a stream of (product, embedding) pairs in the local index.
+
+        Args:
+            pairs: Iterable of (product dictionary, embedding) pairs (may be a lazy generator)
+            on_upserted: Optional callback run with the pairs of each applied batch
+            batch_size: Number of pairs applied at a time
+
+        Returns:
+            Number of vectors upserted
+        """
+        iterator = iter(pairs)
+        upserted = 0
+        while True:
+            chunk = list(islice(iterator, batch_size))
+            if not chunk:
+                return upserted
+            self.upsert_products([product for product, _ in chunk], np.stack([embedding for _, embedding in chunk]))
+            upserted += len(chunk)
+            if on_upserted is not None:
+                on_upserted(chunk)
+
+    def flush(self):
+        """Persist pending writes and publish them to other processes."""
+        with self._lock:
+            try:
+                self._flush()
+            except Exception:
+                VECTOR_STORE_ERRORS.inc(operation='flush')
+                raise
+
+    def _flush(self):
+        """Append unsaved products and commit a new marker (write lock held)."""
+        matrix, _, _, dead_rows = self._state
+        if self._legacy or (len(matrix) and len(dead_rows) > self.compact_fraction * len(matrix)):
+            capacity = 0 if self._legacy else len(self._vectors)
+            self._compact(capacity=max(capacity, 2 * self._live_count()))
+        if not self._dirty():
+            return
+
+        matrix, ids, metadata, dead_rows = self._state
+        rows = len(matrix)
+        if rows:
+            self._vectors.flush()
+
+        products_path = self._file(self._products_name(self._layout))
+        lines = ''.join(
+            json.dumps({'id': product_id, 'metadata': product_metadata}) + '\n'
+            for product_id, product_metadata in zip(ids[self._persisted_rows:rows], metadata[self._persisted_rows:rows])
+        ).encode('utf-8')
+        with open(products_path, 'r+b') as f:
+            # Drop bytes a crashed writer appended after the last marker
+            f.truncate(self._products_bytes)
+            f.seek(self._products_bytes)
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+        version = self._version + 1
+        marker = {
+            'version': version,
+            'layout': self._layout,
+            'dimension': self.dimension,
+            'vectors': self._vectors_name(self._layout),
+            'products': self._products_name(self._layout),
+            'rows': rows,
+            'products_bytes': self._products_bytes + len(lines),
+            'dead_rows': dead_rows.tolist()
+        }
+        marker.update(self._persist_extra(version))
+
+        marker_path = self._file(self.MARKER_FILE)
+        with open(marker_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(marker, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(marker_path + '.tmp', marker_path)
+
+        self._version = version
+        self._marker_layout = self._layout
+        self._marker_mtime = self._marker_stat()
+        self._products_bytes = marker['products_bytes']
+        self._persisted_rows = rows
+        self._persisted_dead = len(dead_rows)
+        self._remove_unreferenced(marker)
+
+    def _remove_unreferenced(self, marker: Dict[str, Any]):
+        """Delete files of older layouts (processes still mapping them keep their copy until they reload)."""
+        keep = {self.MARKER_FILE, marker['vectors'], marker['products']}
+        keep.update(value['file'] for value in marker.values() if isinstance(value, dict) and 'file' in value)
+        legacy = {self.LEGACY_EMBEDDINGS_FILE, self.LEGACY_PRODUCTS_FILE, 'ann.faiss', 'ann.json'}
+        for name in os.listdir(self.path):
+            if name in keep or not (name.startswith(('vectors-', 'products-', 'ann-')) or name in legacy):
+                continue
+            try:
+                os.remove(self._file(name))
+            except FileNotFoundError:
+                pass
+
+    def query_similar_products(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        min_score: float = 0.6
+    ) -> List[Dict[str, Any]]:
+        """
+        Query for similar products using an exact cosine search.
+
+        Args:
+            query_embedding: Query vector (512 dimensions)
+            top_k: Number of results to return
+            min_score: Minimum similarity score (0-1)
+
+        Returns:
+            List of matching products with scores
+        """
+        self.refresh()
+        matrix, ids, metadata, dead_rows = self._state
+        if not len(matrix) or top_k <= 0:
+            return []
+
+        query = self._normalize(np.asarray(query_embedding).reshape(-1))
+        rows, scores = self._search(matrix, query, min(top_k, len(matrix)), dead_rows)
+
+        matches = [
+            (ids[row], metadata[row], float(score))
+            for row, score in zip(rows, scores)
+            if score >= min_score
+        ]
+        return format_product_matches(matches, self.catalog)
+
+    def _search(self, matrix: np.ndarray, query: np.ndarray, k: int, dead_rows: np.ndarray):
+        """
+        Exact top-k by cosine similarity.
+
+        Args:
+            matrix: Normalized embedding matrix of the current snapshot
+            query: Normalized query vector
+            k: Number of rows to return
+            dead_rows: Rows to exclude (scored -inf)
+
+        Returns:
+            Tuple of (row indices, scores), best first
+        """
+        scores = np.asarray(matrix @ query)
+        if len(dead_rows):
+            scores[dead_rows] = -np.inf
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def _publish(self, matrix: np.ndarray, ids: List[str], metadata: List[Dict[str, Any]],
+                 dead_rows: np.ndarray, appended_from: Optional[int] = None):
+        """
+        Swap in a new snapshot (called with the write lock held).
+
+        Args:
+            matrix: New embedding matrix
+            ids: Product ids, one per row
+            metadata: Metadata, one per row
+            dead_rows: Rows of replaced or deleted products
+            appended_from: First new row when rows were only appended (or marked
+                dead); None when rows moved (compaction)
+        """
+        self._state = (matrix, ids, metadata, dead_rows)
+
+    def delete_products(self, product_ids: List[str]):
+        """
+        Delete the vectors of specific products (flushed immediately).
+
+        Args:
+            product_ids: IDs of the products to delete
+        """
+        to_delete = {str(product_id) for product_id in product_ids}
+
+        with self._lock:
+            self._prepare_write()
+            rows = [self._positions.pop(product_id) for product_id in to_delete if product_id in self._positions]
+            if not rows:
+                return
+
+            matrix, ids, metadata, dead_rows = self._state
+            self._publish(matrix, ids, metadata, np.union1d(dead_rows, rows), appended_from=len(matrix))
+            try:
+                self._flush()
+            except Exception:
+                VECTOR_STORE_ERRORS.inc(operation='delete')
+                raise
+
+        print(f"Deleted {len(rows)} vectors from index: {self.index_name}")
+
+    def delete_all_vectors(self):
+        """Delete all vectors from the index (flushed immediately)."""
+        with self._lock:
+            self._prepare_write()
+            matrix, ids, metadata, _ = self._state
+            self._positions = {}
+            self._publish(matrix, ids, metadata, np.arange(len(matrix), dtype=np.int64), appended_from=len(matrix))
+            try:
+                self._flush()
+            except Exception:
+                VECTOR_STORE_ERRORS.inc(operation='delete_all')
+                raise
+        print(f"Deleted all vectors from index: {self.index_name}")
+
+    def get_index_stats(self) -> Dict[str, Any]:
+        """Get statistics about the index."""
+        matrix, _, _, dead_rows = self._state
+        return {
+            'total_vectors': len(matrix) - len(dead_rows),
+            'dimension': self.dimension,
+            'index_fullness': 0.0,
+            'dead_vectors': len(dead_rows)
+        }
@@ -0,0 +1,193 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format."""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    """Render a Prometheus label set, e.g. {stage="embed",le="0.1"}."""
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing counter, optionally split by labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        """Increment the counter for the given label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        """Record an observation for the given label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the enclosed block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state[:len(self.buckets)]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, ('le', '+Inf'))
+            lines.append(f"{self.name}_bucket{labels} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Global registry and the metrics recorded across the service
+registry = MetricsRegistry()
+
+SCAN_STAGE_SECONDS = registry.histogram(
+    'hippiekit_scan_stage_seconds', "Time spent in each stage of a scan request", ['stage']
+)
+SCAN_REQUESTS = registry.counter(
+    'hippiekit_scan_requests_total', "Scan requests by outcome", ['status']
+)
+INDEX_STAGE_SECONDS = registry.histogram(
+    'hippiekit_index_stage_seconds', "Time spent in each stage of the indexing pipeline", ['stage']
+)
+INDEX_PRODUCTS = registry.counter(
+    'hippiekit_index_products_total', "Products processed by the indexing pipeline", ['result']
+)
+MODEL_BATCH_SIZE = registry.histogram(
+    'hippiekit_model_batch_size', "Number of images per embedding model call", ['model'],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+MODEL_INFERENCE_SECONDS = registry.histogram(
+    'hippiekit_model_inference_seconds', "Duration of embedding model calls", ['model']
+)
+EMBEDDING_CACHE_REQUESTS = registry.counter(
+    'hippiekit_embedding_cache_requests_total', "Embedding cache lookups by result", ['result']
+)
+TEXT_EMBEDDING_CACHE_REQUESTS = registry.counter(
+    'hippiekit_text_embedding_cache_requests_total', "Search query embedding cache lookups by result", ['result']
+)
+SEARCH_REQUESTS = registry.counter(
+    'hippiekit_search_requests_total', "Text search requests by outcome", ['status']
+)
+QUERY_CACHE_REQUESTS = registry.counter(
+    'hippiekit_query_cache_requests_total', "Vector query cache lookups by result", ['result']
+)
+VECTOR_STORE_ERRORS = registry.counter(
+    'hippiekit_vector_store_errors_total', "Failed vector store calls", ['operation']
+)
+SHADOW_SCAN_SECONDS = registry.histogram(
+    'hippiekit_shadow_scan_seconds', "Embed and query time of shadowed scans by model", ['model']
+)
+SHADOW_TOPK_OVERLAP = registry.histogram(
+    'hippiekit_shadow_topk_overlap', "Fraction of the primary model's top-k also returned by the shadow model", ['model'],
+    buckets=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+)
+SHADOW_COMPARISONS = registry.counter(
+    'hippiekit_shadow_comparisons_total', "Shadow evaluations by outcome", ['model', 'result']
+)
@@ -1,7 +1,144 @@
-from pinecone import Pinecone, ServerlessSpec
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+from collections import deque
+import json
 import os
+import threading
+
+from .metrics import VECTOR_STORE_ERRORS
+
+try:
+    from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+    from urllib3.exceptions import TimeoutError as Urllib3TimeoutError
+
+    _TRANSPORT_ERRORS = (ConnectionError, TimeoutError, MaxRetryError, NewConnectionError,
+                         ProtocolError, Urllib3TimeoutError)
+except ImportError:
+    _TRANSPORT_ERRORS = (ConnectionError, TimeoutError)
+
+# Pinecone rejects upsert requests over 2 MB or 1000 vectors
+MAX_UPSERT_VECTORS = 1000
+# Upper bound on one float in the JSON request body, e.g. "-0.012345678918063641, "
+_BYTES_PER_VALUE = 24
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Whether a failed request may succeed if sent again: throttling, server and transport errors."""
+    status = getattr(error, 'status', None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return isinstance(error, _TRANSPORT_ERRORS)
+
+
+class _DelayedRequest:
+    """
+    A request sent after a delay on a timer thread, with the `get()` of an
+    async SDK request, so a backoff never blocks the thread sending batches.
+    """
+
+    def __init__(self, delay: float, send):
+        self._done = threading.Event()
+        self._request = None
+        self._error: Optional[Exception] = None
+        timer = threading.Timer(delay, self._send, args=(send,))
+        timer.daemon = True
+        timer.start()
+
+    def _send(self, send):
+        try:
+            self._request = send()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done.set()
+
+    def get(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._request.get()
+
+def build_product_metadata(product: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the metadata stored alongside a product vector.
+
+    Args:
+        product: Product dictionary with id, name, image, etc.
+
+    Returns:
+        Metadata dictionary
+    """
+    return {
+        'product_id': str(product.get('id')),
+        'name': product.get('name', ''),
+        'price': product.get('price', ''),
+        'image_url': product.get('image_url', ''),
+        'permalink': product.get('permalink', ''),
+        'description': product.get('description', '')[:500]  # Limit description length
+    }
+
+
+def format_product_match(metadata: Dict[str, Any], score: float) -> Dict[str, Any]:
+    """
+    Turn stored vector metadata and a similarity score into a product result.
+
+    Args:
+        metadata: Metadata stored with the vector
+        score: Similarity score (0-1)
+
+    Returns:
+        Product dictionary returned by scan endpoints
+    """
+    return {
+        'id': metadata.get('product_id'),
+        'name': metadata.get('name'),
+        'price': metadata.get('price'),
+        'image_url': metadata.get('image_url'),
+        'permalink': metadata.get('permalink'),
+        'description': metadata.get('description'),
+        'similarity_score': float(score)
+    }
+
+
+def build_vector_metadata(product: Dict[str, Any], compact: bool = False) -> Dict[str, Any]:
+    """
+    Build the metadata stored with a product vector.
+
+    Args:
+        product: Product dictionary with id, name, image, etc.
+        compact: Store only the product id; display data then comes from the ProductCatalog
+
+    Returns:
+        Metadata dictionary
+    """
+    if compact:
+        return {'product_id': str(product.get('id'))}
+    return build_product_metadata(product)
+
+
+def format_product_matches(
+    matches: List[Tuple[str, Optional[Dict[str, Any]], float]],
+    catalog=None
+) -> List[Dict[str, Any]]:
+    """
+    Format query matches, hydrating display data from a product catalog when given.
+
+    Args:
+        matches: List of (product id, stored metadata, score) tuples
+        catalog: Optional ProductCatalog; when set, stored metadata is ignored
+
+    Returns:
+        List of product dictionaries returned by scan endpoints
+    """
+    if catalog is None:
+        return [format_product_match(metadata, score) for _, metadata, score in matches]
+
+    records = catalog.get_many([product_id for product_id, _, _ in matches])
+    return [
+        format_product_match(records.get(product_id) or {'product_id': product_id}, score)
+        for product_id, _, score in matches
+    ]
+
 
 class PineconeService:
     """
@@ -9,7 +146,17 @@ class PineconeService:
     Handles indexing and querying product embeddings.
     """
     
-    def __init__(self, api_key: str, index_name: str, dimension: int = 512):
+    def __init__(
+        self,
+        api_key: str,
+        index_name: str,
+        dimension: int = 512,
+        upsert_max_bytes: int = 1_500_000,
+        upsert_max_in_flight: int = 4,
+        upsert_max_retries: int = 3,
+        catalog=None,
+        namespace: str = ''
+    ):
         """
         Initialize Pinecone service.
         
@@ -17,10 +164,24 @@ class PineconeService:
             api_key: Pinecone API key
             index_name: Name of the Pinecone index
             dimension: Dimension of vectors (512 for CLIP ViT-B/32)
+            upsert_max_bytes: Estimated payload size at which an upsert batch is sent
+            upsert_max_in_flight: Maximum number of upsert requests sent concurrently
+            upsert_max_retries: Retries per upsert batch on throttling or server errors
+            catalog: Optional ProductCatalog; when set, vectors carry only the product id
+                and query results are hydrated from the catalog (compact metadata mode)
+            namespace: Index namespace holding this store's vectors ('' for the default)
         """
         self.api_key = api_key
         self.index_name = index_name
         self.dimension = dimension
+        self.upsert_max_bytes = upsert_max_bytes
+        self.upsert_max_in_flight = max(1, upsert_max_in_flight)
+        self.upsert_max_retries = max(0, upsert_max_retries)
+        self.catalog = catalog
+        self.namespace = namespace
+        
+        # Imported here so that importing this module stays cheap
+        from pinecone import Pinecone
         
         # Initialize Pinecone client
         self.pc = Pinecone(api_key=api_key)
@@ -28,14 +189,16 @@ class PineconeService:
         # Get or create index
         self._ensure_index_exists()
         
-        # Connect to index
-        self.index = self.pc.Index(index_name)
+        # Connect to index; the pool threads carry concurrent async upserts
+        self.index = self.pc.Index(index_name, pool_threads=self.upsert_max_in_flight)
         
     def _ensure_index_exists(self):
         """Create index if it doesn't exist."""
         existing_indexes = [index.name for index in self.pc.list_indexes()]
         
         if self.index_name not in existing_indexes:
+            from pinecone import ServerlessSpec
+            
             print(f"Creating Pinecone index: {self.index_name}")
             self.pc.create_index(
                 name=self.index_name,
@@ -58,34 +221,97 @@ class PineconeService:
             products: List of product dictionaries with id, name, image, etc.
             embeddings: Corresponding embeddings array (products x dimension)
         """
-        vectors = []
+        self.upsert_stream(zip(products, embeddings))
+    
+    def upsert_stream(
+        self,
+        pairs: Iterable[Tuple[Dict[str, Any], np.ndarray]],
+        on_upserted: Optional[Callable[[List[Tuple[Dict[str, Any], np.ndarray]]], None]] = None
+    ) -> int:
+        """
+        Insert or update a stream of (product, embedding) pairs in Pinecone.
+        
+        Vectors are grouped into batches by estimated request size and up to
+        `upsert_max_in_flight` batches are sent concurrently, so only those
+        batches are held in memory. A batch that fails with a throttling,
+        server or transport error is resent with exponential backoff from a
+        timer thread; other batches keep being sent in the meantime.
         
-        for i, product in enumerate(products):
-            product_id = str(product.get('id'))
-            embedding = embeddings[i].tolist()
+        Args:
+            pairs: Iterable of (product dictionary, embedding) pairs (may be a lazy generator)
+            on_upserted: Optional callback run with the pairs of each batch once its
+                request has succeeded (batches may complete out of order)
+            
+        Returns:
+            Number of vectors upserted
             
-            # Metadata to store with the vector
-            metadata = {
-                'product_id': product_id,
-                'name': product.get('name', ''),
-                'price': product.get('price', ''),
-                'image_url': product.get('image_url', ''),
-                'permalink': product.get('permalink', ''),
-                'description': product.get('description', '')[:500]  # Limit description length
+        Raises:
+            Exception: The SDK error of a batch that still fails after all retries
+        """
+        in_flight = deque()
+        upserted = 0
+        batch_number = 0
+        
+        def send(batch):
+            return self.index.upsert(vectors=batch, namespace=self.namespace, async_req=True)
+        
+        def collect():
+            nonlocal upserted
+            request, batch, batch_pairs, number, attempt = in_flight.popleft()
+            try:
+                request.get()
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.upsert_max_retries:
+                    VECTOR_STORE_ERRORS.inc(operation='upsert')
+                    raise
+                delay = 0.5 * (2 ** attempt)
+                print(f"Upsert batch {number} failed ({e}), retrying in {delay:.1f}s")
+                in_flight.append((_DelayedRequest(delay, lambda: send(batch)), batch, batch_pairs, number, attempt + 1))
+                return
+            upserted += len(batch)
+            print(f"Upserted batch {number} ({len(batch)} products)")
+            if on_upserted is not None:
+                on_upserted(batch_pairs)
+        
+        for batch, batch_pairs in self._iter_upsert_batches(pairs):
+            batch_number += 1
+            in_flight.append((send(batch), batch, batch_pairs, batch_number, 0))
+            while len(in_flight) >= self.upsert_max_in_flight:
+                collect()
+        
+        while in_flight:
+            collect()
+        
+        return upserted
+    
+    def _iter_upsert_batches(
+        self, pairs: Iterable[Tuple[Dict[str, Any], np.ndarray]]
+    ) -> Iterator[Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], np.ndarray]]]]:
+        """Group (product, embedding) pairs into vector batches that fit one upsert request, with their pairs."""
+        batch = []
+        batch_pairs = []
+        batch_bytes = 0
+        
+        for product, embedding in pairs:
+            vector = {
+                'id': str(product.get('id')),
+                'values': np.asarray(embedding, dtype=np.float32).reshape(-1).tolist(),
+                'metadata': build_vector_metadata(product, compact=self.catalog is not None)
             }
+            size = len(vector['id']) + len(json.dumps(vector['metadata'])) + len(vector['values']) * _BYTES_PER_VALUE
+            
+            if batch and (batch_bytes + size > self.upsert_max_bytes or len(batch) >= MAX_UPSERT_VECTORS):
+                yield batch, batch_pairs
+                batch = []
+                batch_pairs = []
+                batch_bytes = 0
             
-            vectors.append({
-                'id': product_id,
-                'values': embedding,
-                'metadata': metadata
-            })
-        
-        # Upsert in batches of 100
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            self.index.upsert(vectors=batch)
-            print(f"Upserted batch {i // batch_size + 1} ({len(batch)} products)")
+            batch.append(vector)
+            batch_pairs.append((product, embedding))
+            batch_bytes += size
+        
+        if batch:
+            yield batch, batch_pairs
     
     def query_similar_products(
         self, 
@@ -108,66 +334,203 @@ class PineconeService:
         if isinstance(query_embedding, np.ndarray):
             query_embedding = query_embedding.tolist()
         
-        # Query Pinecone
-        results = self.index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True
-        )
+        # Query Pinecone; in compact mode only ids and scores come back
+        try:
+            results = self.index.query(
+                vector=query_embedding,
+                top_k=top_k,
+                namespace=self.namespace,
+                include_metadata=self.catalog is None
+            )
+        except Exception:
+            VECTOR_STORE_ERRORS.inc(operation='query')
+            raise
         
-        # Format results
-        products = []
-        for match in results.matches:
-            # Filter by minimum score
-            if match.score >= min_score:
-                product = {
-                    'id': match.metadata.get('product_id'),
-                    'name': match.metadata.get('name'),
-                    'price': match.metadata.get('price'),
-                    'image_url': match.metadata.get('image_url'),
-                    'permalink': match.metadata.get('permalink'),
-                    'description': match.metadata.get('description'),
-                    'similarity_score': float(match.score)
-                }
-                products.append(product)
-        
-        return products
+        # Filter by minimum score and format results
+        matches = [
+            (match.id, match.metadata, match.score)
+            for match in results.matches
+            if match.score >= min_score
+        ]
+        return format_product_matches(matches, self.catalog)
+    
+    def delete_products(self, product_ids: List[str]):
+        """
+        Delete the vectors of specific products.
+        
+        Args:
+            product_ids: IDs of the products to delete
+        """
+        product_ids = [str(product_id) for product_id in product_ids]
+        
+        # Pinecone accepts up to 1000 ids per delete request
+        batch_size = 1000
+        for i in range(0, len(product_ids), batch_size):
+            try:
+                self.index.delete(ids=product_ids[i:i + batch_size], namespace=self.namespace)
+            except Exception:
+                VECTOR_STORE_ERRORS.inc(operation='delete')
+                raise
+        print(f"Deleted {len(product_ids)} vectors from index: {self._describe()}")
     
     def delete_all_vectors(self):
         """Delete all vectors from the index."""
-        self.index.delete(delete_all=True)
-        print(f"Deleted all vectors from index: {self.index_name}")
+        try:
+            self.index.delete(delete_all=True, namespace=self.namespace)
+        except Exception:
+            VECTOR_STORE_ERRORS.inc(operation='delete_all')
+            raise
+        print(f"Deleted all vectors from index: {self._describe()}")
+    
+    def flush(self):
+        """No-op: Pinecone persists every upsert (kept for parity with the local index)."""
     
     def get_index_stats(self) -> Dict[str, Any]:
         """Get statistics about the index."""
-        stats = self.index.describe_index_stats()
+        try:
+            stats = self.index.describe_index_stats()
+        except Exception:
+            VECTOR_STORE_ERRORS.inc(operation='stats')
+            raise
+        total_vectors = stats.total_vector_count
+        if self.namespace:
+            namespace_stats = (stats.namespaces or {}).get(self.namespace)
+            total_vectors = namespace_stats.vector_count if namespace_stats else 0
         return {
-            'total_vectors': stats.total_vector_count,
+            'total_vectors': total_vectors,
             'dimension': stats.dimension,
-            'index_fullness': stats.index_fullness
+            'index_fullness': stats.index_fullness,
+            'namespace': self.namespace
         }
+    
+    def _describe(self) -> str:
+        """Index name, with the namespace if one is set."""
+        return f"{self.index_name}/{self.namespace}" if self.namespace else self.index_name
 
 
 # Global instance
 _pinecone_service_instance = None
+_pinecone_service_lock = threading.Lock()
 
-def get_pinecone_service() -> PineconeService:
+def get_pinecone_service():
     """
-    Get or create the global Pinecone service instance.
+    Get or create the global vector store instance.
+
+    VECTOR_BACKEND selects the implementation: 'pinecone' (default),
+    'local' for the in-process LocalVectorIndex persisted at LOCAL_INDEX_PATH,
+    or 'ann' for the same index searched through faiss (AnnVectorIndex).
+    Unless QUERY_CACHE_ENABLED=false, queries go through a near-duplicate
+    QueryCache that is invalidated on every write, including writes made by
+    other server workers (signalled through QUERY_CACHE_GENERATION_PATH).
+    EMBEDDING_DIMENSION must
+    match the primary embedding model (512 for CLIP ViT-B/32).
     """
     global _pinecone_service_instance
     
-    if _pinecone_service_instance is None:
-        api_key = os.getenv('PINECONE_API_KEY')
-        index_name = os.getenv('PINECONE_INDEX_NAME', 'hippiekit-products')
+    if _pinecone_service_instance is not None:
+        return _pinecone_service_instance
+    
+    with _pinecone_service_lock:
+        if _pinecone_service_instance is None:
+            dimension = int(os.getenv('EMBEDDING_DIMENSION', 512))
+            store = create_vector_store(dimension=dimension)
+            
+            if os.getenv('QUERY_CACHE_ENABLED', 'true').lower() == 'true':
+                from .query_cache import QueryCache, CachedVectorStore
+                
+                store = CachedVectorStore(store, QueryCache(
+                    dimension=dimension,
+                    max_entries=int(os.getenv('QUERY_CACHE_MAX_ENTRIES', 1024)),
+                    similarity_threshold=float(os.getenv('QUERY_CACHE_SIMILARITY', 0.98)),
+                    ttl_seconds=float(os.getenv('QUERY_CACHE_TTL_SECONDS', 300))
+                ), generation_path=os.getenv('QUERY_CACHE_GENERATION_PATH', 'data/query_cache_generation'))
+            
+            _pinecone_service_instance = store
+    
+    return _pinecone_service_instance
+
+def create_vector_store(dimension: int = 512, namespace: str = ''):
+    """
+    Create the vector store selected by VECTOR_BACKEND.
+
+    With VECTOR_METADATA_MODE=compact, vectors store only product ids and
+    results are hydrated from the ProductCatalog at PRODUCT_CATALOG_PATH.
+
+    A namespace keeps the vectors of one embedding model apart from the
+    primary model's: a Pinecone namespace of PINECONE_INDEX_NAME, or a
+    separate local index at LOCAL_INDEX_PATH-<namespace>. Pinecone indexes
+    have a fixed dimension, so a namespace whose dimension differs from
+    EMBEDDING_DIMENSION lives in PINECONE_INDEX_NAME-<dimension> instead.
+
+    Args:
+        dimension: Dimension of the vectors
+        namespace: Namespace for a non-primary embedding model ('' for the primary)
+
+    Returns:
+        PineconeService, LocalVectorIndex or AnnVectorIndex
+    """
+    backend = os.getenv('VECTOR_BACKEND', 'pinecone').lower()
+    metadata_mode = os.getenv('VECTOR_METADATA_MODE', 'full').lower()
+    
+    if metadata_mode not in ('full', 'compact'):
+        raise ValueError(f"Unknown VECTOR_METADATA_MODE: {metadata_mode}")
+    
+    catalog = None
+    if metadata_mode == 'compact':
+        from .product_catalog import get_product_catalog
         
-        if not api_key:
-            raise ValueError("PINECONE_API_KEY environment variable not set")
+        catalog = get_product_catalog()
+    
+    local_path = os.getenv('LOCAL_INDEX_PATH', 'data/local_index')
+    if namespace:
+        local_path = f"{local_path}-{namespace}"
+    
+    if backend == 'local':
+        from .local_vector_index import LocalVectorIndex
         
-        _pinecone_service_instance = PineconeService(
-            api_key=api_key,
-            index_name=index_name,
-            dimension=512
+        return LocalVectorIndex(
+            path=local_path,
+            dimension=dimension,
+            catalog=catalog
         )
     
-    return _pinecone_service_instance
+    if backend == 'ann':
+        from .ann_index import AnnVectorIndex
+        
+        return AnnVectorIndex(
+            path=local_path,
+            dimension=dimension,
+            catalog=catalog,
+            index_type=os.getenv('ANN_INDEX_TYPE', 'hnsw').lower(),
+            hnsw_m=int(os.getenv('ANN_HNSW_M', 32)),
+            ef_construction=int(os.getenv('ANN_EF_CONSTRUCTION', 200)),
+            ef_search=int(os.getenv('ANN_EF_SEARCH', 64)),
+            nlist=int(os.getenv('ANN_IVF_NLIST', 0)),
+            pq_m=int(os.getenv('ANN_PQ_M', 64)),
+            nprobe=int(os.getenv('ANN_NPROBE', 16)),
+            min_size=int(os.getenv('ANN_MIN_SIZE', 10000)),
+            refine_factor=int(os.getenv('ANN_REFINE_FACTOR', 4))
+        )
+    
+    if backend != 'pinecone':
+        raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+    
+    api_key = os.getenv('PINECONE_API_KEY')
+    index_name = os.getenv('PINECONE_INDEX_NAME', 'hippiekit-products')
+    
+    if not api_key:
+        raise ValueError("PINECONE_API_KEY environment variable not set")
+    
+    if dimension != int(os.getenv('EMBEDDING_DIMENSION', 512)):
+        index_name = f"{index_name}-{dimension}"
+    
+    return PineconeService(
+        api_key=api_key,
+        index_name=index_name,
+        dimension=dimension,
+        upsert_max_bytes=int(os.getenv('PINECONE_UPSERT_MAX_BYTES', 1_500_000)),
+        upsert_max_in_flight=int(os.getenv('PINECONE_UPSERT_MAX_IN_FLIGHT', 4)),
+        upsert_max_retries=int(os.getenv('PINECONE_UPSERT_MAX_RETRIES', 3)),
+        catalog=catalog,
+        namespace=namespace
+    )
@@ -0,0 +1,265 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .pinecone_service import build_product_metadata
+
+# Columns mirror the fields returned by format_product_match
+_COLUMNS = ('product_id', 'name', 'price', 'image_url', 'permalink', 'description')
+
+
+def product_text(metadata: Dict[str, Any]) -> str:
+    """Text embedded for a product by the hybrid re-ranker (name, then description)."""
+    name = (metadata.get('name') or '').strip()
+    description = (metadata.get('description') or '').strip()
+    return f"{name}. {description}" if description else name
+
+
+class ProductCatalog:
+    """
+    Compact local table of product display data, keyed by product id.
+
+    Every crawl writes the products it sees here, so query results can be
+    hydrated locally and the vector store only has to hold ids
+    (VECTOR_METADATA_MODE=compact). Changing a product's name, price or
+    description then only rewrites its row, never its vector.
+
+    Rows can also hold a CLIP text embedding of the product's name and
+    description for the hybrid re-ranker, tagged with the model that
+    produced it; it is cleared whenever that text changes and filled in by
+    index jobs. Embeddings of another model are ignored and recomputed.
+
+    Backed by a single SQLite file in WAL mode, so several worker
+    processes can read it while an index job writes.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the catalog, creating the database if needed.
+
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS products ('
+            'product_id TEXT PRIMARY KEY, name TEXT, price TEXT, '
+            'image_url TEXT, permalink TEXT, description TEXT, '
+            'text_hash TEXT, text_embedding BLOB, text_model TEXT)'
+        )
+        # Catalogs created before text embeddings (or their model) were stored
+        existing = {row[1] for row in self._conn.execute('PRAGMA table_info(products)')}
+        for column, column_type in (('text_hash', 'TEXT'), ('text_embedding', 'BLOB'), ('text_model', 'TEXT')):
+            if column not in existing:
+                self._conn.execute(f'ALTER TABLE products ADD COLUMN {column} {column_type}')
+        self._conn.commit()
+
+    def upsert(self, products: Iterable[Dict[str, Any]]) -> int:
+        """
+        Insert or update products.
+
+        Args:
+            products: Product dictionaries as returned by the WordPress crawl
+
+        Returns:
+            Number of rows written
+        """
+        rows = []
+        for product in products:
+            metadata = build_product_metadata(product)
+            text_hash = hashlib.sha256(product_text(metadata).encode('utf-8')).hexdigest()
+            rows.append(tuple(str(metadata[column] or '') for column in _COLUMNS) + (text_hash,))
+        if not rows:
+            return 0
+
+        columns = _COLUMNS + ('text_hash',)
+        updates = ', '.join(f'{column} = excluded.{column}' for column in columns[1:])
+        with self._lock, self._conn:
+            # Keep the text embedding only while the embedded text is unchanged
+            self._conn.executemany(
+                f"INSERT INTO products ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(product_id) DO UPDATE SET {updates}, "
+                "text_embedding = CASE WHEN products.text_hash = excluded.text_hash "
+                "THEN products.text_embedding ELSE NULL END",
+                rows
+            )
+        return len(rows)
+
+    def record(self, products: Iterable[Dict[str, Any]], batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        Pass products through unchanged, writing them to the catalog in batches.
+
+        Args:
+            products: Iterable of product dictionaries (may be a lazy generator)
+            batch_size: Number of products written per transaction
+
+        Yields:
+            The input products
+        """
+        iterator = iter(products)
+        while True:
+            chunk = list(islice(iterator, batch_size))
+            if not chunk:
+                return
+            self.upsert(chunk)
+            yield from chunk
+
+    def get_many(self, product_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up products by id.
+
+        Args:
+            product_ids: Product ids to fetch
+
+        Returns:
+            Metadata dictionaries keyed by product id; unknown ids are omitted
+        """
+        product_ids = [str(product_id) for product_id in product_ids]
+        if not product_ids:
+            return {}
+
+        placeholders = ', '.join('?' * len(product_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM products WHERE product_id IN ({placeholders})",
+                product_ids
+            ).fetchall()
+        return {row[0]: dict(zip(_COLUMNS, row)) for row in rows}
+
+    def missing_text_embeddings(
+        self,
+        after: str = '',
+        limit: int = 64,
+        model: Optional[str] = None
+    ) -> List[Tuple[str, str]]:
+        """
+        Find products without a text embedding, in product id order.
+
+        Args:
+            after: Only return products whose id sorts after this one (for paging)
+            limit: Maximum number of products to return
+            model: Also return products whose embedding was made by another model
+
+        Returns:
+            List of (product id, text to embed) tuples
+        """
+        missing = 'text_embedding IS NULL'
+        params: Tuple = (after, limit)
+        if model is not None:
+            missing = '(text_embedding IS NULL OR text_model IS NOT ?)'
+            params = (model, after, limit)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM products "
+                f"WHERE {missing} AND product_id > ? ORDER BY product_id LIMIT ?",
+                params
+            ).fetchall()
+        return [(row[0], product_text(dict(zip(_COLUMNS, row)))) for row in rows]
+
+    def set_text_embeddings(self, product_ids: List[str], embeddings: np.ndarray, model: Optional[str] = None):
+        """
+        Store L2-normalized text embeddings.
+
+        Args:
+            product_ids: Product ids, one per embedding
+            embeddings: Text embeddings (products x dimension)
+            model: Name of the model that produced them
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'UPDATE products SET text_embedding = ?, text_model = ? WHERE product_id = ?',
+                [
+                    (embedding.tobytes(), model, str(product_id))
+                    for product_id, embedding in zip(product_ids, embeddings)
+                ]
+            )
+
+    def get_text_embeddings(
+        self,
+        product_ids: List[str],
+        model: Optional[str] = None,
+        dimension: Optional[int] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Look up stored text embeddings.
+
+        Args:
+            product_ids: Product ids to fetch
+            model: Only return embeddings made by this model
+            dimension: Only return embeddings of this dimension
+
+        Returns:
+            Normalized float32 embeddings keyed by product id; products without a
+            matching one are omitted
+        """
+        product_ids = [str(product_id) for product_id in product_ids]
+        if not product_ids:
+            return {}
+
+        placeholders = ', '.join('?' * len(product_ids))
+        query = (
+            f"SELECT product_id, text_embedding FROM products "
+            f"WHERE product_id IN ({placeholders}) AND text_embedding IS NOT NULL"
+        )
+        if model is not None:
+            query += " AND text_model = ?"
+            product_ids.append(model)
+        with self._lock:
+            rows = self._conn.execute(query, product_ids).fetchall()
+        return {
+            product_id: np.frombuffer(blob, dtype=np.float32)
+            for product_id, blob in rows
+            if dimension is None or len(blob) == dimension * 4
+        }
+
+    def delete(self, product_ids: List[str]):
+        """
+        Delete products.
+
+        Args:
+            product_ids: IDs of the products to delete
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'DELETE FROM products WHERE product_id = ?',
+                [(str(product_id),) for product_id in product_ids]
+            )
+
+    def count(self) -> int:
+        """Number of products in the catalog."""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+
+
+# Global instance
+_product_catalog_instance = None
+_product_catalog_lock = threading.Lock()
+
+def get_product_catalog() -> ProductCatalog:
+    """Get or create the global product catalog stored at PRODUCT_CATALOG_PATH."""
+    global _product_catalog_instance
+
+    if _product_catalog_instance is None:
+        with _product_catalog_lock:
+            if _product_catalog_instance is None:
+                _product_catalog_instance = ProductCatalog(
+                    path=os.getenv('PRODUCT_CATALOG_PATH', 'data/product_catalog.sqlite3')
+                )
+
+    return _product_catalog_instance
@@ -0,0 +1,290 @@
+import copy
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .metrics import QUERY_CACHE_REQUESTS
+
+
+class QueryCache:
+    """
+    Near-duplicate cache of vector store query results.
+
+    Recent query embeddings are kept L2-normalized in a fixed-size NumPy
+    matrix, so a lookup is a single matrix-vector product. A new query is
+    answered from the cache when its cosine similarity to a cached query
+    with the same parameters reaches `similarity_threshold`. Entries expire
+    after `ttl_seconds`; when the cache is full the least recently used
+    entry is replaced.
+
+    The cache lives in one process: clear it whenever the index changes.
+    CachedVectorStore also clears it when another process writes.
+    """
+
+    def __init__(
+        self,
+        dimension: int = 512,
+        max_entries: int = 1024,
+        similarity_threshold: float = 0.98,
+        ttl_seconds: float = 300.0
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            dimension: Embedding dimension
+            max_entries: Maximum number of cached queries
+            similarity_threshold: Minimum cosine similarity to reuse a cached result
+            ttl_seconds: Lifetime of a cached result
+        """
+        self.dimension = dimension
+        self.max_entries = max(1, max_entries)
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+
+        self._embeddings = np.zeros((self.max_entries, dimension), dtype=np.float32)
+        self._expires_at = np.zeros(self.max_entries, dtype=np.float64)
+        self._last_used = np.zeros(self.max_entries, dtype=np.float64)
+        self._params: List[Optional[tuple]] = [None] * self.max_entries
+        self._results: List[Optional[List[Dict[str, Any]]]] = [None] * self.max_entries
+        self._lock = threading.Lock()
+
+        # Bumped on every clear so results of queries that raced a write are not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _normalize(self, embedding: np.ndarray) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dimension:
+            return None
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def lookup(self, embedding: np.ndarray, **params) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find cached results for a near-duplicate query.
+
+        Args:
+            embedding: Query embedding
+            **params: Query parameters that must match exactly (e.g. top_k, min_score)
+
+        Returns:
+            Copy of the cached results, or None on a miss
+        """
+        query = self._normalize(embedding)
+        key = tuple(sorted(params.items()))
+        now = time.monotonic()
+
+        with self._lock:
+            best = None
+            if query is not None:
+                live = self._expires_at > now
+                if live.any():
+                    similarities = self._embeddings @ query
+                    similarities[~live] = -np.inf
+                    for slot in np.argsort(-similarities):
+                        if similarities[slot] < self.similarity_threshold:
+                            break
+                        if self._params[slot] == key:
+                            best = int(slot)
+                            break
+
+            if best is None:
+                self.misses += 1
+                QUERY_CACHE_REQUESTS.inc(result='miss')
+                return None
+
+            self._last_used[best] = now
+            self.hits += 1
+            QUERY_CACHE_REQUESTS.inc(result='hit')
+            results = self._results[best]
+
+        return copy.deepcopy(results)
+
+    def store(
+        self,
+        embedding: np.ndarray,
+        results: List[Dict[str, Any]],
+        generation: Optional[int] = None,
+        **params
+    ):
+        """
+        Cache the results of a query.
+
+        Args:
+            embedding: Query embedding
+            results: Query results
+            generation: Value of `generation` read before the query was sent; the
+                results are dropped if the cache has been cleared since
+            **params: Query parameters the results were produced with
+        """
+        query = self._normalize(embedding)
+        if query is None:
+            return
+        now = time.monotonic()
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            expired = np.flatnonzero(self._expires_at <= now)
+            slot = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+
+            self._embeddings[slot] = query
+            self._expires_at[slot] = now + self.ttl_seconds
+            self._last_used[slot] = now
+            self._params[slot] = tuple(sorted(params.items()))
+            self._results[slot] = copy.deepcopy(results)
+
+    def clear(self):
+        """Drop every cached result."""
+        with self._lock:
+            self.generation += 1
+            self._expires_at[:] = 0
+            self._params = [None] * self.max_entries
+            self._results = [None] * self.max_entries
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache size and hit/miss counters."""
+        with self._lock:
+            return {
+                'entries': int((self._expires_at > time.monotonic()).sum()),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class CachedVectorStore:
+    """
+    Wraps a vector store so that repeat queries skip the network.
+
+    `query_similar_products` is answered from a QueryCache when possible;
+    `upsert_products`, `upsert_stream`, `delete_products` and `delete_all_vectors` pass
+    through and invalidate the cache. Any other attribute is delegated to
+    the wrapped store.
+
+    Each server worker has its own cache, so writes made by another worker
+    are detected before every lookup (at most every `check_interval`
+    seconds): writes touch a shared generation file whose modification time
+    the other workers compare, and a local index that reloads a version
+    flushed elsewhere clears the cache as well.
+    """
+
+    def __init__(self, store, cache: QueryCache, generation_path: Optional[str] = None, check_interval: float = 1.0):
+        """
+        Initialize the wrapper.
+
+        Args:
+            store: PineconeService or LocalVectorIndex
+            cache: Query cache to consult first
+            generation_path: File touched on every write, shared by all workers (None to disable)
+            check_interval: Seconds between checks for writes made by other workers
+        """
+        self.store = store
+        self.cache = cache
+        self.generation_path = generation_path
+        self.check_interval = check_interval
+        self._generation_mtime = self._generation_stat()
+        self._checked_at = time.monotonic()
+
+    def _generation_stat(self) -> Optional[int]:
+        if not self.generation_path:
+            return None
+        try:
+            return os.stat(self.generation_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _sync(self):
+        """Clear the cache if another worker changed the index since the last check."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        refresh = getattr(self.store, 'refresh', None)
+        changed = bool(refresh is not None and refresh())
+        mtime = self._generation_stat()
+        if mtime != self._generation_mtime:
+            self._generation_mtime = mtime
+            changed = True
+        if changed:
+            self.cache.clear()
+
+    def _invalidate(self):
+        """Clear this worker's cache and signal the write to the other workers."""
+        self.cache.clear()
+        if not self.generation_path:
+            return
+        try:
+            directory = os.path.dirname(self.generation_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.generation_path, 'a'):
+                pass
+            os.utime(self.generation_path)
+            self._generation_mtime = self._generation_stat()
+        except OSError as e:
+            print(f"Error touching query cache generation file: {e}")
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def query_similar_products(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        min_score: float = 0.6
+    ) -> List[Dict[str, Any]]:
+        """
+        Query for similar products, reusing results of near-identical recent queries.
+
+        Args:
+            query_embedding: Query vector (512 dimensions)
+            top_k: Number of results to return
+            min_score: Minimum similarity score (0-1)
+
+        Returns:
+            List of matching products with scores
+        """
+        self._sync()
+        cached = self.cache.lookup(query_embedding, top_k=top_k, min_score=min_score)
+        if cached is not None:
+            return cached
+
+        generation = self.cache.generation
+        results = self.store.query_similar_products(
+            query_embedding=query_embedding,
+            top_k=top_k,
+            min_score=min_score
+        )
+        self.cache.store(query_embedding, results, generation=generation, top_k=top_k, min_score=min_score)
+        return results
+
+    def upsert_products(self, *args, **kwargs):
+        try:
+            return self.store.upsert_products(*args, **kwargs)
+        finally:
+            self._invalidate()
+
+    def upsert_stream(self, *args, **kwargs):
+        try:
+            return self.store.upsert_stream(*args, **kwargs)
+        finally:
+            self._invalidate()
+
+    def delete_products(self, *args, **kwargs):
+        try:
+            return self.store.delete_products(*args, **kwargs)
+        finally:
+            self._invalidate()
+
+    def delete_all_vectors(self, *args, **kwargs):
+        try:
+            return self.store.delete_all_vectors(*args, **kwargs)
+        finally:
+            self._invalidate()
@@ -0,0 +1,120 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .product_catalog import get_product_catalog
+
+
+class HybridReranker:
+    """
+    Second-stage re-ranker combining image similarity with product text.
+
+    The vector store returns a wide candidate set ranked by image cosine;
+    each candidate is rescored as
+
+        (1 - text_weight) * image_similarity + text_weight * text_similarity
+
+    where text_similarity is the cosine between the query image embedding and
+    the CLIP text embedding of the candidate's name and description. Text
+    embeddings are computed at index time and read from the ProductCatalog,
+    so re-ranking is a single matrix-vector product and never calls the model.
+    Candidates without a text embedding from the current model (none yet, or
+    one left over from a previous model) get the mean text similarity of the
+    others, so they are neither promoted nor buried. If re-ranking fails,
+    the candidates are returned in image similarity order.
+    """
+
+    def __init__(self, catalog, text_weight: float = 0.3, candidates: int = 50, model_name: Optional[str] = None):
+        """
+        Initialize the re-ranker.
+
+        Args:
+            catalog: ProductCatalog holding the text embeddings
+            text_weight: Weight of the text similarity in the combined score (0-1)
+            candidates: Number of vector store results to re-rank
+            model_name: Model whose text embeddings are used (None accepts any)
+        """
+        self.catalog = catalog
+        self.text_weight = min(max(text_weight, 0.0), 1.0)
+        self.candidates = max(1, candidates)
+        self.model_name = model_name
+
+    def rerank(self, query_embedding: np.ndarray, products: List[Dict[str, Any]], top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Rescore candidates and keep the best.
+
+        Args:
+            query_embedding: Query image embedding
+            products: Candidates from `query_similar_products`, with similarity_score
+            top_k: Number of products to return
+
+        Returns:
+            Top products by combined score, each with an added `rerank_score`;
+            `similarity_score` keeps the image cosine
+        """
+        if not products:
+            return []
+
+        try:
+            return self._rerank(query_embedding, products, top_k)
+        except Exception as e:
+            print(f"Error re-ranking, keeping image similarity order: {e}")
+            return products[:top_k]
+
+    def _rerank(self, query_embedding: np.ndarray, products: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        text_embeddings = self.catalog.get_text_embeddings(
+            [product['id'] for product in products], model=self.model_name, dimension=len(query)
+        )
+        image_scores = np.array([product['similarity_score'] for product in products], dtype=np.float32)
+
+        has_text = np.array([product['id'] in text_embeddings for product in products])
+        text_scores = np.zeros(len(products), dtype=np.float32)
+        if has_text.any():
+            matrix = np.stack([text_embeddings[product['id']] for product in products if product['id'] in text_embeddings])
+            text_scores[has_text] = matrix @ query
+            text_scores[~has_text] = text_scores[has_text].mean()
+
+        combined = (1.0 - self.text_weight) * image_scores + self.text_weight * text_scores
+        order = np.argsort(-combined, kind='stable')[:top_k]
+
+        reranked = []
+        for row in order:
+            product = dict(products[row])
+            product['rerank_score'] = float(combined[row])
+            reranked.append(product)
+        return reranked
+
+
+# Global instance
+_reranker_instance = None
+_reranker_lock = threading.Lock()
+
+def get_reranker() -> Optional[HybridReranker]:
+    """
+    Get the global hybrid re-ranker, or None unless RERANK_ENABLED=true.
+    Tuned by RERANK_CANDIDATES and RERANK_TEXT_WEIGHT.
+    """
+    global _reranker_instance
+
+    if os.getenv('RERANK_ENABLED', 'false').lower() != 'true':
+        return None
+
+    if _reranker_instance is None:
+        # Imported here: the models package itself imports from services
+        from models.clip_embedder import primary_model_name
+
+        with _reranker_lock:
+            if _reranker_instance is None:
+                _reranker_instance = HybridReranker(
+                    catalog=get_product_catalog(),
+                    text_weight=float(os.getenv('RERANK_TEXT_WEIGHT', 0.3)),
+                    candidates=int(os.getenv('RERANK_CANDIDATES', 50)),
+                    model_name=primary_model_name()
+                )
+
+    return _reranker_instance
@@ -1,18 +1,63 @@
 import requests
-from typing import List, Dict, Any, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from urllib3.util.retry import Retry
+import json
 import os
+import re
+import threading
+
+
+# Product fields read by _process_product; everything else (rendered content,
+# the full yoast_head_json blob, ...) is left out of the response
+PRODUCT_FIELDS = (
+    'id',
+    'title',
+    'excerpt',
+    'link',
+    'price',
+    'regular_price',
+    'modified',
+    'modified_gmt',
+    'featured_media',
+    'featured_media_url',
+    'better_featured_image',
+    'yoast_head_json.og_image',
+)
+
+_HTML_TAG_RE = re.compile('<[^<]+?>')
+
+
+class WordPressFetchError(Exception):
+    """Raised when a catalog page cannot be fetched after all retries."""
+
 
 class WordPressService:
     """
     Service for fetching product data from WordPress REST API.
     """
 
-    def __init__(self, api_url: str = None):
+    def __init__(
+        self,
+        api_url: str = None,
+        max_concurrent_pages: int = 4,
+        max_retries: int = 3,
+        timeout: float = 30,
+        media_cache_path: Optional[str] = None
+    ):
         """
         Initialize WordPress service.
 
         Args:
             api_url: WordPress REST API URL for products
+            max_concurrent_pages: Catalog pages fetched in parallel once the page count is known
+            max_retries: Retries (with exponential backoff) per request on connection
+                errors and 429/5xx responses
+            timeout: Per-request timeout in seconds
+            media_cache_path: JSON file persisting resolved media ID -> URL pairs
+                across runs (None keeps them in memory only)
         """
         self.api_url = api_url or os.getenv(
             'WORDPRESS_API_URL',
@@ -20,69 +65,293 @@ class WordPressService:
         )
         # Get base URL for media requests
         self.base_url = self.api_url.split('/wp-json')[0]
+        self.max_concurrent_pages = max(1, max_concurrent_pages)
+        self.timeout = timeout
+        self.session = self._create_session(max_retries)
+
+        # Media ID -> source URL memo; attachment URLs do not change once uploaded
+        self.media_cache_path = media_cache_path
+        self._media_urls: Dict[int, str] = self._load_media_cache()
+        # Media IDs WordPress did not return during the current crawl
+        self._unresolved_media: set = set()
+        self._media_dirty = False
+        self._media_lock = threading.Lock()
+
+    def _create_session(self, max_retries: int) -> requests.Session:
+        """Create a keep-alive session with bounded retries, shared by all page and media requests."""
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.max_concurrent_pages,
+            pool_maxsize=self.max_concurrent_pages,
+            max_retries=retry
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
 
-    def fetch_products(self, max_products: Optional[int] = None) -> List[Dict[str, Any]]:
+    def _fetch_page(self, page: int, per_page: int) -> Tuple[List[Dict[str, Any]], int]:
         """
-        Fetch products from WordPress API.
+        Fetch one page of products.
 
         Args:
-            max_products: Maximum number of products to fetch (None for all)
+            page: 1-based page number
+            per_page: Products per page
 
         Returns:
-            List of product dictionaries
+            Tuple of (raw products, total page count reported by WordPress)
         """
-        products = []
-        page = 1
-        per_page = 100  # WordPress API max per page
+        response = self.session.get(
+            self.api_url,
+            params={'page': page, 'per_page': per_page, '_fields': ','.join(PRODUCT_FIELDS)},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        batch = response.json()
 
-        print(f"Fetching products from WordPress API...")
+        # Resolve every featured image on the page in one request instead of one per product
+        self._resolve_media_urls(
+            product['featured_media'] for product in batch
+            if product.get('featured_media') and not self._inline_image_url(product)
+        )
+        return batch, int(response.headers.get('X-WP-TotalPages', page))
 
-        while True:
-            # Build request URL
-            params = {
-                'page': page,
-                'per_page': per_page
-            }
+    def _iter_pages(self, per_page: int, raise_on_error: bool) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """
+        Yield (page number, raw products) in page order.
 
-            try:
-                response = requests.get(self.api_url, params=params, timeout=30)
-                response.raise_for_status()
+        The first page is fetched alone to learn X-WP-TotalPages; the rest are
+        fetched by a thread pool with at most max_concurrent_pages requests in
+        flight, so stopping early does not download the whole catalog.
+        """
+        try:
+            batch, total_pages = self._fetch_page(1, per_page)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching products on page 1: {e}")
+            if raise_on_error:
+                raise WordPressFetchError(f"Failed to fetch page 1: {e}") from e
+            return
+
+        if not batch:
+            return
+        yield 1, batch
+
+        if total_pages <= 1:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrent_pages, thread_name_prefix='wp-pages')
+        pages = iter(range(2, total_pages + 1))
+        in_flight = deque()
+        try:
+            for page in pages:
+                in_flight.append((page, executor.submit(self._fetch_page, page, per_page)))
+                if len(in_flight) >= self.max_concurrent_pages:
+                    break
+
+            while in_flight:
+                page, future = in_flight.popleft()
+                next_page = next(pages, None)
+                if next_page is not None:
+                    in_flight.append((next_page, executor.submit(self._fetch_page, next_page, per_page)))
+
+                try:
+                    batch, _ = future.result()
+                except requests.exceptions.RequestException as e:
+                    print(f"Error fetching products on page {page}: {e}")
+                    if raise_on_error:
+                        raise WordPressFetchError(f"Failed to fetch page {page}: {e}") from e
+                    # Retries are exhausted; skip this page rather than truncating the crawl
+                    continue
+
+                if batch:
+                    yield page, batch
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def iter_products(self, max_products: Optional[int] = None, raise_on_error: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Stream products from WordPress API page by page.
 
-                batch = response.json()
+        Each page is processed as soon as it arrives, so consumers can start
+        working on the first products while later pages are still downloading.
 
-                # No more products
-                if not batch:
-                    break
+        Args:
+            max_products: Maximum number of products to yield (None for all)
+            raise_on_error: Raise instead of skipping a page that still fails after retries
+                (required when the result is used to detect removed products)
+
+        Yields:
+            Product dictionaries that have an image
+
+        Raises:
+            WordPressFetchError: If raise_on_error is set and a page cannot be fetched
+        """
+        count = 0
+        per_page = 100  # WordPress API max per page
 
+        print(f"Fetching products from WordPress API...")
+        self._start_crawl()
+
+        try:
+            for page, batch in self._iter_pages(per_page, raise_on_error):
                 # Process products in this batch
                 for product in batch:
                     processed_product = self._process_product(product)
 
                     # Only include products with images
                     if processed_product and processed_product.get('image_url'):
-                        products.append(processed_product)
+                        count += 1
+                        yield processed_product
 
                         # Check if we've reached max_products
-                        if max_products and len(products) >= max_products:
+                        if max_products and count >= max_products:
                             print(f"Reached max_products limit: {max_products}")
-                            return products
+                            return
 
-                print(f"Fetched page {page}: {len(batch)} products (total with images: {len(products)})")
+                print(f"Fetched page {page}: {len(batch)} products (total with images: {count})")
 
-                # Check if there are more pages
-                total_pages = int(response.headers.get('X-WP-TotalPages', page))
-                if page >= total_pages:
-                    break
+            print(f"Total products fetched: {count}")
+        finally:
+            self._save_media_cache()
+
+    def fetch_products(self, max_products: Optional[int] = None, raise_on_error: bool = False) -> List[Dict[str, Any]]:
+        """
+        Fetch products from WordPress API.
+
+        Args:
+            max_products: Maximum number of products to fetch (None for all)
+            raise_on_error: Raise instead of skipping a page that still fails after retries
+                (required when the result is used to detect removed products)
+
+        Returns:
+            List of product dictionaries
+
+        Raises:
+            WordPressFetchError: If raise_on_error is set and a page cannot be fetched
+        """
+        return list(self.iter_products(max_products=max_products, raise_on_error=raise_on_error))
+
+    def fetch_page(self, page: int, per_page: int = 100) -> List[Dict[str, Any]]:
+        """
+        Fetch a single catalog page.
+
+        Args:
+            page: 1-based page number
+            per_page: Products per page
 
-                page += 1
+        Returns:
+            List of product dictionaries that have an image
 
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching products on page {page}: {e}")
-                break
+        Raises:
+            WordPressFetchError: If the page cannot be fetched after retries
+        """
+        self._start_crawl()
+        try:
+            batch, _ = self._fetch_page(page, per_page)
+        except requests.exceptions.RequestException as e:
+            raise WordPressFetchError(f"Failed to fetch page {page}: {e}") from e
+        finally:
+            self._save_media_cache()
 
-        print(f"Total products fetched: {len(products)}")
+        products = []
+        for product in batch:
+            processed_product = self._process_product(product)
+            if processed_product and processed_product.get('image_url'):
+                products.append(processed_product)
         return products
 
+    def _load_media_cache(self) -> Dict[int, str]:
+        """Load the persisted media ID -> URL memo, if any."""
+        if not self.media_cache_path or not os.path.exists(self.media_cache_path):
+            return {}
+        try:
+            with open(self.media_cache_path, 'r', encoding='utf-8') as f:
+                return {int(media_id): url for media_id, url in json.load(f).items()}
+        except Exception as e:
+            print(f"Ignoring unreadable media cache {self.media_cache_path}: {e}")
+            return {}
+
+    def _save_media_cache(self):
+        """Persist the media memo if new URLs were resolved, replacing the file atomically."""
+        if not self.media_cache_path:
+            return
+        with self._media_lock:
+            if not self._media_dirty:
+                return
+            snapshot = {str(media_id): url for media_id, url in self._media_urls.items()}
+            self._media_dirty = False
+
+        directory = os.path.dirname(self.media_cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.media_cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.media_cache_path)
+
+    def _start_crawl(self):
+        """Forget media IDs that failed to resolve, so each crawl requests them again."""
+        with self._media_lock:
+            self._unresolved_media.clear()
+
+    def _resolve_media_urls(self, media_ids: Iterable[int]) -> Dict[int, str]:
+        """
+        Resolve media IDs to source URLs, fetching unknown IDs in bulk.
+
+        Unknown IDs are requested 100 at a time through the media endpoint's
+        `include` filter. IDs WordPress does not return are remembered for the
+        rest of the current crawl so they are not requested again.
+
+        Args:
+            media_ids: WordPress media IDs
+
+        Returns:
+            Dictionary of media ID -> source URL for the IDs that resolved
+        """
+        media_ids = list(dict.fromkeys(int(media_id) for media_id in media_ids if media_id))
+        with self._media_lock:
+            missing = [
+                media_id for media_id in media_ids
+                if media_id not in self._media_urls and media_id not in self._unresolved_media
+            ]
+
+        for start in range(0, len(missing), 100):
+            chunk = missing[start:start + 100]
+            try:
+                response = self.session.get(
+                    f'{self.base_url}/wp-json/wp/v2/media',
+                    params={
+                        'include': ','.join(str(media_id) for media_id in chunk),
+                        'per_page': len(chunk),
+                        '_fields': 'id,source_url'
+                    },
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                resolved = {
+                    int(media['id']): media['source_url']
+                    for media in response.json() if media.get('source_url')
+                }
+            except Exception as e:
+                print(f"Error fetching media {chunk[0]}..{chunk[-1]}: {e}")
+                continue
+
+            with self._media_lock:
+                self._media_urls.update(resolved)
+                self._unresolved_media.update(media_id for media_id in chunk if media_id not in resolved)
+                self._media_dirty = self._media_dirty or bool(resolved)
+
+        with self._media_lock:
+            return {media_id: self._media_urls[media_id] for media_id in media_ids if media_id in self._media_urls}
+
     def _get_media_url(self, media_id: int) -> Optional[str]:
         """
         Fetch the media URL for a given media ID.
@@ -96,15 +365,31 @@ class WordPressService:
         if not media_id:
             return None
 
-        try:
-            media_url = f'{self.base_url}/wp-json/wp/v2/media/{media_id}'
-            response = requests.get(media_url, timeout=10)
-            response.raise_for_status()
-            media = response.json()
-            return media.get('source_url')
-        except Exception as e:
-            print(f"Error fetching media {media_id}: {e}")
-            return None
+        return self._resolve_media_urls([media_id]).get(int(media_id))
+
+    @staticmethod
+    def _inline_image_url(product: Dict[str, Any]) -> Optional[str]:
+        """
+        Get the featured image URL from fields embedded in the product itself.
+
+        Args:
+            product: Raw product data from API
+
+        Returns:
+            Image URL or None if only a featured_media ID is available
+        """
+        # Try featured_media_url first
+        if 'featured_media_url' in product:
+            return product['featured_media_url']
+        # Try better_featured_image
+        if 'better_featured_image' in product:
+            return product['better_featured_image'].get('source_url')
+        # Try yoast og_image
+        if 'yoast_head_json' in product and 'og_image' in product['yoast_head_json']:
+            og_images = product['yoast_head_json']['og_image']
+            if og_images and len(og_images) > 0:
+                return og_images[0].get('url')
+        return None
 
     def _process_product(self, product: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -118,21 +403,10 @@ class WordPressService:
         """
         try:
             # Extract featured image
-            image_url = None
-            
-            # Try featured_media_url first
-            if 'featured_media_url' in product:
-                image_url = product['featured_media_url']
-            # Try better_featured_image
-            elif 'better_featured_image' in product:
-                image_url = product['better_featured_image'].get('source_url')
-            # Try yoast og_image
-            elif 'yoast_head_json' in product and 'og_image' in product['yoast_head_json']:
-                og_images = product['yoast_head_json']['og_image']
-                if og_images and len(og_images) > 0:
-                    image_url = og_images[0].get('url')
-            # Try to fetch from featured_media ID
-            elif product.get('featured_media'):
+            image_url = self._inline_image_url(product)
+
+            # Fall back to the featured_media ID (usually already resolved in bulk with its page)
+            if not image_url and product.get('featured_media'):
                 image_url = self._get_media_url(product['featured_media'])
 
             # Extract title
@@ -146,8 +420,7 @@ class WordPressService:
                 description = description.get('rendered', '')
 
             # Clean HTML from description
-            import re
-            description = re.sub('<[^<]+?>', '', description).strip()
+            description = _HTML_TAG_RE.sub('', description).strip()
 
             # Get price (if available)
             price = product.get('price', product.get('regular_price', ''))
@@ -158,7 +431,8 @@ class WordPressService:
                 'price': price,
                 'image_url': image_url,
                 'permalink': product.get('link', ''),
-                'description': description
+                'description': description,
+                'modified': product.get('modified_gmt', product.get('modified'))
             }
 
         except Exception as e:
@@ -174,6 +448,11 @@ def get_wordpress_service() -> WordPressService:
     global _wordpress_service_instance
 
     if _wordpress_service_instance is None:
-        _wordpress_service_instance = WordPressService()
+        _wordpress_service_instance = WordPressService(
+            max_concurrent_pages=int(os.getenv('WORDPRESS_MAX_CONCURRENT_PAGES', 4)),
+            max_retries=int(os.getenv('WORDPRESS_MAX_RETRIES', 3)),
+            timeout=float(os.getenv('WORDPRESS_TIMEOUT', 30)),
+            media_cache_path=os.getenv('WORDPRESS_MEDIA_CACHE_PATH', 'data/wordpress_media.json')
+        )
 
     return _wordpress_service_instance